@@ -1,333 +1,467 @@
-import streamlit as st
-import pandas as pd
-from datetime import date, timedelta
-import folium
-from streamlit_folium import folium_static
-
-# Load CSV data
-distance_df = pd.read_csv('rajasthan_distance.csv')
-bus_df = pd.read_csv('rajasthan_buses.csv')
-train_df = pd.read_csv('rajasthan_trains.csv')
-metro_df = pd.read_csv('rajasthan_metros.csv')
-districts_df = pd.read_csv('rajasthan_districts.csv')
-
-#
-def draw_routes_on_map(routes_df, start_city, end_city, map_obj):
-    if start_city and end_city:
-        route_df = routes_df[(routes_df['start_district'] == start_city) & (routes_df['end_district'] == end_city)]
-        if not route_df.empty:
-            start_coords = districts_df[districts_df['district'] == start_city][['latitude', 'longitude']].values[0]
-            end_coords = districts_df[districts_df['district'] == end_city][['latitude', 'longitude']].values[0]
-            folium.PolyLine(locations=[start_coords, end_coords], color='blue', weight=0.5, opacity=1).add_to(map_obj)
-
-
-# Function to get route details (duration, fare, start time)
-def get_route_details(df, start, end, mode):
-    if mode == "Bus":
-        route_df = bus_df
-    elif mode == "Train":
-        route_df = train_df
-    else:
-        route_df = metro_df
-    
-    route = route_df[(route_df['start_district'] == start) & (route_df['end_district'] == end)]
-    if not route.empty:
-        fare = route['fare'].values[0]
-        duration = route['duration_min'].values[0]
-        start_time = route['departure_time'].values[0]
-        return fare, duration, start_time
-    else:
-        return None, None, None
-
-# Function to suggest the optimal route
-def suggest_optimal_route(start, end, preferred_modes, intermediate=None):
-    if intermediate:
-        # Calculate for two legs
-        routes = []
-        for mode1 in preferred_modes:
-            leg1 = get_route_details(bus_df if mode1 == "Bus" else train_df if mode1 == "Train" else metro_df, start, intermediate, mode1)
-            if leg1[1] is not None:
-                for mode2 in preferred_modes:
-                    leg2 = get_route_details(bus_df if mode2 == "Bus" else train_df if mode2 == "Train" else metro_df, intermediate, end, mode2)
-                    if leg2[1] is not None:
-                        routes.append((mode1, mode2, leg1[1] + leg2[1], leg1[0] + leg2[0], leg1[2], leg2[2]))
-        
-        # Find the optimal route
-        optimal_route = min(routes, key=lambda x: x[2]) if routes else None
-        
-    else:
-        # Calculate for direct journey
-        routes = []
-        for mode in preferred_modes:
-            direct = get_route_details(bus_df if mode == "Bus" else train_df if mode == "Train" else metro_df, start, end, mode)
-            if direct[1] is not None:
-                routes.append((mode, direct[1], direct[0], direct[2]))
-        
-        # Find the optimal route
-        optimal_route = min(routes, key=lambda x: x[1]) if routes else None
-    
-    return optimal_route, routes
-
-# Initialize session state
-if 'page' not in st.session_state:
-    st.session_state['page'] = 'Find Routes'
-if 'journey_details' not in st.session_state:
-    st.session_state['journey_details'] = None
-if 'passenger_details' not in st.session_state:
-    st.session_state['passenger_details'] = None
-
-# Page navigation
-def navigate_to(page):
-    st.session_state['page'] = page
-
-# Main content based on user input
-st.title('Universal Ticketing System - Rajasthan')
-
-if st.session_state['page'] == 'Find Routes':
-    st.sidebar.title("Transport Finder")
-    preferred_modes = st.sidebar.multiselect(
-        "Select Preferred Modes of Transport",
-        ["Bus", "Train", "Metro"],
-        default=["Bus", "Train", "Metro"]
-    )
-
-    # Show the map on the main page before the route details
-    st.header("Rajasthan Route Map")
-    map_center = [26.9124, 75.7873]  # Jaipur, Rajasthan as center
-    folium_map = folium.Map(location=map_center, zoom_start=7)
-
-    # Add markers for main cities in Rajasthan
-    for index, row in districts_df.iterrows():
-        folium.Marker(location=[row['latitude'], row['longitude']], popup=row['district']).add_to(folium_map)
-
-    # Draw routes on the map
-    draw_routes_on_map(distance_df, folium_map)
-
-    folium_static(folium_map)
-
-    st.sidebar.subheader("Select Journey Details")
-    start_city = st.sidebar.selectbox("Select Start City", distance_df['start_district'].unique())
-    end_city = st.sidebar.selectbox("Select End City", distance_df['end_district'].unique())
-    intermediate_city = st.sidebar.selectbox("Select Intermediate City (Optional)", ['None'] + list(distance_df['start_district'].unique()))
-    journey_date = st.sidebar.date_input("Select Journey Date", date.today())
-    return_trip = st.sidebar.checkbox("Round Trip")
-    return_date = None
-    if return_trip:
-        return_date = st.sidebar.date_input("Select Return Date", date.today() + timedelta(days=1))
-
-    # Show the map on the main page before the route details
-    st.header("Rajasthan Route Map")
-    map_center = [26.9124, 75.7873]  # Jaipur, Rajasthan as center
-    folium_map = folium.Map(location=map_center, zoom_start=7)
-
-    # Add markers for main cities in Rajasthan
-    cities = distance_df['start_district'].unique()
-    for city in cities:
-        coordinates = distance_df[distance_df['start_district'] == city][['latitude', 'longitude']].values[0]
-        folium.Marker(location=coordinates, popup=city).add_to(folium_map)
-
-    # Draw routes on the map if start and end cities are selected
-    draw_routes_on_map(distance_df, start_city, end_city, folium_map)
-
-    folium_static(folium_map)
-
-
-    if start_city and end_city:
-        st.header(f"Transport Options from {start_city} to {end_city}")
-        st.write(f"Journey Date: {journey_date}")
-        
-        if intermediate_city != 'None':
-            st.subheader(f"Journey via {intermediate_city}")
-            
-            # Suggest optimal route and other possible routes
-            optimal_route, routes = suggest_optimal_route(start_city, end_city, preferred_modes, intermediate_city)
-            if optimal_route:
-                st.markdown(f"**Optimal Route:** {optimal_route[0]} to {intermediate_city}, then {optimal_route[1]} to {end_city}")
-                st.markdown(f"**Total Duration:** {optimal_route[2]} minutes")
-                st.markdown(f"**Total Fare:** ₹{optimal_route[3]:.2f}")
-                st.markdown(f"**Start Time:** {optimal_route[4]} (from {start_city} to {intermediate_city}), {optimal_route[5]} (from {intermediate_city} to {end_city})")
-                
-                # Display other possible routes
-                st.write("Other Possible Routes:")
-                for route in routes:
-                    with st.expander(f"Route: {route[0]} to {intermediate_city}, then {route[1]} to {end_city}"):
-                        st.write(f"Total Duration: {route[2]} minutes")
-                        st.write(f"Total Fare: ₹{route[3]:.2f}")
-                        st.write(f"Start Time: {route[4]} (from {start_city} to {intermediate_city}), {route[5]} (from {intermediate_city} to {end_city})")
-                        if st.button(f"Select Route: {route[0]} to {intermediate_city}, then {route[1]} to {end_city}", key=f"route_{route[0]}_{route[1]}"):
-                            st.session_state['journey_details'] = {
-                                'start_city': start_city,
-                                'end_city': end_city,
-                                'intermediate_city': intermediate_city,
-                                'journey_date': journey_date,
-                                'return_trip': return_trip,
-                                'return_date': return_date,
-                                'selected_route': route,
-                            }
-                            navigate_to('Passenger Details')
-                
-            else:
-                st.error("No valid routes found for the selected journey.")
-                
-        else:
-            st.subheader("Direct Journey")
-            
-            # Suggest optimal route and other possible routes
-            optimal_route, routes = suggest_optimal_route(start_city, end_city, preferred_modes)
-            if optimal_route:
-                st.markdown(f"**Optimal Route:** {optimal_route[0]}")
-                st.markdown(f"**Total Duration:** {optimal_route[1]} minutes")
-                st.markdown(f"**Total Fare:** ₹{optimal_route[2]:.2f}")
-                st.markdown(f"**Start Time:** {optimal_route[3]}")
-                
-                # Display other possible routes
-                st.write("Other Possible Routes:")
-                for route in routes:
-                    with st.expander(f"Route: {route[0]}"):
-                        st.write(f"Total Duration: {route[1]} minutes")
-                        st.write(f"Total Fare: ₹{route[2]:.2f}")
-                        st.write(f"Start Time: {route[3]}")
-                        if st.button(f"Select Route: {route[0]}", key=f"route_{route[0]}"):
-                            st.session_state['journey_details'] = {
-                                'start_city': start_city,
-                                'end_city': end_city,
-                                'intermediate_city': None,
-                                'journey_date': journey_date,
-                                'return_trip': return_trip,
-                                'return_date': return_date,
-                                'selected_route': route,
-                            }
-                            navigate_to('Passenger Details')
-        
-        # Return trip details
-        if return_trip:
-            st.subheader(f"Return Journey from {end_city} to {start_city}")
-            st.write(f"Return Date: {return_date}")
-            
-            if intermediate_city != 'None':
-                st.subheader(f"Journey via {intermediate_city}")
-                
-                # Suggest optimal route and other possible routes
-                optimal_route, routes = suggest_optimal_route(end_city, start_city, preferred_modes, intermediate_city)
-                if optimal_route:
-                    st.markdown(f"**Optimal Route:** {optimal_route[0]} to {intermediate_city}, then {optimal_route[1]} to {start_city}")
-                    st.markdown(f"**Total Duration:** {optimal_route[2]} minutes")
-                    st.markdown(f"**Total Fare:** ₹{optimal_route[3]:.2f}")
-                    st.markdown(f"**Start Time:** {optimal_route[4]} (from {end_city} to {intermediate_city}), {optimal_route[5]} (from {intermediate_city} to {start_city})")
-                    
-                    # Display other possible routes
-                    st.write("Other Possible Routes:")
-                    for route in routes:
-                        with st.expander(f"Route: {route[0]} to {intermediate_city}, then {route[1]} to {start_city}"):
-                            st.write(f"Total Duration: {route[2]} minutes")
-                            st.write(f"Total Fare: ₹{route[3]:.2f}")
-                            st.write(f"Start Time: {route[4]} (from {end_city} to {intermediate_city}), {route[5]} (from {intermediate_city} to {start_city})")
-                            if st.button(f"Select Route: {route[0]} to {intermediate_city}, then {route[1]} to {start_city}", key=f"return_route_{route[0]}_{route[1]}"):
-                                st.session_state['return_journey_details'] = {
-                                    'start_city': end_city,
-                                    'end_city': start_city,
-                                    'intermediate_city': intermediate_city,
-                                    'journey_date': return_date,
-                                    'selected_route': route,
-                                }
-                                navigate_to('Passenger Details')
-                
-                else:
-                    st.error("No valid routes found for the return journey.")
-                    
-            else:
-                st.subheader("Direct Journey")
-                
-                # Suggest optimal route and other possible routes
-                optimal_route, routes = suggest_optimal_route(end_city, start_city, preferred_modes)
-                if optimal_route:
-                    st.markdown(f"**Optimal Route:** {optimal_route[0]}")
-                    st.markdown(f"**Total Duration:** {optimal_route[1]} minutes")
-                    st.markdown(f"**Total Fare:** ₹{optimal_route[2]:.2f}")
-                    st.markdown(f"**Start Time:** {optimal_route[3]}")
-                    
-                    # Display other possible routes
-                    st.write("Other Possible Routes:")
-                    for route in routes:
-                        with st.expander(f"Route: {route[0]}"):
-                            st.write(f"Total Duration: {route[1]} minutes")
-                            st.write(f"Total Fare: ₹{route[2]:.2f}")
-                            st.write(f"Start Time: {route[3]}")
-                            if st.button(f"Select Route: {route[0]}", key=f"return_route_{route[0]}"):
-                                st.session_state['return_journey_details'] = {
-                                    'start_city': end_city,
-                                    'end_city': start_city,
-                                    'intermediate_city': None,
-                                    'journey_date': return_date,
-                                    'selected_route': route,
-                                }
-                                navigate_to('Passenger Details')
-
-elif st.session_state['page'] == 'Passenger Details':
-    st.header("Passenger Details")
-
-    # Collect passenger details
-    passenger_name = st.text_input("Passenger Name")
-    passenger_age = st.number_input("Passenger Age", min_value=0, max_value=120)
-    passenger_contact = st.text_input("Contact Number")
-    num_seats = st.number_input("Number of Seats", min_value=1, max_value=10)
-
-    if st.button("Submit Passenger Details"):
-        st.session_state['passenger_details'] = {
-            'name': passenger_name,
-            'age': passenger_age,
-            'contact': passenger_contact,
-            'num_seats': num_seats
-        }
-        st.success("Passenger details submitted! Proceed to payment.")
-        navigate_to('Payment')
-
-elif st.session_state['page'] == 'Payment':
-    st.header("Payment Details")
-
-    # Payment integration (simulated)
-    payment_option = st.selectbox("Select Payment Method", ["Credit Card", "Debit Card"])
-    card_number = st.text_input("Card Number")
-    card_expiry = st.text_input("Card Expiry Date (MM/YY)")
-    card_cvv = st.text_input("CVV")
-    
-    if st.button("Proceed to Payment"):
-        st.success("Payment Successful!")
-        st.balloons()
-        st.session_state['page'] = 'Ticket Details'
-
-elif st.session_state['page'] == 'Ticket Details':
-    st.header("Booking Confirmation")
-
-    # Display booking details in a ticket form
-    st.subheader("Ticket Details")
-    
-    if 'journey_details' in st.session_state:
-        journey_details = st.session_state['journey_details']
-        st.markdown(f"**Start City:** {journey_details['start_city']}")
-        st.markdown(f"**End City:** {journey_details['end_city']}")
-        if journey_details['intermediate_city']:
-            st.markdown(f"**Intermediate City:** {journey_details['intermediate_city']}")
-        st.markdown(f"**Journey Date:** {journey_details['journey_date']}")
-        if journey_details['return_trip']:
-            st.markdown(f"**Return Date:** {journey_details['return_date']}")
-        st.markdown(f"**Selected Route:** {journey_details['selected_route'][0]}")
-        st.markdown(f"**Total Duration:** {journey_details['selected_route'][1]} minutes")
-        st.markdown(f"**Total Fare:** ₹{journey_details['selected_route'][2]:.2f}")
-        st.markdown(f"**Start Time:** {journey_details['selected_route'][3]}")
-        
-        if 'passenger_details' in st.session_state:
-            st.subheader("Passenger Details")
-            passenger_details = st.session_state['passenger_details']
-            st.markdown(f"**Passenger Name:** {passenger_details['name']}")
-            st.markdown(f"**Passenger Age:** {passenger_details['age']}")
-            st.markdown(f"**Contact Number:** {passenger_details['contact']}")
-            st.markdown(f"**Number of Seats:** {passenger_details['num_seats']}")
-
-    if st.button("Book Another Ticket"):
-        st.session_state['page'] = 'Find Routes'
-        st.session_state['journey_details'] = None
-        st.session_state['passenger_details'] = None
-
-else:
-    st.error("Please select at least one mode of transport.")
+import streamlit as st
+import pandas as pd
+from datetime import date, time, timedelta
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from mapview import MAP_HEIGHT, MAP_WIDTH, base_map, city_coordinates, with_route
+from uts.booking import BookingEngine, BookingError, HoldExpired, journey_trips
+from uts.ledger import TicketLedger
+from uts.metrics import METRICS
+from uts.reload import SnapshotWatcher
+from uts.router import RANKINGS, format_minutes
+from uts.tickets import TicketRenderer
+from uts.timetable import DAY
+
+# Time this rerun and its stages per session; a no-op unless UTS_METRICS=1
+run_ctx = get_script_run_ctx()
+METRICS.start().begin_rerun(run_ctx.session_id if run_ctx else None)
+
+# Load the timetables once and share them across sessions and reruns. A
+# background thread reloads them when the CSVs change and swaps the new
+# snapshot in, so no rerun waits on a reload or sees a half-loaded one.
+@st.cache_resource(show_spinner=False)
+def timetable_watcher():
+    return SnapshotWatcher().start()
+
+# One SQLite seat inventory shared by every session; holds and confirmations
+# are atomic, so concurrent sessions can never sell the same seat twice
+@st.cache_resource(show_spinner=False)
+def booking_engine():
+    return BookingEngine()
+
+# Confirmed tickets are appended to a durable ledger that outlives the session;
+# it locks its file, so a cleared cache closes it before opening a new one
+@st.cache_resource(show_spinner=False, on_release=TicketLedger.close)
+def ticket_ledger():
+    return TicketLedger()
+
+# PDF and QR tickets are rendered on a small process pool, off the rerun;
+# a cleared cache shuts the pool and its dispatcher thread down
+@st.cache_resource(show_spinner=False, on_release=TicketRenderer.close)
+def ticket_renderer():
+    return TicketRenderer()
+
+# Tiles and district markers are rendered once per data version; reruns only add the route line
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_base_map(version, _districts_df):
+    map_html, map_name = base_map(_districts_df)
+    return map_html, map_name, city_coordinates(_districts_df)
+
+# One snapshot for the whole rerun, even if a reload lands meanwhile
+with METRICS.stage("load"):
+    version, tables, planner = timetable_watcher().current
+distance_df = tables['distance']
+bus_df = tables['bus']
+train_df = tables['train']
+metro_df = tables['metro']
+districts_df = tables['districts']
+
+# Points of the line drawn between the selected cities
+def route_points(routes_df, start_city, end_city, city_coords):
+    if start_city and end_city:
+        route_df = routes_df[(routes_df['start_city'] == start_city) & (routes_df['end_city'] == end_city)]
+        if not route_df.empty and start_city in city_coords and end_city in city_coords:
+            return [city_coords[start_city], city_coords[end_city]]
+    return []
+
+
+# Plan the journey, and for a round trip the return too, in one call; 'Auto'
+# picks the intermediate city with the best leg 1 + leg 2 in each direction.
+# Both directions are searched at once, and their routes are paired by
+# combined duration or fare, leaving at least min_stay minutes in between.
+def plan_journey(start, end, preferred_modes, intermediate_choice, rank_by, journey_date,
+                 return_date=None, earliest=0, latest=DAY - 1, min_stay=0):
+    intermediate = {'None': None, 'Auto': 'auto'}.get(intermediate_choice, intermediate_choice)
+    if return_date is None:
+        METRICS.count("route_queries")
+        return planner.trip(start, end, preferred_modes, intermediate, rank_by, journey_date, earliest, latest), None, []
+    METRICS.count("route_queries", 2)
+    with METRICS.stage("round_trip"):
+        return planner.round_trip(start, end, preferred_modes, intermediate, rank_by, journey_date, return_date, earliest, latest, min_stay)
+
+ROUTES_PER_PAGE = 10
+
+# One table row per route tuple, direct (4 fields) or via (6 fields)
+def route_row(route):
+    if len(route) == 6:
+        return {'Route': f"{route[0]}, then {route[1]}", 'Duration (min)': round(route[2]), 'Fare (₹)': round(route[3], 2), 'Start Time': f"{route[4]}, {route[5]}"}
+    return {'Route': route[0], 'Duration (min)': round(route[1]), 'Fare (₹)': round(route[2], 2), 'Start Time': route[3]}
+
+# Render routes as one paginated table with row selection, so the widget
+# count and the rows sent to the browser stay fixed however many routes
+# there are; returns the selected route once "Select Route" is pressed
+def show_routes(routes, key, row=route_row):
+    pages = max(1, -(-len(routes) // ROUTES_PER_PAGE))
+    page = st.number_input("Page", min_value=1, max_value=pages, key=f"{key}_page") if pages > 1 else 1
+    page_routes = routes[(page - 1) * ROUTES_PER_PAGE:page * ROUTES_PER_PAGE]
+    METRICS.count("routes_rendered", len(page_routes))
+    with METRICS.stage("render"):
+        event = st.dataframe(
+            pd.DataFrame([row(route) for route in page_routes]),
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="single-row",
+            key=f"{key}_table_{page}",
+        )
+    selected = event.selection.rows
+    if st.button("Select Route", key=f"{key}_select", disabled=not selected):
+        return page_routes[selected[0]]
+    return None
+
+def connection_row(journey):
+    legs = "; ".join(f"{leg.mode} {leg.start} {format_minutes(leg.departure)} → {leg.end} {format_minutes(leg.arrival)}" for leg in journey.legs)
+    return {'Route': ' → '.join(journey.modes), 'Via': ', '.join(journey.via), 'Duration (min)': round(journey.duration), 'Fare (₹)': round(journey.fare, 2), 'Legs': legs}
+
+# Short label for a route tuple or a connection of a round trip
+def option_label(option):
+    if hasattr(option, 'legs'):
+        return f"{' → '.join(option.modes)} via {', '.join(option.via)} at {option.legs[0].departure_time}"
+    if len(option) == 6:
+        return f"{option[0]}, then {option[1]} at {option[4]}"
+    return f"{option[0]} at {option[3]}"
+
+# Show the Pareto-optimal journeys that need changes on the way
+def show_connections(journeys, key, details_key, details):
+    if not journeys:
+        return
+    st.write("Connections with Changes:")
+    journey = show_routes(journeys, key, row=connection_row)
+    if journey:
+        label = f"{' → '.join(journey.modes)} via {', '.join(journey.via)} at {journey.legs[0].departure_time}"
+        st.session_state[details_key] = dict(
+            details,
+            intermediate_city=', '.join(journey.via),
+            selected_route=(label, journey.duration, journey.fare, journey.legs[0].departure_time),
+            legs=[(leg.mode, leg.start, leg.end, leg.departure_time, int(leg.departure // DAY)) for leg in journey.legs],
+        )
+        navigate_to('Passenger Details')
+
+# Initialize session state
+if 'page' not in st.session_state:
+    st.session_state['page'] = 'Find Routes'
+if 'journey_details' not in st.session_state:
+    st.session_state['journey_details'] = None
+if 'passenger_details' not in st.session_state:
+    st.session_state['passenger_details'] = None
+
+# Page navigation
+def navigate_to(page):
+    st.session_state['page'] = page
+
+# Every leg of the selected journey, and of the selected return journey
+def selected_trips():
+    trips = []
+    for key in ('journey_details', 'return_journey_details'):
+        details = st.session_state.get(key)
+        if details:
+            trips += journey_trips(details)
+    return trips
+
+# The ticket's QR code and PDF once rendered; asking again for a rendered
+# ticket only looks its files up, so reprints cost nothing
+def show_printable_ticket(ticket_id):
+    ticket = ticket_ledger().get(ticket_id)
+    if ticket is None:
+        return
+    key, future = ticket_renderer().submit(ticket)
+    if not future.done():
+        st.info("Your printable ticket is being prepared.")
+        st.button("Refresh")
+    elif future.exception() is not None:
+        st.warning("Your printable ticket could not be prepared yet.")
+        st.button("Try Again")
+    else:
+        store = ticket_renderer().store
+        st.image(store.read(key, 'png'), caption="Show this QR code when boarding", width=160)
+        st.download_button("Download Ticket (PDF)", store.read(key, 'pdf'), file_name=f"ticket-{ticket_id}.pdf", mime="application/pdf")
+
+# Main content based on user input
+st.title('Universal Ticketing System - Rajasthan')
+
+if st.session_state['page'] == 'Find Routes':
+    st.sidebar.title("Transport Finder")
+    preferred_modes = st.sidebar.multiselect(
+        "Select Preferred Modes of Transport",
+        ["Bus", "Train", "Metro"],
+        default=["Bus", "Train", "Metro"]
+    )
+    rank_by = st.sidebar.selectbox("Rank Routes By", list(RANKINGS))
+
+    st.sidebar.subheader("Select Journey Details")
+    start_city = st.sidebar.selectbox("Select Start City", distance_df['start_city'].unique())
+    end_city = st.sidebar.selectbox("Select End City", distance_df['end_city'].unique())
+    intermediate_choice = st.sidebar.selectbox("Select Intermediate City (Optional)", ['None', 'Auto'] + list(distance_df['start_city'].unique()))
+    journey_date = st.sidebar.date_input("Select Journey Date", date.today())
+    return_trip = st.sidebar.checkbox("Round Trip")
+    return_date = None
+    min_stay_hours = 0
+    if return_trip:
+        return_date = st.sidebar.date_input("Select Return Date", date.today() + timedelta(days=1))
+        min_stay_hours = st.sidebar.number_input("Minimum Stay (hours)", min_value=0, max_value=240, value=2)
+    departure_window = st.sidebar.slider("Departure Time Window", value=(time(0, 0), time(23, 59)), step=timedelta(minutes=15))
+    earliest, latest = (t.hour * 60 + t.minute for t in departure_window)
+
+    # Show the map on the main page before the route details
+    st.header("Rajasthan Route Map")
+    with METRICS.stage("map"):
+        map_html, map_name, city_coords = load_base_map(version, districts_df)
+
+        # Draw routes on the map if start and end cities are selected
+        points = route_points(distance_df, start_city, end_city, city_coords)
+        st.iframe(with_route(map_html, map_name, points, color='blue', weight=0.5), width=MAP_WIDTH, height=MAP_HEIGHT + 10)
+
+
+    if start_city and end_city:
+        st.header(f"Transport Options from {start_city} to {end_city}")
+        st.write(f"Journey Date: {journey_date}")
+        distance_km = planner.distances.distance(start_city, end_city) if planner.distances else None
+        if distance_km:
+            st.write(f"Distance: {distance_km:.0f} km")
+        outbound, inbound, pairs = plan_journey(start_city, end_city, preferred_modes, intermediate_choice, rank_by, journey_date,
+                                                return_date, earliest, latest, min_stay_hours * 60)
+        intermediate_city = outbound.via or 'None'
+        
+        if intermediate_city != 'None':
+            st.subheader(f"Journey via {intermediate_city}")
+            
+            # Suggest optimal route and other possible routes
+            optimal_route, routes = outbound.optimal_route, outbound.routes
+            if optimal_route:
+                st.markdown(f"**Optimal Route:** {optimal_route[0]} to {intermediate_city}, then {optimal_route[1]} to {end_city}")
+                st.markdown(f"**Total Duration:** {optimal_route[2]} minutes")
+                st.markdown(f"**Total Fare:** ₹{optimal_route[3]:.2f}")
+                st.markdown(f"**Start Time:** {optimal_route[4]} (from {start_city} to {intermediate_city}), {optimal_route[5]} (from {intermediate_city} to {end_city})")
+                
+                # Display other possible routes
+                st.write("Other Possible Routes:")
+                route = show_routes(routes, "route_via")
+                if route:
+                    st.session_state['journey_details'] = {
+                        'start_city': start_city,
+                        'end_city': end_city,
+                        'intermediate_city': intermediate_city,
+                        'journey_date': journey_date,
+                        'return_trip': return_trip,
+                        'return_date': return_date,
+                        'selected_route': route,
+                    }
+                    navigate_to('Passenger Details')
+                
+            else:
+                st.error("No valid routes found for the selected journey.")
+                
+        else:
+            st.subheader("Direct Journey")
+            
+            # Suggest optimal route and other possible routes
+            optimal_route, routes = outbound.optimal_route, outbound.routes
+            if optimal_route:
+                st.markdown(f"**Optimal Route:** {optimal_route[0]}")
+                st.markdown(f"**Total Duration:** {optimal_route[1]} minutes")
+                st.markdown(f"**Total Fare:** ₹{optimal_route[2]:.2f}")
+                st.markdown(f"**Start Time:** {optimal_route[3]}")
+                
+                # Display other possible routes
+                st.write("Other Possible Routes:")
+                route = show_routes(routes, "route_direct")
+                if route:
+                    st.session_state['journey_details'] = {
+                        'start_city': start_city,
+                        'end_city': end_city,
+                        'intermediate_city': None,
+                        'journey_date': journey_date,
+                        'return_trip': return_trip,
+                        'return_date': return_date,
+                        'selected_route': route,
+                    }
+                    navigate_to('Passenger Details')
+
+            show_connections(outbound.connections, "route_connection", 'journey_details', {
+                'start_city': start_city,
+                'end_city': end_city,
+                'journey_date': journey_date,
+                'return_trip': return_trip,
+                'return_date': return_date,
+            })
+        
+        # Return trip details
+        if return_trip:
+            st.subheader(f"Return Journey from {end_city} to {start_city}")
+            st.write(f"Return Date: {return_date}")
+            # The outbound and return routes with the best combined cost
+            if pairs:
+                best = pairs[0]
+                st.markdown(f"**Best Round Trip:** {option_label(best.outbound)} out, {option_label(best.inbound)} back")
+                st.markdown(f"**Round Trip Duration:** {best.duration:.0f} minutes")
+                st.markdown(f"**Round Trip Fare:** ₹{best.fare:.2f}")
+                st.markdown(f"**Stay:** {best.stay / 60:.1f} hours")
+            else:
+                st.warning("No return route leaves after the minimum stay.")
+            intermediate_city = inbound.via or 'None'
+            
+            if intermediate_city != 'None':
+                st.subheader(f"Journey via {intermediate_city}")
+                
+                # Suggest optimal route and other possible routes
+                optimal_route, routes = inbound.optimal_route, inbound.routes
+                if optimal_route:
+                    st.markdown(f"**Optimal Route:** {optimal_route[0]} to {intermediate_city}, then {optimal_route[1]} to {start_city}")
+                    st.markdown(f"**Total Duration:** {optimal_route[2]} minutes")
+                    st.markdown(f"**Total Fare:** ₹{optimal_route[3]:.2f}")
+                    st.markdown(f"**Start Time:** {optimal_route[4]} (from {end_city} to {intermediate_city}), {optimal_route[5]} (from {intermediate_city} to {start_city})")
+                    
+                    # Display other possible routes
+                    st.write("Other Possible Routes:")
+                    route = show_routes(routes, "return_route_via")
+                    if route:
+                        st.session_state['return_journey_details'] = {
+                            'start_city': end_city,
+                            'end_city': start_city,
+                            'intermediate_city': intermediate_city,
+                            'journey_date': return_date,
+                            'selected_route': route,
+                        }
+                        navigate_to('Passenger Details')
+                
+                else:
+                    st.error("No valid routes found for the return journey.")
+                    
+            else:
+                st.subheader("Direct Journey")
+                
+                # Suggest optimal route and other possible routes
+                optimal_route, routes = inbound.optimal_route, inbound.routes
+                if optimal_route:
+                    st.markdown(f"**Optimal Route:** {optimal_route[0]}")
+                    st.markdown(f"**Total Duration:** {optimal_route[1]} minutes")
+                    st.markdown(f"**Total Fare:** ₹{optimal_route[2]:.2f}")
+                    st.markdown(f"**Start Time:** {optimal_route[3]}")
+                    
+                    # Display other possible routes
+                    st.write("Other Possible Routes:")
+                    route = show_routes(routes, "return_route_direct")
+                    if route:
+                        st.session_state['return_journey_details'] = {
+                            'start_city': end_city,
+                            'end_city': start_city,
+                            'intermediate_city': None,
+                            'journey_date': return_date,
+                            'selected_route': route,
+                        }
+                        navigate_to('Passenger Details')
+
+                show_connections(inbound.connections, "return_route_connection", 'return_journey_details', {
+                    'start_city': end_city,
+                    'end_city': start_city,
+                    'journey_date': return_date,
+                })
+
+elif st.session_state['page'] == 'Passenger Details':
+    st.header("Passenger Details")
+
+    # Collect passenger details
+    passenger_name = st.text_input("Passenger Name")
+    passenger_age = st.number_input("Passenger Age", min_value=0, max_value=120)
+    passenger_contact = st.text_input("Contact Number")
+    num_seats = st.number_input("Number of Seats", min_value=1, max_value=10)
+    trips = selected_trips()
+    if trips:
+        st.write(f"Seats left: {min(booking_engine().available(trip, day) for trip, day in trips)}")
+
+    if st.button("Submit Passenger Details"):
+        if not trips:
+            st.error("Please select a route first.")
+        else:
+            # Hold the seats on every leg while the passenger pays; a resubmit
+            # swaps the earlier hold for the new one in the same transaction
+            try:
+                hold_id, _ = booking_engine().hold(trips, num_seats, replaces=st.session_state.get('hold_id'))
+            except BookingError as error:
+                st.error(f"Could not reserve seats: {error}")
+            else:
+                st.session_state['hold_id'] = hold_id
+                st.session_state['passenger_details'] = {
+                    'name': passenger_name,
+                    'age': passenger_age,
+                    'contact': passenger_contact,
+                    'num_seats': num_seats
+                }
+                st.success("Passenger details submitted! Proceed to payment.")
+                navigate_to('Payment')
+
+elif st.session_state['page'] == 'Payment':
+    st.header("Payment Details")
+
+    # Payment integration (simulated)
+    payment_option = st.selectbox("Select Payment Method", ["Credit Card", "Debit Card"])
+    card_number = st.text_input("Card Number")
+    card_expiry = st.text_input("Card Expiry Date (MM/YY)")
+    card_cvv = st.text_input("CVV")
+    
+    if st.button("Proceed to Payment"):
+        try:
+            booking_engine().confirm(st.session_state.get('hold_id'))
+        except HoldExpired:
+            st.error("Your seat reservation has expired. Please submit the passenger details again.")
+        else:
+            passenger_details = st.session_state.get('passenger_details') or {}
+            st.session_state['ticket_id'] = ticket_ledger().append({
+                'contact': passenger_details.get('contact'),
+                'passenger': passenger_details,
+                'journey': st.session_state.get('journey_details'),
+                'return_journey': st.session_state.get('return_journey_details'),
+                'hold_id': st.session_state['hold_id'],
+            })
+            # Start the printable ticket now; the confirmation does not wait for it
+            ticket_renderer().submit(ticket_ledger().get(st.session_state['ticket_id']))
+            st.success("Payment Successful!")
+            st.balloons()
+            st.session_state['hold_id'] = None
+            st.session_state['page'] = 'Ticket Details'
+
+elif st.session_state['page'] == 'Ticket Details':
+    st.header("Booking Confirmation")
+    if st.session_state.get('ticket_id'):
+        st.markdown(f"**Ticket ID:** {st.session_state['ticket_id']}")
+        show_printable_ticket(st.session_state['ticket_id'])
+
+    # Display booking details in a ticket form
+    st.subheader("Ticket Details")
+    
+    if 'journey_details' in st.session_state:
+        journey_details = st.session_state['journey_details']
+        st.markdown(f"**Start City:** {journey_details['start_city']}")
+        st.markdown(f"**End City:** {journey_details['end_city']}")
+        if journey_details['intermediate_city']:
+            st.markdown(f"**Intermediate City:** {journey_details['intermediate_city']}")
+        st.markdown(f"**Journey Date:** {journey_details['journey_date']}")
+        if journey_details['return_trip']:
+            st.markdown(f"**Return Date:** {journey_details['return_date']}")
+        # Via (6 fields) or direct and connection (4 fields) routes, as in route_row
+        route = journey_details['selected_route']
+        if len(route) == 6:
+            route_name, duration, fare, start_time = f"{route[0]}, then {route[1]}", route[2], route[3], f"{route[4]}, {route[5]}"
+        else:
+            route_name, duration, fare, start_time = route
+        st.markdown(f"**Selected Route:** {route_name}")
+        st.markdown(f"**Total Duration:** {duration} minutes")
+        st.markdown(f"**Total Fare:** ₹{fare:.2f}")
+        st.markdown(f"**Start Time:** {start_time}")
+        
+        if 'passenger_details' in st.session_state:
+            st.subheader("Passenger Details")
+            passenger_details = st.session_state['passenger_details']
+            st.markdown(f"**Passenger Name:** {passenger_details['name']}")
+            st.markdown(f"**Passenger Age:** {passenger_details['age']}")
+            st.markdown(f"**Contact Number:** {passenger_details['contact']}")
+            st.markdown(f"**Number of Seats:** {passenger_details['num_seats']}")
+
+    if st.button("Book Another Ticket"):
+        st.session_state['page'] = 'Find Routes'
+        st.session_state['journey_details'] = None
+        st.session_state['passenger_details'] = None
+        st.session_state['return_journey_details'] = None
+
+else:
+    st.error("Please select at least one mode of transport.")
+
+METRICS.end_rerun()
@@ -0,0 +1,60 @@
+import json
+
+import folium
+
+MAP_CENTER = [26.9124, 75.7873]  # Jaipur, Rajasthan as center
+MAP_WIDTH = 700
+MAP_HEIGHT = 500
+
+
+def city_coordinates(districts_df):
+    """{city: [latitude, longitude]} from the districts table."""
+    return {
+        city: [float(lat), float(lon)]
+        for city, lat, lon in zip(districts_df['city'], districts_df['latitude'], districts_df['longitude'])
+    }
+
+
+def base_map(districts_df, zoom_start=7, radius=None, color='blue'):
+    """Render tiles plus every district marker once.
+
+    All markers go into a single GeoJSON layer built straight from the
+    coordinate columns, instead of one folium marker object per city.
+    Returns (html, map_name); map_name is the Leaflet variable that
+    with_route draws onto. radius=None draws pins, otherwise circle markers.
+    """
+    folium_map = folium.Map(location=MAP_CENTER, zoom_start=zoom_start, width=MAP_WIDTH, height=MAP_HEIGHT)
+    features = {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                'properties': {'city': city},
+            }
+            for city, (lat, lon) in city_coordinates(districts_df).items()
+        ],
+    }
+    marker = None
+    if radius is not None:
+        marker = folium.CircleMarker(radius=radius, color=color, fill=True, fill_color=color)
+    folium.GeoJson(
+        features,
+        name='Districts',
+        marker=marker,
+        tooltip=folium.GeoJsonTooltip(fields=['city'], labels=False),
+        popup=folium.GeoJsonPopup(fields=['city'], labels=False),
+    ).add_to(folium_map)
+    html = folium.Figure().add_child(folium_map).render()
+    return html, folium_map.get_name()
+
+
+def with_route(html, map_name, points, color='blue', weight=2.5):
+    """The cached base map with a PolyLine through points appended as a script."""
+    if len(points) < 2:
+        return html
+    script = (
+        f'<script>L.polyline({json.dumps(points)}, '
+        f'{{"color": {json.dumps(color)}, "weight": {weight}, "opacity": 1}}).addTo({map_name});</script>'
+    )
+    return html.replace('</html>', script + '\n</html>') if '</html>' in html else html + script
@@ -0,0 +1,14 @@
+import os
+import shutil
+import tempfile
+
+# Seats, tickets and ticket files the tests write go to a scratch directory,
+# set before any test imports the modules that read these
+SCRATCH = tempfile.mkdtemp(prefix="uts-tests-")
+os.environ["UTS_BOOKINGS_DB"] = os.path.join(SCRATCH, "bookings.db")
+os.environ["UTS_LEDGER_PATH"] = os.path.join(SCRATCH, "tickets.jsonl")
+os.environ["UTS_TICKET_DIR"] = os.path.join(SCRATCH, "ticket_artefacts")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH, ignore_errors=True)
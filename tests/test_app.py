@@ -0,0 +1,74 @@
+import os
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from uts.ledger import LedgerReader
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def release_resources():
+    yield
+    # Each page caches its own ledger, and only one may hold the file
+    st.cache_resource.clear()
+
+
+def run(at):
+    at.run()
+    assert not at.exception, [exception.message for exception in at.exception]
+    return at
+
+
+def click(at, label):
+    next(button for button in at.button if button.label == label).click()
+    return run(at)
+
+
+@pytest.mark.parametrize("script", ["app.py", "app_updated.py"])
+@pytest.mark.parametrize("table", ["route_direct", "route_connection", "route_via"])
+def test_booking_end_to_end(script, table):
+    at = run(AppTest.from_file(os.path.join(ROOT, script), default_timeout=60))
+    if table == "route_via":
+        next(box for box in at.sidebar.selectbox if box.label.startswith("Select Intermediate City")).select("Auto")
+        run(at)
+    # AppTest does not keep a dataframe's selection between runs, so set it for each
+    selection = {"selection": {"rows": [0], "columns": [], "cells": []}}
+    at.session_state[f"{table}_table_1"] = selection
+    run(at)
+    at.session_state[f"{table}_table_1"] = selection
+    at.button(key=f"{table}_select").click()
+    # The page changes on the rerun after the button's
+    run(run(at))
+    assert at.session_state["page"] == "Passenger Details"
+
+    at.text_input[0].input("Asha")
+    at.text_input[1].input("9999999999")
+    run(click(at, "Submit Passenger Details"))
+    assert at.session_state["page"] == "Payment"
+    run(click(at, "Proceed to Payment"))
+    assert at.session_state["page"] == "Ticket Details"
+    assert "Booking Confirmation" in [header.value for header in at.header]
+
+    ticket_id = at.session_state["ticket_id"]
+    ledger = LedgerReader()
+    try:
+        ticket = ledger.get(ticket_id)
+    finally:
+        ledger.close()
+    assert ticket["passenger"]["name"] == "Asha"
+    route = at.session_state["journey_details"]["selected_route"]
+    assert ticket["journey"]["selected_route"][0] == route[0]
+
+    # The ticket shows the route's own duration and fare, whatever its shape
+    duration, fare = (route[2], route[3]) if len(route) == 6 else (route[1], route[2])
+    if script == "app.py":
+        shown_duration = f"{duration} minutes"
+    else:
+        hours, minutes = divmod(int(round(duration)), 60)
+        shown_duration = f"{hours} Hours {minutes} Minutes"
+    shown = [markdown.value for markdown in at.markdown]
+    assert f"**Total Duration:** {shown_duration}" in shown
+    assert f"**Total Fare:** ₹{fare:.2f}" in shown
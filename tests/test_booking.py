@@ -0,0 +1,110 @@
+import pytest
+
+from uts.booking import BookingEngine, HoldExpired, SoldOut, stress
+
+FIRST = "Bus:Jaipur>Ajmer@06:00:00"
+SECOND = "Bus:Ajmer>Jodhpur@09:00:00"
+DATE = "2030-01-01"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def engine(tmp_path, clock):
+    engine = BookingEngine(str(tmp_path / "bookings.db"), hold_seconds=60, clock=clock)
+    engine.set_capacity(FIRST, DATE, 4)
+    engine.set_capacity(SECOND, DATE, 4)
+    yield engine
+    engine.close()
+
+
+def counts(engine, trip):
+    return engine._connection().execute("SELECT held, sold FROM inventory WHERE trip = ? AND date = ?", (trip, DATE)).fetchone()
+
+
+def statuses(engine, hold_id):
+    return [row[0] for row in engine._connection().execute("SELECT status FROM holds WHERE hold_id = ? ORDER BY leg", (hold_id,))]
+
+
+def test_confirm_sells_every_leg(engine):
+    hold_id, _ = engine.hold([(FIRST, DATE), (SECOND, DATE)], 2)
+    engine.confirm(hold_id)
+    assert counts(engine, FIRST) == counts(engine, SECOND) == (0, 2)
+    assert statuses(engine, hold_id) == ["confirmed", "confirmed"]
+    assert engine.available(FIRST, DATE) == 2
+
+
+def test_confirm_after_expiry_sells_nothing(engine, clock):
+    hold_id, _ = engine.hold([(FIRST, DATE)], 2)
+    clock.now += 61
+    with pytest.raises(HoldExpired):
+        engine.confirm(hold_id)
+    assert counts(engine, FIRST)[1] == 0
+    assert engine.available(FIRST, DATE) == 4
+
+
+def test_confirm_with_one_leg_reaped_sells_nothing(engine):
+    hold_id, _ = engine.hold([(FIRST, DATE), (SECOND, DATE)], 1)
+    # Another checkout's hold expired the first leg meanwhile
+    db = engine._connection()
+    db.execute("UPDATE holds SET status = 'expired' WHERE hold_id = ? AND leg = 0", (hold_id,))
+    db.execute("UPDATE inventory SET held = held - 1 WHERE trip = ?", (FIRST,))
+    with pytest.raises(HoldExpired):
+        engine.confirm(hold_id)
+    assert counts(engine, FIRST) == (0, 0)
+    assert counts(engine, SECOND) == (1, 0)
+    assert statuses(engine, hold_id) == ["expired", "held"]
+
+
+def test_confirm_twice_fails(engine):
+    hold_id, _ = engine.hold([(FIRST, DATE)], 1)
+    engine.confirm(hold_id)
+    with pytest.raises(HoldExpired):
+        engine.confirm(hold_id)
+    assert counts(engine, FIRST) == (0, 1)
+
+
+def test_hold_replaces_earlier_hold_on_full_service(engine):
+    first, _ = engine.hold([(FIRST, DATE)], 3)
+    # Only one seat is free to others, but the resubmit may reuse its own three
+    second, _ = engine.hold([(FIRST, DATE)], 4, replaces=first)
+    assert statuses(engine, first) == ["released"]
+    assert counts(engine, FIRST) == (4, 0)
+    engine.confirm(second)
+    assert counts(engine, FIRST) == (0, 4)
+
+
+def test_failed_replacement_keeps_earlier_hold(engine):
+    first, _ = engine.hold([(FIRST, DATE)], 2)
+    with pytest.raises(SoldOut):
+        engine.hold([(FIRST, DATE)], 5, replaces=first)
+    assert statuses(engine, first) == ["held"]
+    assert counts(engine, FIRST) == (2, 0)
+    engine.confirm(first)
+
+
+def test_expired_holds_return_their_seats(engine, clock):
+    engine.hold([(FIRST, DATE)], 4)
+    with pytest.raises(SoldOut):
+        engine.hold([(FIRST, DATE)], 1)
+    clock.now += 61
+    hold_id, _ = engine.hold([(FIRST, DATE)], 4)
+    assert counts(engine, FIRST) == (4, 0)
+    assert statuses(engine, hold_id) == ["held"]
+
+
+def test_concurrent_checkouts_never_oversell(tmp_path):
+    # More checkouts than seats, from several processes at once
+    report = stress(str(tmp_path / "stress.db"), processes=2, threads=4, attempts=10, capacity=50)
+    assert not report["oversold"] and report["consistent"]
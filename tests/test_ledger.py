@@ -0,0 +1,16 @@
+import pytest
+
+from uts.ledger import LedgerReader, TicketLedger
+
+
+def test_append_after_close_raises(tmp_path):
+    path = str(tmp_path / "tickets.jsonl")
+    ledger = TicketLedger(path)
+    ticket_id = ledger.append({"contact": "9999999999"})
+    ledger.close()
+    with pytest.raises(ValueError):
+        ledger.append({"contact": "9999999999"})
+    ledger.close()
+    reader = LedgerReader(path)
+    assert reader.records == 1 and reader.get(ticket_id)["contact"] == "9999999999"
+    reader.close()
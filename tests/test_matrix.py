@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from uts.matrix import RouteMatrix
+from uts.timetable import MODES
+
+CITIES = ["A", "B", "C", "D", "E"]
+
+
+@pytest.fixture
+def matrix():
+    rng = np.random.default_rng(7)
+    n = len(CITIES)
+    matrices = {}
+    for mode in MODES:
+        for criterion in ("duration", "fare"):
+            values = rng.integers(10, 100, size=(n, n)).astype(float)
+            values[rng.random((n, n)) < 0.4] = np.inf
+            np.fill_diagonal(values, np.inf)
+            matrices[(mode, criterion)] = values
+    return RouteMatrix.from_matrices(CITIES, matrices)
+
+
+@pytest.mark.parametrize("budget", [1, 200, 64 << 20])
+@pytest.mark.parametrize("criterion", ["duration", "fare"])
+def test_all_best_via_matches_best_via(matrix, criterion, budget):
+    modes = MODES[:2]
+    via, value = matrix.all_best_via(modes, criterion, budget=budget)
+    for s, start in enumerate(CITIES):
+        for e, end in enumerate(CITIES):
+            if s == e:
+                assert via[s, e] == -1 and value[s, e] == np.inf
+                continue
+            city, total = matrix.best_via(start, end, modes, criterion)
+            assert value[s, e] == total
+            assert (CITIES[via[s, e]] if via[s, e] >= 0 else None) == city
@@ -0,0 +1,105 @@
+import itertools
+
+import pandas as pd
+import pytest
+
+from uts.router import MIN_TRANSFER, pareto_journeys
+from uts.timetable import DAY, TimetableIndex
+
+# (mode, start, end, departure, fare, duration), each running daily
+TRIPS = [
+    ("Bus", "A", "B", "06:00", 50, 120),
+    ("Bus", "A", "B", "22:30", 40, 150),
+    ("Train", "A", "B", "07:00", 90, 60),
+    ("Bus", "B", "C", "08:10", 30, 90),
+    ("Bus", "B", "C", "09:00", 20, 150),
+    ("Train", "B", "C", "08:30", 70, 45),
+    ("Metro", "B", "C", "08:15", 15, 40),
+    ("Train", "B", "D", "01:30", 60, 200),
+    ("Bus", "C", "D", "10:00", 25, 60),
+    ("Metro", "C", "D", "11:00", 10, 30),
+    ("Train", "A", "D", "05:00", 300, 400),
+    ("Bus", "A", "C", "23:50", 80, 400),
+    ("Metro", "D", "B", "12:00", 5, 20),
+    ("Bus", "C", "A", "12:00", 35, 240),
+]
+CITIES = sorted({trip[1] for trip in TRIPS} | {trip[2] for trip in TRIPS})
+
+
+@pytest.fixture(scope="module")
+def index():
+    frame = pd.DataFrame(TRIPS, columns=["mode", "start_city", "end_city", "departure_time", "fare", "duration_min"])
+    frame["departure_time"] += ":00"
+    return TimetableIndex({mode: df.drop(columns="mode") for mode, df in frame.groupby("mode")})
+
+
+def minutes(label):
+    hours, mins = label.split(":")
+    return int(hours) * 60 + int(mins)
+
+
+def boardings(city, modes, after, within):
+    """Every (departure, arrival, fare, end) leaving city in [after, after + within)."""
+    for mode, start, end, departure, fare, duration in TRIPS:
+        if start != city or mode not in modes:
+            continue
+        for day in range(after // DAY, (after + within) // DAY + 1):
+            leaves = day * DAY + minutes(departure)
+            if after <= leaves < after + within:
+                yield leaves, leaves + duration, fare, end
+
+
+def front(costs):
+    return {c for c in costs if not any(o != c and all(x <= y for x, y in zip(o, c)) for o in costs)}
+
+
+def brute_force(start, end, modes, depart_after, latest, max_transfers):
+    """The (duration, fare, transfers) front over every journey, found by enumeration."""
+    costs = set()
+
+    def walk(city, departure, arrival, fare, legs):
+        if legs == max_transfers + 1:
+            return
+        after, within = (arrival + MIN_TRANSFER, DAY) if legs else (depart_after, latest - depart_after + 1)
+        for leaves, arrives, leg_fare, next_city in boardings(city, modes, after, within):
+            if next_city == start:
+                continue
+            first = leaves if not legs else departure
+            if next_city == end:
+                costs.add((arrives - first, fare + leg_fare, legs))
+            else:
+                walk(next_city, first, arrives, fare + leg_fare, legs + 1)
+
+    walk(start, depart_after, depart_after, 0, 0)
+    return front(costs)
+
+
+def bounds_to(end, modes, max_legs):
+    """Admissible {city: (minutes, fare, legs)}: cheapest legs and fewest legs to end."""
+    edges = [(trip[1], trip[2], trip[5], trip[4]) for trip in TRIPS if trip[0] in modes]
+    best = {end: (0, 0, 0)}
+    for _ in range(max_legs):
+        for start, stop, duration, fare in edges:
+            if stop in best and start != end:
+                old = best.get(start, (float("inf"),) * 3)
+                rest = best[stop]
+                best[start] = (min(old[0], duration + rest[0]), min(old[1], fare + rest[1]), min(old[2], rest[2] + 1))
+    return best
+
+
+def costs(journeys):
+    return {(journey.duration, journey.fare, journey.transfers) for journey in journeys}
+
+
+@pytest.mark.parametrize("modes", [("Bus", "Train", "Metro"), ("Bus", "Metro")])
+@pytest.mark.parametrize("window", [(0, DAY - 1), (360, 480), (1300, DAY - 1)])
+@pytest.mark.parametrize("max_transfers", [1, 2])
+def test_pareto_journeys_matches_brute_force(index, modes, window, max_transfers):
+    depart_after, latest = window
+    for start, end in itertools.permutations(CITIES, 2):
+        expected = brute_force(start, end, modes, depart_after, latest, max_transfers)
+        found = pareto_journeys(index, start, end, depart_after, modes, max_transfers=max_transfers, latest=latest)
+        assert costs(found) == expected, (start, end)
+        bounded = pareto_journeys(index, start, end, depart_after, modes, max_transfers=max_transfers, latest=latest,
+                                  bounds=bounds_to(end, modes, max_transfers + 1))
+        assert costs(bounded) == expected, (start, end)
@@ -0,0 +1,57 @@
+"""Timetable loading and route planning, without any UI.
+
+    from uts import load_planner
+    tables, planner = load_planner()
+    optimal_route, routes = planner.suggest("Jaipur", "Jodhpur", ["Bus", "Train"])
+
+Importing the package loads nothing; each name below imports its module,
+and with it numpy or pandas, on first access.
+"""
+import importlib
+
+_EXPORTS = {
+    "DAY": "timetable",
+    "MODES": "timetable",
+    "TimetableIndex": "timetable",
+    "build_index": "timetable",
+    "DATA_DIR": "loader",
+    "SchemaError": "loader",
+    "data_version": "loader",
+    "load_tables": "loader",
+    "load_timetables": "loader",
+    "Journey": "router",
+    "RANKINGS": "router",
+    "earliest_arrival": "router",
+    "format_minutes": "router",
+    "pair_trips": "router",
+    "pareto_journeys": "router",
+    "rank_routes": "router",
+    "suggest_routes": "router",
+    "RouteMatrix": "matrix",
+    "DistanceMatrix": "distance",
+    "RouteTable": "precompute",
+    "load_route_table": "precompute",
+    "table_version": "precompute",
+    "ODSolver": "batch",
+    "od_matrix": "batch",
+    "LRUCache": "cache",
+    "METRICS": "metrics",
+    "ROUTE_CACHE": "planner",
+    "RoundTrip": "planner",
+    "RoutePlanner": "planner",
+    "load_planner": "planner",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,245 @@
+"""Batch origin-destination reports.
+
+    python -m uts.batch [--pairs CSV] [--modes Bus,Train] [--earliest HH:MM] [--latest HH:MM]
+                        [--workers N] [--chunk N] [--output FILE]
+
+For every (start, end) or (start, end, via) query the report holds the
+route suggest_routes ranks first under "Fastest" and under "Cheapest".
+Queries are answered together with array operations over the index
+columns: the first departure in the window is one searchsorted over
+(group, minutes) keys, and the connecting leg reads the same suffix
+minima as TimetableIndex.next_arrival. Without --pairs every ordered
+pair of served cities is reported. --pairs takes a CSV with start_city,
+end_city and an optional via column. Service calendars are not applied,
+as in the precomputed route table. The output is Parquet for a .parquet
+suffix (needs pyarrow), CSV otherwise.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .loader import DATA_DIR, load_timetables
+from .router import MIN_TRANSFER
+from .timetable import DAY, MODES, format_departures
+
+RANKS = {"fastest": (0, 1), "cheapest": (1, 0)}
+
+
+class ODSolver:
+    """Dense per-mode lookups over one index for vectorized route queries."""
+
+    def __init__(self, index):
+        self.cities = index.cities()
+        self.position = {city: i for i, city in enumerate(self.cities)}
+        n = len(self.cities)
+        self._modes = {}
+        for mode in MODES:
+            arrays = index.arrays(mode)
+            if arrays is None:
+                continue
+            start, end, first, minutes, fare, duration, best_arrival, best_row = arrays
+            bounds = np.append(first, len(minutes)).astype(np.int64)
+            rows = self._codes(start), self._codes(end)
+            group = np.full((n, n), -1, dtype=np.int64)
+            group[rows] = np.arange(len(first))
+            # Rows are sorted by (group, minutes), so one searchsorted over
+            # this key finds a departure time within any group
+            key = np.repeat(np.arange(len(first), dtype=np.int64), np.diff(bounds)) * (2 * DAY) + minutes
+            self._modes[mode] = (
+                group, bounds, key, minutes.astype(np.int64), fare.astype(np.float64),
+                duration.astype(np.float64), np.asarray(best_arrival), np.asarray(best_row),
+            )
+
+    def _codes(self, cities):
+        try:
+            return np.fromiter((self.position[city] for city in cities), dtype=np.int64, count=len(cities))
+        except KeyError as error:
+            raise ValueError(f"unknown city {error.args[0]!r}") from None
+
+    def _first(self, mode, start, end, earliest, latest):
+        """Row of each pair's first departure in [earliest, latest], -1 if none."""
+        group, bounds, key, minutes = self._modes[mode][:4]
+        g = group[start, end]
+        found = g >= 0
+        g = np.where(found, g, 0)
+        row = np.searchsorted(key, g * (2 * DAY) + earliest)
+        row = np.minimum(row, len(key) - 1)
+        found &= (row < bounds[g + 1]) & (minutes[row] <= latest)
+        return np.where(found, row, -1)
+
+    def _next_arrival(self, mode, start, end, after):
+        """(arrival, row) of each pair boarding at or after `after`; row -1 if no service."""
+        group, bounds, key, _, _, _, best_arrival, best_row = self._modes[mode]
+        g = group[start, end]
+        found = g >= 0
+        g = np.where(found, g, 0)
+        lo, hi = bounds[g], bounds[g + 1]
+        day_start = np.floor_divide(after, DAY) * DAY
+        i = np.searchsorted(key, g * (2 * DAY) + (after - day_start))
+        today = i < hi
+        i = np.minimum(i, len(key) - 1)
+        tomorrow = day_start + DAY + best_arrival[lo]
+        today &= day_start + best_arrival[i] <= tomorrow
+        arrival = np.where(today, day_start + best_arrival[i], tomorrow)
+        row = np.where(today, best_row[i], best_row[lo])
+        return np.where(found, arrival, np.inf), np.where(found, row, -1)
+
+    def _candidates(self, start, end, via, modes, earliest, latest):
+        """Yield (modes, duration, fare, departure row, first-leg mode) per candidate, in suggest_routes order."""
+        modes = [mode for mode in modes if mode in self._modes]
+        direct = via < 0
+        hop = np.where(direct, 0, via)
+        for mode in modes:
+            row = self._first(mode, start, end, earliest, latest)
+            ok = direct & (row >= 0)
+            _, _, _, _, fare, duration = self._modes[mode][:6]
+            yield (mode,), np.where(ok, duration[row], np.inf), np.where(ok, fare[row], np.inf), np.where(ok, row, -1), mode
+        for mode1 in modes:
+            row1 = self._first(mode1, start, hop, earliest, latest)
+            has_first = ~direct & (row1 >= 0)
+            _, _, _, minutes1, fare1, duration1 = self._modes[mode1][:6]
+            departure = minutes1[row1]
+            ready = departure + duration1[row1] + MIN_TRANSFER
+            for mode2 in modes:
+                arrival, row2 = self._next_arrival(mode2, hop, end, ready)
+                ok = has_first & (row2 >= 0)
+                fare2 = self._modes[mode2][4]
+                yield (
+                    (mode1, mode2),
+                    np.where(ok, arrival - departure, np.inf),
+                    np.where(ok, fare1[row1] + fare2[row2], np.inf),
+                    np.where(ok, row1, -1),
+                    mode1,
+                )
+
+    def solve(self, start, end, via, modes=MODES, earliest=0, latest=DAY - 1):
+        """The report as a DataFrame for city-code arrays (via -1 for direct)."""
+        n = len(start)
+        best = {
+            name: {"duration": np.full(n, np.inf), "fare": np.full(n, np.inf),
+                   "option": np.full(n, -1), "row": np.full(n, -1)}
+            for name in RANKS
+        }
+        options = []
+        for option, (route, duration, fare, row, mode) in enumerate(self._candidates(start, end, via, modes, earliest, latest)):
+            options.append((route, mode))
+            for name, (primary, secondary) in RANKS.items():
+                kept = best[name]
+                values = (duration, fare)
+                kept_values = (kept["duration"], kept["fare"])
+                # Strictly better only, so ties keep the earlier candidate like rank() does
+                better = (values[primary] < kept_values[primary]) | (
+                    (values[primary] == kept_values[primary]) & (values[secondary] < kept_values[secondary]))
+                better &= row >= 0
+                kept["duration"] = np.where(better, duration, kept["duration"])
+                kept["fare"] = np.where(better, fare, kept["fare"])
+                kept["option"] = np.where(better, option, kept["option"])
+                kept["row"] = np.where(better, row, kept["row"])
+
+        frame = {
+            "start_city": pd.Categorical.from_codes(start, categories=self.cities),
+            "end_city": pd.Categorical.from_codes(end, categories=self.cities),
+            "via": pd.Categorical.from_codes(via, categories=self.cities),
+        }
+        labels = np.array([" → ".join(route) for route, _ in options] + [None], dtype=object)
+        for name, kept in best.items():
+            found = kept["option"] >= 0
+            departure = np.full(n, None, dtype=object)
+            for option, (_, mode) in enumerate(options):
+                chosen = kept["option"] == option
+                if chosen.any():
+                    departure[chosen] = format_departures(self._modes[mode][3][kept["row"][chosen]])
+            frame[f"{name}_modes"] = labels[kept["option"]]
+            frame[f"{name}_duration_min"] = np.where(found, kept["duration"], np.nan)
+            frame[f"{name}_fare"] = np.where(found, kept["fare"], np.nan)
+            frame[f"{name}_departure"] = departure
+        return pd.DataFrame(frame)
+
+    def codes(self, pairs):
+        """(start, end, via) code arrays for (start, end[, via]) tuples."""
+        pairs = [tuple(pair) + (None,) * (3 - len(pair)) for pair in pairs]
+        start = self._codes([pair[0] for pair in pairs])
+        end = self._codes([pair[1] for pair in pairs])
+        via = np.full(len(pairs), -1, dtype=np.int64)
+        given = [i for i, pair in enumerate(pairs) if pair[2]]
+        via[given] = self._codes([pairs[i][2] for i in given])
+        return start, end, via
+
+    def all_pairs(self):
+        start, end = np.nonzero(~np.eye(len(self.cities), dtype=bool))
+        return start, end, np.full(len(start), -1, dtype=np.int64)
+
+
+def od_matrix(index, pairs=None, modes=MODES, earliest=0, latest=DAY - 1):
+    """Fastest and cheapest route per (start, end[, via]) pair, or for all pairs when None."""
+    solver = ODSolver(index)
+    codes = solver.all_pairs() if pairs is None else solver.codes(pairs)
+    return solver.solve(*codes, modes, earliest, latest)
+
+
+_worker_solver = None
+
+
+def _init_worker(data_dir):
+    global _worker_solver
+    _, index = load_timetables(data_dir)
+    _worker_solver = ODSolver(index)
+
+
+def _solve(args):
+    return _worker_solver.solve(*args)
+
+
+def parallel_od_matrix(pairs=None, modes=MODES, earliest=0, latest=DAY - 1, workers=None, chunk=50000, data_dir=DATA_DIR):
+    """od_matrix in chunks of pairs across a process pool."""
+    _, index = load_timetables(data_dir)
+    solver = ODSolver(index)
+    start, end, via = solver.all_pairs() if pairs is None else solver.codes(pairs)
+    chunks = [
+        (start[lo:lo + chunk], end[lo:lo + chunk], via[lo:lo + chunk], modes, earliest, latest)
+        for lo in range(0, len(start), chunk)
+    ]
+    if workers == 1 or len(chunks) <= 1:
+        frames = [solver.solve(*args) for args in chunks]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(data_dir,)) as pool:
+            frames = list(pool.map(_solve, chunks))
+    if not frames:
+        return solver.solve(*(np.empty(0, dtype=np.int64),) * 3, modes, earliest, latest)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _minutes(text):
+    hours, minutes = text.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fastest and cheapest routes for many district pairs.")
+    parser.add_argument("--pairs", help="CSV with start_city, end_city and optional via (default: all pairs)")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated modes")
+    parser.add_argument("--earliest", default="00:00", help="earliest first departure, HH:MM")
+    parser.add_argument("--latest", default="23:59", help="latest first departure, HH:MM")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk", type=int, default=50000, help="pairs per worker task")
+    parser.add_argument("--output", default="od_matrix.csv", help="report path, .parquet or .csv")
+    args = parser.parse_args()
+
+    pairs = None
+    if args.pairs:
+        df = pd.read_csv(args.pairs)
+        columns = [column for column in ("start_city", "end_city", "via") if column in df.columns]
+        pairs = [tuple(None if pd.isna(city) else city for city in row) for row in df[columns].itertuples(index=False)]
+    modes = tuple(mode.strip() for mode in args.modes.split(","))
+    report = parallel_od_matrix(pairs, modes, _minutes(args.earliest), _minutes(args.latest), args.workers, args.chunk)
+    if args.output.endswith(".parquet"):
+        report.to_parquet(args.output, index=False)
+    else:
+        report.to_csv(args.output, index=False)
+    print(f"Wrote {len(report)} pairs to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
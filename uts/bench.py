@@ -0,0 +1,313 @@
+"""Routing benchmarks with stored results.
+
+    python -m uts.bench [--data DIR | --cities N [--trips N] [--degree K] [--seed S]]
+                        [--queries N] [--hop-queries N] [--budget SECONDS] [--label TEXT] [--results PATH]
+                        [--threshold F] [--check] [--no-save]
+
+Measures, on the bundled timetables or on a synthetic set from
+uts.synth (generated once under benchmarks/data/ and reused):
+
+    load        CSV parse, index and planner build, store compile and open
+    memory      peak and retained resident memory of the CSV load (Linux)
+    latency     p50/p99 of route_details (the pages' get_route_details),
+                suggest direct and via a city (suggest_optimal_route),
+                and multi-hop connections
+    throughput  route_details and suggest calls per second, and OD-matrix
+                pairs per second through the vectorized batch solver
+
+The CSV load and the store compile each run in a fresh process, so
+their memory is measured alone and handed back afterwards. Queries are
+sampled from served pairs with a fixed seed and run on a planner over
+the compiled store, as the apps load it, without the route cache or the
+precomputed table, so the searches themselves are timed; multi-hop
+searches are pruned by the district distance bounds as in the apps. A
+latency section stops early once it has spent --budget seconds; pass
+--hop-queries 0 to skip the multi-hop searches. Each run is appended as one JSON line to
+the results file together with the commit it ran on, then compared with
+the previous run on the same dataset; metrics more than --threshold worse
+are flagged, and --check makes that exit non-zero.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .batch import ODSolver
+from .distance import DistanceMatrix
+from .loader import DATA_DIR, load_tables
+from .matrix import RouteMatrix
+from .planner import RoutePlanner
+from .store import compile_store, open_store
+from .synth import generate
+from .timetable import MODES, build_index
+
+BENCH_DIR = os.path.join(DATA_DIR, "benchmarks")
+RESULTS_PATH = os.path.join(BENCH_DIR, "results.jsonl")
+
+# Slowdowns smaller than this are timer noise, whatever the ratio
+NOISE_FLOOR = {"_s": 0.005, "_ms": 0.01}
+
+
+def synthetic_dataset(cities, trips, degree, seed):
+    """(data_dir, description) of a synthetic set, generated on first use."""
+    description = {"kind": "synthetic", "cities": cities, "trips": trips, "degree": degree, "seed": seed}
+    path = os.path.join(BENCH_DIR, "data", f"c{cities}-t{trips}-d{degree}-s{seed}")
+    if not os.path.exists(os.path.join(path, "synthetic.json")):
+        _note(f"generating {path}")
+        generate(path, cities, trips, degree, seed=seed)
+    return path, description
+
+
+def _note(text):
+    print(f"[{datetime.now():%H:%M:%S}] {text}", file=sys.stderr, flush=True)
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def _rss_mb():
+    """Resident memory of this process in MB, or None off Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Uncached, so every query runs its search
+def _planner(index, tables):
+    matrix = RouteMatrix(index, tables["districts"]["city"])
+    distances = DistanceMatrix(matrix, tables["districts"], tables["distance"])
+    return RoutePlanner(index, cache=None, matrix=matrix, distances=distances)
+
+
+def _load_csv(data_dir):
+    """Timings and memory of the CSV load path; runs in a fresh process."""
+    metrics = {}
+    baseline = _rss_mb()
+    tables, metrics["load_csv_s"] = _timed(load_tables, data_dir)
+    index, metrics["build_index_s"] = _timed(build_index, tables["bus"], tables["train"], tables["metro"])
+    _, metrics["build_planner_s"] = _timed(_planner, index, tables)
+    if baseline is not None:
+        metrics["memory_peak_mb"] = _peak_rss_mb() - baseline
+        metrics["memory_retained_mb"] = _rss_mb() - baseline
+    return metrics
+
+
+def _in_child(fn, *args):
+    """fn(*args) in a fresh process, so its memory is measured alone and then returned."""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def measure_load(data_dir, store_dir):
+    """Load metrics, and the planner over the store compiled into store_dir."""
+    _note("loading the CSVs")
+    metrics = _in_child(_load_csv, data_dir)
+    _note("compiling the store")
+    _, metrics["compile_store_s"] = _timed(_in_child, compile_store, data_dir, store_dir)
+    started = time.perf_counter()
+    store = open_store(store_dir, data_dir)
+    tables, index = store.tables(), store.index()
+    metrics["open_store_s"] = time.perf_counter() - started
+    metrics["trips"] = sum(len(tables[name]) for name in ("bus", "train", "metro"))
+    metrics["cities"] = len(index.cities())
+    return _planner(index, tables), metrics
+
+
+def sample_queries(index, count, hop_count, seed):
+    """Direct, via and multi-hop queries that all have at least one route."""
+    rng = random.Random(seed)
+    pairs = index.pairs()
+    outgoing = {}
+
+    def neighbours(city):
+        if city not in outgoing:
+            outgoing[city] = sorted({next_city for next_city, *_ in index.outgoing(city)})
+        return outgoing[city]
+
+    direct = [rng.choice(pairs) for _ in range(count)]
+    via, hops = [], []
+    for _ in range(count * 20):
+        if len(via) >= count:
+            break
+        start, middle, _ = rng.choice(pairs)
+        ends = [city for city in neighbours(middle) if city != start]
+        if ends:
+            via.append((start, rng.choice(ends), middle))
+    for _ in range(hop_count * 20):
+        if len(hops) >= hop_count:
+            break
+        # Two or three legs out, to a city with no direct service from the start
+        route = [rng.choice(pairs)[0]]
+        for _ in range(rng.choice((2, 3))):
+            choices = [city for city in neighbours(route[-1]) if city not in route]
+            if not choices:
+                break
+            route.append(rng.choice(choices))
+        if len(route) > 2 and route[-1] not in neighbours(route[0]):
+            hops.append((route[0], route[-1]))
+    return direct, via, hops
+
+
+def _latencies(prefix, fn, queries, budget):
+    """Latency of fn over queries, stopping early once budget seconds are spent."""
+    if not queries:
+        return {}
+    seconds = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(*query)
+        seconds.append(time.perf_counter() - started)
+        if sum(seconds) > budget:
+            break
+    seconds = np.array(seconds)
+    return {
+        f"{prefix}_queries": len(seconds),
+        f"{prefix}_p50_ms": float(np.percentile(seconds, 50)) * 1000,
+        f"{prefix}_p99_ms": float(np.percentile(seconds, 99)) * 1000,
+        f"{prefix}_per_s": len(seconds) / seconds.sum(),
+    }
+
+
+def measure_queries(planner, queries, hop_queries, seed, budget=60.0):
+    direct, via, hops = sample_queries(planner.index, queries, hop_queries, seed)
+    modes = list(MODES)
+    metrics = {}
+    _note(f"timing {len(direct)} direct, {len(via)} via and {len(hops)} multi-hop queries")
+    metrics.update(_latencies("route_details", planner.route_details, direct, budget))
+    metrics.update(_latencies("suggest_direct", lambda start, end, _: planner.suggest(start, end, modes), direct, budget))
+    metrics.update(_latencies("suggest_via", lambda start, end, middle: planner.suggest(start, end, modes, middle), via, budget))
+    if hops:
+        _note("timing multi-hop queries")
+    metrics.update(_latencies("multihop", lambda start, end: planner.connections(start, end, modes), hops, budget))
+
+    _note("timing the OD matrix")
+    solver, metrics["od_solver_build_s"] = _timed(ODSolver, planner.index)
+    rng = np.random.default_rng(seed)
+    size = max(queries * 100, 10000)
+    start, end = rng.integers(len(solver.cities), size=(2, size))
+    keep = start != end
+    seconds = min(_timed(solver.solve, start[keep], end[keep], np.full(int(keep.sum()), -1))[1] for _ in range(3))
+    metrics["od_matrix_pairs_per_s"] = int(keep.sum()) / seconds
+    return metrics
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=DATA_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(data_dir, dataset, queries=200, hop_queries=20, seed=0, label=None, budget=60.0):
+    with tempfile.TemporaryDirectory() as store_dir:
+        planner, metrics = measure_load(data_dir, os.path.join(store_dir, "timetable.store"))
+        metrics.update(measure_queries(planner, queries, hop_queries, seed, budget))
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "label": label,
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": f"{platform.machine()} {os.cpu_count()} CPUs",
+        "dataset": dataset,
+        "queries": {"count": queries, "hops": hop_queries, "seed": seed, "budget": budget},
+        "metrics": {name: round(value, 6) if isinstance(value, float) else value for name, value in metrics.items()},
+    }
+
+
+def previous_result(path, result):
+    """The latest stored run on the same dataset and queries, or None."""
+    match = None
+    try:
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["dataset"] == result["dataset"] and entry["queries"] == result["queries"]:
+                    match = entry
+    except FileNotFoundError:
+        pass
+    return match
+
+
+def compare(previous, current, threshold):
+    """Printable comparison lines and the names of the metrics that regressed."""
+    lines, regressions = [], []
+    for name, value in current["metrics"].items():
+        before = previous["metrics"].get(name) if previous else None
+        if not isinstance(value, float) or not before:
+            lines.append(f"{name:28} {value:>14,.3f}" if isinstance(value, float) else f"{name:28} {value:>14,}")
+            continue
+        # Throughput is better higher, everything else lower
+        change = value / before - 1
+        worse = -change if name.endswith("_per_s") else change
+        floor = next((floor for suffix, floor in NOISE_FLOOR.items() if name.endswith(suffix) and not name.endswith("_per_s")), 0)
+        flag = "  REGRESSION" if worse > threshold and abs(value - before) > floor else ""
+        if flag:
+            regressions.append(name)
+        lines.append(f"{name:28} {value:>14,.3f} {before:>14,.3f} {change:>+8.1%}{flag}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading and routing, and store the results.")
+    parser.add_argument("--data", default=DATA_DIR, help="directory with the five CSVs (default: bundled data)")
+    parser.add_argument("--cities", type=int, help="benchmark a synthetic set with this many cities instead")
+    parser.add_argument("--trips", type=int, default=1_000_000, help="synthetic trips across all modes")
+    parser.add_argument("--degree", type=int, default=12, help="synthetic bus neighbours per city")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic set and the queries")
+    parser.add_argument("--queries", type=int, default=200, help="direct and via queries each")
+    parser.add_argument("--hop-queries", type=int, default=20, help="multi-hop queries")
+    parser.add_argument("--budget", type=float, default=60.0, help="seconds per latency section before it stops early")
+    parser.add_argument("--label", help="note stored with the result")
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON-lines results file")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown flagged as a regression")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 on a regression")
+    parser.add_argument("--no-save", action="store_true", help="don't append this run to the results file")
+    args = parser.parse_args()
+
+    if args.cities:
+        data_dir, dataset = synthetic_dataset(args.cities, args.trips, args.degree, args.seed)
+    else:
+        data_dir = args.data
+        dataset = {"kind": "bundled"} if os.path.abspath(data_dir) == DATA_DIR else {"kind": "directory", "path": os.path.abspath(data_dir)}
+    result = run(data_dir, dataset, args.queries, args.hop_queries, args.seed, args.label, args.budget)
+    previous = previous_result(args.results, result)
+    lines, regressions = compare(previous, result, args.threshold)
+    if previous:
+        print(f"{'metric':28} {'this run':>14} {previous['commit'] or 'previous':>14} {'change':>8}")
+    print("\n".join(lines))
+    if not args.no_save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+        with open(args.results, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    if regressions and args.check:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Seat inventory and bookings in a local SQLite database.
+
+    python -m uts.booking stress [--processes P] [--threads T] [--capacity N] [--db PATH]
+
+Each trip (one departure of one mode between two cities) has a capacity
+per date. Checkout first holds seats on every leg of the journey; a hold
+expires after hold_seconds unless it is confirmed. Holding and
+confirming are single conditional UPDATEs inside BEGIN IMMEDIATE
+transactions, so the check and the change are atomic across threads
+and processes. The database runs in WAL mode, so seat counts can be
+read while a booking commits. UTS_BOOKINGS_DB overrides the default
+database file.
+
+The stress command runs many processes and threads of concurrent
+checkouts against one small trip. Some checkouts abandon their hold.
+It then checks that the seats sold never exceed the capacity and match
+the confirmed holds.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from .loader import DATA_DIR
+
+BOOKINGS_PATH = os.environ.get("UTS_BOOKINGS_DB") or os.path.join(DATA_DIR, "bookings.db")
+# Seats per departure when no capacity has been set for a trip
+CAPACITY = {"Bus": 40, "Train": 400, "Metro": 200}
+HOLD_SECONDS = 10 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory (
+    trip TEXT NOT NULL,
+    date TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    held INTEGER NOT NULL DEFAULT 0,
+    sold INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (trip, date),
+    CHECK (held >= 0 AND sold >= 0 AND held + sold <= capacity)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS holds (
+    hold_id TEXT NOT NULL,
+    leg INTEGER NOT NULL,
+    trip TEXT NOT NULL,
+    date TEXT NOT NULL,
+    seats INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (hold_id, leg)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS holds_active ON holds (trip, date, expires) WHERE status = 'held';
+"""
+
+
+class BookingError(Exception):
+    pass
+
+
+class SoldOut(BookingError):
+    pass
+
+
+class HoldExpired(BookingError):
+    pass
+
+
+def trip_id(mode, start, end, departure_time):
+    return f"{mode}:{start}>{end}@{departure_time}"
+
+
+def journey_trips(details):
+    """[(trip, date)] for every leg of a journey as the pages store it.
+
+    details holds start_city, end_city, intermediate_city, journey_date
+    and selected_route (a route tuple), or legs of (mode, start, end,
+    departure_time, day) for connections, day counting from journey_date.
+    """
+    journey_date = details["journey_date"]
+    if details.get("legs"):
+        return [
+            (trip_id(mode, start, end, departure_time), journey_date + timedelta(days=day))
+            for mode, start, end, departure_time, day in details["legs"]
+        ]
+    route = details["selected_route"]
+    if len(route) == 6:
+        mode1, mode2, _, _, start_time1, start_time2 = route
+        via = details["intermediate_city"]
+        # A second leg leaving earlier in the day than the first runs the next day
+        second_date = journey_date + timedelta(days=1) if str(start_time2) < str(start_time1) else journey_date
+        return [
+            (trip_id(mode1, details["start_city"], via, start_time1), journey_date),
+            (trip_id(mode2, via, details["end_city"], start_time2), second_date),
+        ]
+    return [(trip_id(route[0], details["start_city"], details["end_city"], route[3]), journey_date)]
+
+
+class BookingEngine:
+    """Seat holds and confirmations; safe to share between threads."""
+
+    def __init__(self, path=BOOKINGS_PATH, hold_seconds=HOLD_SECONDS, capacity=CAPACITY, clock=time.time):
+        self.path = path
+        self.hold_seconds = hold_seconds
+        self.capacity = capacity
+        self.clock = clock
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def _default_capacity(self, trip):
+        return self.capacity.get(trip.split(":", 1)[0], 0)
+
+    def set_capacity(self, trip, date, capacity):
+        with self._transaction() as db:
+            changed = db.execute(
+                "INSERT INTO inventory (trip, date, capacity) VALUES (?, ?, ?) ON CONFLICT (trip, date)"
+                " DO UPDATE SET capacity = excluded.capacity WHERE held + sold <= excluded.capacity",
+                (trip, str(date), capacity),
+            ).rowcount
+            if not changed:
+                raise BookingError(f"{trip} on {date} already has more than {capacity} seats taken")
+
+    def _expire(self, db, trip, date, now):
+        """Return the seats of lapsed holds on one trip to its inventory."""
+        lapsed = db.execute(
+            "SELECT COALESCE(SUM(seats), 0) FROM holds WHERE trip = ? AND date = ? AND status = 'held' AND expires <= ?",
+            (trip, date, now),
+        ).fetchone()[0]
+        if lapsed:
+            db.execute(
+                "UPDATE holds SET status = 'expired' WHERE trip = ? AND date = ? AND status = 'held' AND expires <= ?",
+                (trip, date, now),
+            )
+            db.execute("UPDATE inventory SET held = held - ? WHERE trip = ? AND date = ?", (lapsed, trip, date))
+
+    def available(self, trip, date):
+        db = self._connection()
+        row = db.execute(
+            "SELECT capacity - sold - COALESCE((SELECT SUM(seats) FROM holds h WHERE h.trip = i.trip AND h.date = i.date"
+            " AND h.status = 'held' AND h.expires > ?), 0) FROM inventory i WHERE trip = ? AND date = ?",
+            (self.clock(), trip, str(date)),
+        ).fetchone()
+        return row[0] if row is not None else self._default_capacity(trip)
+
+    def hold(self, trips, seats, replaces=None):
+        """Hold seats on every (trip, date) or none of them; returns (hold_id, expires).
+
+        replaces is a hold of the same checkout to release in the same
+        transaction, so its seats count as free for the new hold and it
+        stays in place if the new hold fails.
+        """
+        hold_id = uuid.uuid4().hex
+        with self._transaction() as db:
+            # Read the clock once the transaction has the lock, which can take a while
+            now = self.clock()
+            expires = now + self.hold_seconds
+            if replaces:
+                self._release(db, replaces)
+            for leg, (trip, date) in enumerate(trips):
+                date = str(date)
+                db.execute(
+                    "INSERT OR IGNORE INTO inventory (trip, date, capacity) VALUES (?, ?, ?)",
+                    (trip, date, self._default_capacity(trip)),
+                )
+                self._expire(db, trip, date, now)
+                taken = db.execute(
+                    "UPDATE inventory SET held = held + ? WHERE trip = ? AND date = ? AND capacity - sold - held >= ?",
+                    (seats, trip, date, seats),
+                ).rowcount
+                if not taken:
+                    raise SoldOut(f"not enough seats left on {trip} on {date}")
+                db.execute(
+                    "INSERT INTO holds (hold_id, leg, trip, date, seats, expires, status) VALUES (?, ?, ?, ?, ?, ?, 'held')",
+                    (hold_id, leg, trip, date, seats, expires),
+                )
+        return hold_id, expires
+
+    def confirm(self, hold_id):
+        """Turn a live hold into sold seats; raises HoldExpired if any leg lapsed or was released."""
+        with self._transaction() as db:
+            now = self.clock()
+            legs = db.execute("SELECT trip, date, seats, status, expires FROM holds WHERE hold_id = ?", (hold_id,)).fetchall()
+            # All legs or none: a journey with one leg sold is no use to anyone
+            if not legs or any(status != "held" or expires <= now for _, _, _, status, expires in legs):
+                raise HoldExpired(f"hold {hold_id} has expired or was released")
+            db.execute("UPDATE holds SET status = 'confirmed' WHERE hold_id = ? AND status = 'held'", (hold_id,))
+            for trip, date, seats, _, _ in legs:
+                db.execute("UPDATE inventory SET held = held - ?, sold = sold + ? WHERE trip = ? AND date = ?", (seats, seats, trip, date))
+
+    def release(self, hold_id):
+        """Give up a hold that has not been confirmed; returns whether there was one."""
+        with self._transaction() as db:
+            return self._release(db, hold_id)
+
+    def _release(self, db, hold_id):
+        legs = db.execute("SELECT trip, date, seats FROM holds WHERE hold_id = ? AND status = 'held'", (hold_id,)).fetchall()
+        db.execute("UPDATE holds SET status = 'released' WHERE hold_id = ? AND status = 'held'", (hold_id,))
+        for trip, date, seats in legs:
+            db.execute("UPDATE inventory SET held = held - ? WHERE trip = ? AND date = ?", (seats, trip, date))
+        return bool(legs)
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on any exception."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, kind, value, traceback):
+        self.db.execute("COMMIT" if kind is None else "ROLLBACK")
+        return False
+
+
+STRESS_TRIP = trip_id("Bus", "Jaipur", "Jodhpur", "06:00:00")
+STRESS_DATE = "2030-01-01"
+
+
+def _stress_worker(path, threads, attempts, seed):
+    """Checkouts from one process; returns (confirmed seats, sold out, expired, abandoned)."""
+    counts = [0, 0, 0, 0]
+    lock = threading.Lock()
+
+    def checkout(rng):
+        engine = BookingEngine(path, hold_seconds=5)
+        local = [0, 0, 0, 0]
+        for _ in range(attempts):
+            seats = rng.randint(1, 4)
+            try:
+                hold_id, _ = engine.hold([(STRESS_TRIP, STRESS_DATE)], seats)
+            except SoldOut:
+                local[1] += 1
+                continue
+            if rng.random() < 0.2:
+                engine.release(hold_id)
+                local[3] += 1
+                continue
+            try:
+                engine.confirm(hold_id)
+                local[0] += seats
+            except HoldExpired:
+                local[2] += 1
+        engine.close()
+        with lock:
+            for i, value in enumerate(local):
+                counts[i] += value
+
+    workers = [threading.Thread(target=checkout, args=(random.Random(seed * 1000 + i),)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return counts
+
+
+def stress(path, processes=8, threads=16, attempts=50, capacity=2000):
+    """Concurrent checkouts against one trip; returns a report, with "oversold" False when correct."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    engine = BookingEngine(path)
+    engine.set_capacity(STRESS_TRIP, STRESS_DATE, capacity)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(processes) as pool:
+        results = list(pool.map(_stress_worker, [path] * processes, [threads] * processes, [attempts] * processes, range(processes)))
+    elapsed = time.perf_counter() - started
+    confirmed, sold_out, expired, abandoned = (sum(column) for column in zip(*results))
+    db = engine._connection()
+    sold, held = db.execute("SELECT sold, held FROM inventory WHERE trip = ? AND date = ?", (STRESS_TRIP, STRESS_DATE)).fetchone()
+    booked = db.execute("SELECT COALESCE(SUM(seats), 0) FROM holds WHERE status = 'confirmed'").fetchone()[0]
+    engine.close()
+    checkouts = processes * threads * attempts
+    return {
+        "checkouts": checkouts,
+        "checkouts_per_second": round(checkouts / elapsed, 1),
+        "capacity": capacity,
+        "sold": sold,
+        "held": held,
+        "confirmed_by_clients": confirmed,
+        "confirmed_in_ledger": booked,
+        "sold_out": sold_out,
+        "expired": expired,
+        "abandoned": abandoned,
+        "oversold": sold > capacity,
+        # Every confirmed seat is counted once and no hold is left over
+        "consistent": sold == booked == confirmed and held == 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seat inventory tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    stress_parser = commands.add_parser("stress", help="check for overselling under concurrent checkouts")
+    stress_parser.add_argument("--processes", type=int, default=8)
+    stress_parser.add_argument("--threads", type=int, default=16, help="checkout threads per process")
+    stress_parser.add_argument("--attempts", type=int, default=50, help="checkouts per thread")
+    stress_parser.add_argument("--capacity", type=int, default=2000)
+    stress_parser.add_argument("--db", default=os.path.join(DATA_DIR, "bookings-stress.db"))
+    args = parser.parse_args()
+    report = stress(args.db, args.processes, args.threads, args.attempts, args.capacity)
+    for name, value in report.items():
+        print(f"{name}: {value}")
+    sys.exit(1 if report["oversold"] or not report["consistent"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a TTL, its entries keyed by version.
+
+    Entries belong to the version they were stored under and are only
+    served to the same version, so results computed from an old
+    timetable are never served after a reload. Old versions are not
+    dropped at once: requests still finishing on the old snapshot keep
+    their entries while the new one fills up, and the old entries age
+    out through the LRU and the TTL.
+    """
+
+    def __init__(self, maxsize=4096, ttl=15 * 60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        # (version, key) -> (stored, value); entries per version
+        self._entries = OrderedDict()
+        self._versions = Counter()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def _drop(self, entry_key):
+        del self._entries[entry_key]
+        self._versions[entry_key[0]] -= 1
+        if not self._versions[entry_key[0]]:
+            del self._versions[entry_key[0]]
+
+    def get(self, version, key, default=None):
+        entry_key = (version, key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None:
+                stored, value = entry
+                if self.ttl is None or self.clock() - stored < self.ttl:
+                    self._entries.move_to_end(entry_key)
+                    self.hits += 1
+                    return value
+                self._drop(entry_key)
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, version, key, value):
+        entry_key = (version, key)
+        with self._lock:
+            if entry_key not in self._entries:
+                self._versions[version] += 1
+            self._entries[entry_key] = (self.clock(), value)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                # Timetable versions with entries; more than one while old ones age out
+                "versions": len(self._versions),
+            }
+
+    def __len__(self):
+        return len(self._entries)
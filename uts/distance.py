@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+from .timetable import MODES
+
+EARTH_RADIUS_KM = 6371.0
+# Bounds are shaded down this much, so float32 rounding never lifts one above the truth
+SLACK = 1e-4
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle km between points, broadcasting like numpy."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class DistanceMatrix:
+    """Dense city x city distances over a RouteMatrix's cities.
+
+    km is the distance table's road distance where it has the pair and the
+    great-circle distance from the district coordinates elsewhere; NaN
+    only where a city has no coordinates. Lower bounds use the
+    great-circle distance alone: it obeys the triangle inequality, which
+    road distances need not, so distance / fastest speed and distance x
+    cheapest fare per km never overestimate a journey of any number of
+    legs. Speeds and fare rates are the extremes over every direct pair
+    of each mode, measured on the same distances.
+    """
+
+    def __init__(self, matrix, districts, distance):
+        self.cities = matrix.cities
+        self.position = matrix.position
+        self._matrix = matrix
+        n = len(self.cities)
+        cities = pd.Index(self.cities)
+        rows = cities.get_indexer(districts["city"])
+        # float32 like the tables, which also halves the n x n temporaries
+        latitude = np.full(n, np.nan, dtype=np.float32)
+        longitude = np.full(n, np.nan, dtype=np.float32)
+        latitude[rows[rows >= 0]] = np.asarray(districts["latitude"], dtype=np.float32)[rows >= 0]
+        longitude[rows[rows >= 0]] = np.asarray(districts["longitude"], dtype=np.float32)[rows >= 0]
+        crow = haversine(latitude[:, None], longitude[:, None], latitude[None, :], longitude[None, :])
+        self.km = crow.copy()
+        start, end = cities.get_indexer(distance["start_city"]), cities.get_indexer(distance["end_city"])
+        known = (start >= 0) & (end >= 0)
+        self.km[start[known], end[known]] = np.asarray(distance["distance_km"], dtype=np.float32)[known]
+        np.fill_diagonal(self.km, 0)
+        # A city without coordinates bounds nothing
+        self._crow = np.nan_to_num(crow, nan=0.0)
+        self.speed, self.fare_per_km = {}, {}
+        for mode in MODES:
+            duration, fare = (matrix.matrices()[(mode, criterion)] for criterion in ("duration", "fare"))
+            direct = np.isfinite(duration) & (self._crow > 0)
+            if not direct.any():
+                self.speed[mode], self.fare_per_km[mode] = 0.0, np.inf
+                continue
+            with np.errstate(divide="ignore"):
+                self.speed[mode] = float(np.max(self._crow[direct] / duration[direct]))
+                self.fare_per_km[mode] = float(np.min(fare[direct] / self._crow[direct]))
+        self._adjacency = {}
+
+    def distance(self, start, end):
+        """Road km between two cities, great-circle where the table lacks the pair."""
+        if start not in self.position or end not in self.position:
+            return None
+        km = self.km[self.position[start], self.position[end]]
+        return None if np.isnan(km) else float(km)
+
+    def _reachable(self, modes):
+        key = tuple(sorted(modes))
+        adjacency = self._adjacency.get(key)
+        if adjacency is None:
+            adjacency = self._adjacency[key] = np.isfinite(self._matrix.best(key, "duration"))
+        return adjacency
+
+    def legs_to(self, end, modes, limit):
+        """Fewest legs from every city to end, limit + 1 where it takes more."""
+        legs = np.full(len(self.cities), limit + 1, dtype=np.int16)
+        if end not in self.position:
+            return legs
+        adjacency = self._reachable(modes)
+        frontier = np.zeros(len(self.cities), dtype=bool)
+        frontier[self.position[end]] = True
+        legs[frontier] = 0
+        for step in range(1, limit + 1):
+            frontier = adjacency[:, frontier].any(axis=1) & (legs > step)
+            if not frontier.any():
+                break
+            legs[frontier] = step
+        return legs
+
+    def bounds(self, end, modes, max_legs):
+        """{city: (minutes, fare, legs)} lower bounds from each city to end.
+
+        Cities that need more than max_legs legs, or cannot reach end on
+        these modes at all, are left out.
+        """
+        legs = self.legs_to(end, modes, max_legs)
+        near = np.flatnonzero(legs <= max_legs)
+        if not len(near):
+            return {}
+        km = self._crow[near, self.position[end]].astype(np.float64) * (1 - SLACK)
+        speed = max((self.speed[mode] for mode in modes), default=0.0)
+        rate = min((self.fare_per_km[mode] for mode in modes), default=np.inf)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            minutes = np.where(km > 0, km / speed, 0.0) if speed else np.where(km > 0, np.inf, 0.0)
+            fare = np.where(km > 0, km * rate, 0.0)
+        return {
+            self.cities[city]: bound
+            for city, bound in zip(near.tolist(), zip(minutes.tolist(), fare.tolist(), legs[near].tolist()))
+        }
+
+    def reachable(self, start, end, modes, max_legs):
+        """Whether start can reach end within max_legs legs, ignoring timetables."""
+        if start not in self.position:
+            return False
+        return bool(self.legs_to(end, modes, max_legs)[self.position[start]] <= max_legs)
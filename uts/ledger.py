@@ -0,0 +1,261 @@
+"""Append-only ledger of confirmed tickets.
+
+    python -m uts.ledger scan [--path PATH]
+    python -m uts.ledger find (--id TICKET_ID | --contact NUMBER) [--path PATH]
+
+One ticket per line, written as "<crc32 hex> <json>\\n". Appends from
+any thread are queued for a single writer thread that writes everything
+queued with one write and one fsync (group commit) before telling the
+callers, so a burst of confirmations shares an fsync instead of paying
+one each. A batch that fails is cut off the file again before its
+callers hear of the error, so the offsets of later records stay right.
+Opening the ledger scans it once: records that fail their
+checksum are skipped and a torn last line from a crash is truncated,
+and the scan builds in-memory indexes from ticket id and contact number
+to file offsets. Only one TicketLedger may write a file at a time: it
+holds an exclusive flock on it, and a second one raises LedgerLocked.
+LedgerReader opens a ledger read only, for inspecting a live one.
+UTS_LEDGER_PATH overrides the default file, so each replica of the app
+on a host can write its own.
+"""
+import argparse
+import fcntl
+import json
+import os
+import queue
+import threading
+import uuid
+import weakref
+import zlib
+from concurrent.futures import Future
+from datetime import datetime
+
+from .loader import DATA_DIR
+
+LEDGER_PATH = os.environ.get("UTS_LEDGER_PATH") or os.path.join(DATA_DIR, "tickets.jsonl")
+
+
+def encode(ticket):
+    payload = json.dumps(ticket, separators=(",", ":"), ensure_ascii=False, default=_jsonable).encode()
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def decode(line):
+    """The ticket in one ledger line, or None if it is torn or corrupt."""
+    if len(line) < 10 or line[8:9] != b" " or not line.endswith(b"\n"):
+        return None
+    payload = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+# Open writers, whose files a forked child must not keep open
+_WRITERS = weakref.WeakSet()
+
+
+def _close_in_child():
+    # A forked child shares each writer's open file, and with it the flock;
+    # closing the child's copies leaves the lock to the parent alone
+    for ledger in list(_WRITERS):
+        os.close(ledger._fd)
+
+
+os.register_at_fork(after_in_child=_close_in_child)
+
+
+def _jsonable(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class LedgerLocked(Exception):
+    """Another TicketLedger already writes the file."""
+
+
+class LedgerReader:
+    """A ledger indexed once for lookups, never written or truncated."""
+
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        self.records = self.corrupt = self.torn = 0
+        # ticket_id -> (offset, length); contact -> [ticket_id]
+        self._offsets = {}
+        self._contacts = {}
+        self._lock = threading.Lock()
+        try:
+            self._read_fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            self._read_fd = None
+        self._size = self._scan()
+
+    def _scan(self):
+        """Index every intact record; the offset where they end."""
+        if self._read_fd is None:
+            return 0
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                ticket = decode(line)
+                if ticket is None:
+                    self.corrupt += 1
+                else:
+                    self._index(ticket, offset, len(line))
+                offset += len(line)
+            self.torn = f.seek(0, os.SEEK_END) - offset
+        return offset
+
+    def _index(self, ticket, offset, length):
+        self._offsets[ticket["ticket_id"]] = (offset, length)
+        self._contacts.setdefault(ticket.get("contact"), []).append(ticket["ticket_id"])
+        self.records += 1
+
+    def get(self, ticket_id):
+        with self._lock:
+            location = self._offsets.get(ticket_id)
+        if location is None:
+            return None
+        return decode(os.pread(self._read_fd, location[1], location[0]))
+
+    def by_contact(self, contact):
+        with self._lock:
+            ticket_ids = list(self._contacts.get(contact, ()))
+        return [self.get(ticket_id) for ticket_id in ticket_ids]
+
+    def close(self):
+        if self._read_fd is not None:
+            os.close(self._read_fd)
+
+
+class TicketLedger(LedgerReader):
+    """The one writer of a ledger file, locked with flock while open."""
+
+    def __init__(self, path=LEDGER_PATH, max_batch=512):
+        self.max_batch = max_batch
+        self.batches = 0
+        # Set when a failed batch could not be cut off the file
+        self._failed = None
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._fd)
+            raise LedgerLocked(f"{path} is already open by another writer") from None
+        _WRITERS.add(self)
+        super().__init__(path)
+        if self.torn:
+            # Written but never acknowledged, so no caller is waiting on it
+            os.ftruncate(self._fd, self._size)
+        self._queue = queue.Queue()
+        # Guards closed, so no append is queued behind the writer's stop
+        self._closing = threading.Lock()
+        self.closed = False
+        self._writer = threading.Thread(target=self._run, name="ticket-ledger", daemon=True)
+        self._writer.start()
+
+    def append(self, ticket):
+        """Store a ticket durably and return its ticket_id, assigning one if missing."""
+        ticket = dict(ticket)
+        ticket.setdefault("ticket_id", uuid.uuid4().hex[:12].upper())
+        ticket.setdefault("created", datetime.now().isoformat(timespec="seconds"))
+        done = Future()
+        with self._closing:
+            if self.closed:
+                raise ValueError(f"{self.path} is closed")
+            self._queue.put((ticket, encode(ticket), done))
+        return done.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            batch = [item for item in batch if item is not None]
+            if batch:
+                self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        data = memoryview(b"".join(record for _, record, _ in batch))
+        try:
+            if self._failed is not None:
+                raise OSError(f"{self.path} no longer matches its index") from self._failed
+            written = 0
+            while written < len(data):
+                written += os.write(self._fd, data[written:])
+            os.fsync(self._fd)
+        except OSError as error:
+            self._rollback()
+            for _, _, done in batch:
+                done.set_exception(error)
+            return
+        with self._lock:
+            for ticket, record, _ in batch:
+                self._index(ticket, self._size, len(record))
+                self._size += len(record)
+            self.batches += 1
+        for ticket, _, done in batch:
+            done.set_result(ticket["ticket_id"])
+
+    def _rollback(self):
+        """Cut off whatever part of a failed batch reached the file, so the
+        offsets of later records stay right and no failed ticket comes back."""
+        if self._failed is not None:
+            return
+        try:
+            os.ftruncate(self._fd, self._size)
+        except OSError as error:
+            self._failed = error
+
+    def close(self):
+        with self._closing:
+            if self.closed:
+                return
+            self.closed = True
+            self._queue.put(None)
+        self._writer.join()
+        _WRITERS.discard(self)
+        os.close(self._fd)
+        super().close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the ticket ledger.")
+    parser.add_argument("--path", default=LEDGER_PATH, help="ledger file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("scan", help="index the ledger and report what it holds")
+    find = commands.add_parser("find", help="look up tickets")
+    key = find.add_mutually_exclusive_group(required=True)
+    key.add_argument("--id", help="ticket id")
+    key.add_argument("--contact", help="contact number")
+    args = parser.parse_args()
+
+    # Read only, so inspecting a live ledger neither waits for nor truncates it
+    ledger = LedgerReader(args.path)
+    try:
+        if args.command == "scan":
+            print(f"{ledger.records} tickets, {ledger.corrupt} corrupt records skipped, {ledger.torn} torn bytes at the end")
+        else:
+            tickets = [ledger.get(args.id)] if args.id else ledger.by_contact(args.contact)
+            for ticket in tickets:
+                if ticket is not None:
+                    print(json.dumps(ticket, ensure_ascii=False))
+    finally:
+        ledger.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .timetable import EVERY_DAY
+
+# The CSVs live at the repository root, next to the apps
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DATA_FILES = {
+    "distance": "rajasthan_distance.csv",
+    "bus": "rajasthan_buses.csv",
+    "train": "rajasthan_trains.csv",
+    "metro": "rajasthan_metros.csv",
+    "districts": "rajasthan_districts.csv",
+}
+
+
+def data_path(name, data_dir=DATA_DIR):
+    return os.path.join(data_dir, DATA_FILES[name])
+
+
+# (mtime, size) of every data file; changes whenever any CSV is rewritten
+def data_version(data_dir=DATA_DIR):
+    version = []
+    for name in DATA_FILES:
+        stat = os.stat(data_path(name, data_dir))
+        version.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(version)
+
+
+TIMETABLE_COLUMNS = {
+    "start_city": "city",
+    "end_city": "city",
+    "departure_time": "string",
+    "fare": "float32",
+    "duration_min": "float32",
+}
+
+# Canonical columns and dtypes of every table; "city" columns become
+# Categoricals sharing one category set across all five tables
+SCHEMA = {
+    "distance": {"start_city": "city", "end_city": "city", "distance_km": "float32"},
+    "bus": TIMETABLE_COLUMNS,
+    "train": TIMETABLE_COLUMNS,
+    "metro": TIMETABLE_COLUMNS,
+    "districts": {"city": "city", "latitude": "float32", "longitude": "float32"},
+}
+
+# Alternative column names seen in the CSVs and older pages
+COLUMN_ALIASES = {
+    "start_district": "start_city",
+    "end_district": "end_city",
+    "district": "city",
+}
+
+# Columns in other units: alias -> (canonical column, factor to canonical units)
+UNIT_ALIASES = {
+    "duration_hr": ("duration_min", 60.0),
+}
+
+# Optional timetable column: the service calendar, either a weekday bitmask
+# (bit 0 = Monday) or a Monday-first string such as "1111100"; trips without
+# one run every day
+CALENDAR_COLUMN = "days"
+TIMETABLES = ("bus", "train", "metro")
+
+CITY_ALIASES = {
+    "Sriganganagar": "Sri Ganganagar",
+}
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def normalize(name, df):
+    """Rename, convert and validate one raw table against SCHEMA; cities stay strings."""
+    expected = SCHEMA[name]
+    df = df.rename(columns=lambda column: column.strip())
+    df = df.rename(columns={alias: column for alias, column in COLUMN_ALIASES.items() if column in expected})
+    for alias, (column, factor) in UNIT_ALIASES.items():
+        if alias in df.columns and column in expected and column not in df.columns:
+            df[column] = df.pop(alias) * factor
+    missing = [column for column in expected if column not in df.columns]
+    if missing:
+        raise SchemaError(f"{DATA_FILES[name]} is missing columns {missing}; found {list(df.columns)}")
+    calendar = df[CALENDAR_COLUMN] if name in TIMETABLES and CALENDAR_COLUMN in df.columns else None
+    df = df[list(expected)]
+    for column, kind in expected.items():
+        if kind == "city":
+            df[column] = df[column].astype("string").str.strip().replace(CITY_ALIASES)
+        elif kind == "string":
+            df[column] = df[column].astype("string")
+        else:
+            try:
+                df[column] = pd.to_numeric(df[column]).astype(kind)
+            except (TypeError, ValueError) as error:
+                raise SchemaError(f"{DATA_FILES[name]} column {column!r}: {error}") from None
+        if df[column].isna().any():
+            raise SchemaError(f"{DATA_FILES[name]} column {column!r} has missing values")
+    if name in TIMETABLES:
+        df[CALENDAR_COLUMN] = EVERY_DAY if calendar is None else weekday_masks(calendar, name)
+        df[CALENDAR_COLUMN] = df[CALENDAR_COLUMN].astype(np.uint8)
+    return df
+
+
+def weekday_masks(values, name="timetable"):
+    if pd.api.types.is_numeric_dtype(values):
+        masks = values.fillna(EVERY_DAY).astype(int)
+    else:
+        masks = values.fillna("1111111").astype(str).str.strip().map(_parse_weekdays)
+    if masks.isna().any() or ((masks < 0) | (masks > EVERY_DAY)).any():
+        raise SchemaError(f"{DATA_FILES.get(name, name)} column {CALENDAR_COLUMN!r} has invalid weekday masks")
+    return masks
+
+
+def _parse_weekdays(text):
+    if len(text) == 7 and not set(text) - {"0", "1"}:
+        return sum(1 << day for day, flag in enumerate(text) if flag == "1")
+    return int(text) if text.isdigit() else None
+
+
+def load_tables(data_dir=DATA_DIR):
+    """All five tables with canonical columns, narrow dtypes and shared city codes."""
+    # Calendars are read as text, or "0000011" would parse as the number 11
+    tables = {name: normalize(name, pd.read_csv(data_path(name, data_dir), dtype={CALENDAR_COLUMN: "string"})) for name in DATA_FILES}
+    cities = sorted({city for name, df in tables.items() for column, kind in SCHEMA[name].items() if kind == "city" for city in df[column].unique()})
+    city_type = pd.CategoricalDtype(cities)
+    for name, df in tables.items():
+        for column, kind in SCHEMA[name].items():
+            if kind == "city":
+                df[column] = df[column].astype(city_type)
+    return tables
+
+
+def load_timetables(data_dir=DATA_DIR):
+    """(tables, route index), from the compiled store when it is current."""
+    from .store import STORE_DIR, open_store
+    from .timetable import build_index
+
+    store = open_store(os.path.join(data_dir, os.path.basename(STORE_DIR)), data_dir)
+    if store is not None:
+        return store.tables(), store.index()
+    tables = load_tables(data_dir)
+    return tables, build_index(tables["bus"], tables["train"], tables["metro"])
@@ -0,0 +1,176 @@
+"""Local load generator for the route service.
+
+    python -m uts.loadgen [--url URL] [--requests N] [--concurrency C] [--seed S]
+
+Without --url it starts `python -m uts.service` on a free localhost port
+and stops it afterwards. Each client keeps one HTTP/1.1 connection open
+and sends a random mix of direct, via, auto-via and round-trip queries,
+some with a departure window so they miss the precomputed table. Reports
+latency percentiles and requests per second.
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode, urlsplit
+
+from .router import RANKINGS
+from .timetable import MODES
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def random_query(rng, cities):
+    start, end, via = rng.sample(cities, 3)
+    params = {
+        "start": start,
+        "end": end,
+        "modes": ",".join(rng.sample(MODES, rng.randint(1, len(MODES)))),
+        "rank_by": rng.choice(list(RANKINGS)),
+    }
+    kind = rng.random()
+    if kind < 0.2:
+        params["via"] = via
+    elif kind < 0.3:
+        params["via"] = "auto"
+    if rng.random() < 0.2:
+        earliest = rng.randrange(0, 20) * 60
+        params["earliest"] = f"{earliest // 60:02d}:00"
+        params["latest"] = f"{earliest // 60 + 4:02d}:00"
+    path = "/round-trip" if rng.random() < 0.1 else "/route"
+    return f"{path}?{urlencode(params)}"
+
+
+class Client:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def get(self, target):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {target} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode())
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length, close = 0, False
+        while True:
+            line = await self.reader.readline()
+            if not line.strip():
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+            elif name.lower() == "connection" and value.strip().lower() == "close":
+                close = True
+        body = await self.reader.readexactly(length)
+        if close:
+            self.close()
+        return status, json.loads(body)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def run(host, port, requests, concurrency, seed):
+    rng = random.Random(seed)
+    probe = Client(host, port)
+    _, payload = await probe.get("/cities")
+    probe.close()
+    targets = [random_query(rng, payload["cities"]) for _ in range(requests)]
+    latencies, errors = [], 0
+    queue = iter(targets)
+
+    async def worker():
+        nonlocal errors
+        client = Client(host, port)
+        for target in queue:
+            started = time.perf_counter()
+            try:
+                status, _ = await client.get(target)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                client.close()
+                status = None
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+        client.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else float("nan"),
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_service(port, workers=None):
+    """A `python -m uts.service` subprocess on localhost:port, once it accepts connections."""
+    command = [sys.executable, "-m", "uts.service", "--port", str(port)]
+    if workers:
+        command += ["--workers", str(workers)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"route service exited with status {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("route service did not start within 60s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the route service on localhost.")
+    parser.add_argument("--url", help="running service to test (default: start one)")
+    parser.add_argument("--requests", type=int, default=2000, help="total requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent connections")
+    parser.add_argument("--workers", type=int, default=None, help="search workers for a started service")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the query mix")
+    args = parser.parse_args()
+
+    process = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = "127.0.0.1", _free_port()
+        process = start_service(port, args.workers)
+    try:
+        report = asyncio.run(run(host, port, args.requests, args.concurrency, args.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
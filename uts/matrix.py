@@ -0,0 +1,82 @@
+import numpy as np
+
+from .timetable import MODES
+
+CRITERIA = ("duration", "fare")
+
+
+class RouteMatrix:
+    """Dense city x city matrices of the best direct duration and fare per mode.
+
+    Missing pairs and the diagonal are +inf, so a min-plus product never
+    picks the start or end city as its own intermediate. Durations here are
+    travel time only, without waiting between legs; they rank intermediate
+    cities, and the chosen one is then planned against the timetable.
+    """
+
+    def __init__(self, index, cities=()):
+        self.cities = sorted(set(cities) | set(index.cities()))
+        self.position = {city: i for i, city in enumerate(self.cities)}
+        n = len(self.cities)
+        self._matrices = {}
+        for mode in MODES:
+            start, end, fare, duration = index.pair_minimums(mode)
+            rows = np.fromiter((self.position[city] for city in start), dtype=np.intp, count=len(start))
+            cols = np.fromiter((self.position[city] for city in end), dtype=np.intp, count=len(end))
+            for criterion, values in (("duration", duration), ("fare", fare)):
+                matrix = np.full((n, n), np.inf)
+                matrix[rows, cols] = values
+                np.fill_diagonal(matrix, np.inf)
+                self._matrices[(mode, criterion)] = matrix
+
+    @classmethod
+    def from_matrices(cls, cities, matrices):
+        """A matrix over ready (mode, criterion) -> n x n arrays, used as given."""
+        matrix = cls.__new__(cls)
+        matrix.cities = list(cities)
+        matrix.position = {city: i for i, city in enumerate(matrix.cities)}
+        matrix._matrices = dict(matrices)
+        return matrix
+
+    def matrices(self):
+        return dict(self._matrices)
+
+    def best(self, modes, criterion="duration"):
+        """Best direct value per pair over any of the given modes."""
+        matrices = [self._matrices[(mode, criterion)] for mode in modes]
+        if not matrices:
+            return np.full((len(self.cities),) * 2, np.inf)
+        return np.minimum.reduce(matrices)
+
+    def best_via(self, start, end, modes, criterion="duration"):
+        """(via_city, value) minimising leg1 + leg2, or (None, inf)."""
+        if start not in self.position or end not in self.position:
+            return None, np.inf
+        # The best mode pair is the best first-leg mode plus the best
+        # second-leg mode, so one reduced matrix covers every mode pair
+        best = self.best(modes, criterion)
+        s, e = self.position[start], self.position[end]
+        totals = best[s, :] + best[:, e]
+        via = int(np.argmin(totals))
+        if not np.isfinite(totals[via]):
+            return None, np.inf
+        return self.cities[via], float(totals[via])
+
+    def all_best_via(self, modes, criterion="duration", budget=64 << 20):
+        """Best intermediate for every (start, end) as (via_index, value) arrays.
+
+        Min-plus square of the reduced matrix, computed in blocks of start
+        rows sized so each block of sums stays within budget bytes.
+        """
+        best = self.best(modes, criterion)
+        n = len(self.cities)
+        via = np.full((n, n), -1, dtype=np.intp)
+        value = np.full((n, n), np.inf)
+        chunk = max(1, budget // max(1, n * n * best.itemsize))
+        for lo in range(0, n, chunk):
+            totals = best[lo:lo + chunk, :, None] + best[None, :, :]
+            via[lo:lo + chunk] = np.argmin(totals, axis=1)
+            value[lo:lo + chunk] = np.min(totals, axis=1)
+        np.fill_diagonal(value, np.inf)
+        via[~np.isfinite(value)] = -1
+        return via, value
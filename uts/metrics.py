@@ -0,0 +1,234 @@
+"""Per-stage timings and counters for page reruns and other hot paths.
+
+Off unless UTS_METRICS=1; disabled, stage() hands back one shared no-op
+context manager and count() returns at once, so the calls can stay in
+the pages. When enabled, these environment variables also apply:
+
+    UTS_METRICS_PORT         serve /metrics (Prometheus text) and /metrics.json on localhost
+    UTS_METRICS_FILE         rewrite this JSON file at most every UTS_METRICS_INTERVAL seconds (default 10)
+    UTS_PROFILE_SAMPLE       fraction of reruns run under cProfile (default 0)
+    UTS_PROFILE_SLOW_MS      keep a sampled profile only if its rerun took this long (default 500)
+    UTS_PROFILE_DIR          where kept profiles go (default ./profiles)
+"""
+import bisect
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+# Upper bounds in seconds, Prometheus-style; the last bucket is +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_SESSIONS = 1000
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self):
+        return {"buckets": dict(zip([*map(str, BUCKETS), "+Inf"], self.counts)), "sum": self.sum, "count": self.count}
+
+
+class Metrics:
+    def __init__(self, enabled=False, profile_sample=0.0, profile_slow=0.5, profile_dir="profiles",
+                 port=None, dump_path=None, dump_interval=10.0):
+        self.enabled = enabled
+        self.port = port
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self._server = None
+        self.profile_sample = profile_sample
+        self.profile_slow = profile_slow
+        self.profile_dir = profile_dir
+        self.counters = {}
+        # stage -> Histogram of seconds; "rerun" is the whole script run
+        self.histograms = {}
+        # session -> {"reruns", "seconds", stage: seconds}, least recently active dropped first
+        self.sessions = OrderedDict()
+        # Callables returning {name: value}, read at export time
+        self.gauges = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiling = threading.Lock()
+        self._dumped = 0.0
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+            session = getattr(self._local, "session", None)
+            if session is not None:
+                totals = self.sessions.get(session)
+                if totals is None:
+                    totals = self.sessions[session] = {"reruns": 0, "seconds": 0.0}
+                    if len(self.sessions) > MAX_SESSIONS:
+                        self.sessions.popitem(last=False)
+                self.sessions.move_to_end(session)
+                if stage == "rerun":
+                    totals["reruns"] += 1
+                    totals["seconds"] += seconds
+                else:
+                    totals[stage] = totals.get(stage, 0.0) + seconds
+
+    def stage(self, name):
+        """Context manager timing one stage of the current rerun."""
+        if not self.enabled:
+            return _NOOP
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def begin_rerun(self, session=None):
+        """Start timing a page rerun on this thread, maybe under cProfile."""
+        if not self.enabled:
+            return
+        # A rerun that raised never reached end_rerun(); drop its profile
+        if getattr(self._local, "profile", None) is not None:
+            self._local.profile.disable()
+            self._profiling.release()
+        self._local.session = session
+        self._local.profile = None
+        if self.profile_sample and random.random() < self.profile_sample and self._profiling.acquire(blocking=False):
+            import cProfile
+
+            self._local.profile = cProfile.Profile()
+            self._local.profile.enable()
+        self._local.started = time.perf_counter()
+
+    def end_rerun(self):
+        if not self.enabled or getattr(self._local, "started", None) is None:
+            return
+        seconds = time.perf_counter() - self._local.started
+        profile = self._local.profile
+        if profile is not None:
+            profile.disable()
+            self._profiling.release()
+            if seconds >= self.profile_slow:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profile.dump_stats(os.path.join(self.profile_dir, f"rerun-{time.strftime('%Y%m%d-%H%M%S')}-{int(seconds * 1000)}ms.prof"))
+                self.count("slow_reruns_profiled")
+        self.observe("rerun", seconds)
+        self._local.started = self._local.profile = self._local.session = None
+        if self.dump_path:
+            self.dump(self.dump_path, self.dump_interval)
+
+    def start(self):
+        """Start the configured HTTP endpoint, once; returns self."""
+        with self._lock:
+            if self.enabled and self.port and self._server is None:
+                self._server = self.serve(self.port)
+        return self
+
+    def snapshot(self):
+        with self._lock:
+            data = {
+                "counters": dict(self.counters),
+                "stages": {stage: histogram.as_dict() for stage, histogram in self.histograms.items()},
+                "sessions": {session: dict(totals) for session, totals in self.sessions.items()},
+            }
+        data["gauges"] = {name: value for gauge in self.gauges for name, value in gauge().items()}
+        return data
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self):
+        data = self.snapshot()
+        lines = []
+        for name, value in sorted(data["counters"].items()):
+            lines += [f"# TYPE uts_{name}_total counter", f"uts_{name}_total {value}"]
+        for name, value in sorted(data["gauges"].items()):
+            lines += [f"# TYPE uts_{name} gauge", f"uts_{name} {value}"]
+        lines.append("# TYPE uts_stage_seconds histogram")
+        for stage, histogram in sorted(data["stages"].items()):
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                lines.append(f'uts_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'uts_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'uts_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path, interval=0.0):
+        """Write the JSON snapshot to path, at most once per interval seconds."""
+        if not self.enabled or time.monotonic() - self._dumped < interval:
+            return
+        self._dumped = time.monotonic()
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.to_json())
+        os.replace(tmp, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve /metrics and /metrics.json from a daemon thread."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, kind = metrics.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, kind = metrics.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def from_environment(environ=os.environ):
+    return Metrics(
+        enabled=environ.get("UTS_METRICS") == "1",
+        profile_sample=float(environ.get("UTS_PROFILE_SAMPLE", 0)),
+        profile_slow=float(environ.get("UTS_PROFILE_SLOW_MS", 500)) / 1000,
+        profile_dir=environ.get("UTS_PROFILE_DIR", "profiles"),
+        port=int(environ["UTS_METRICS_PORT"]) if environ.get("UTS_METRICS_PORT") else None,
+        dump_path=environ.get("UTS_METRICS_FILE"),
+        dump_interval=float(environ.get("UTS_METRICS_INTERVAL", 10)),
+    )
+
+
+# Process-wide instance the pages and the package report into
+METRICS = from_environment()
@@ -0,0 +1,340 @@
+"""Concurrent-session load test for the Streamlit app.
+
+    python -m uts.pageload [--url URL [--pid PID]] [--app PATH] [--data DIR] [--sessions N]
+                           [--concurrency C] [--rounds R] [--seed S] [--timeout SECONDS]
+
+Without --url it starts `streamlit run APP` headless on a free localhost
+port and stops it afterwards. Each session is a websocket client that
+speaks the browser's protocol: it sends a rerun carrying its widget
+states, reads the page's deltas until the script finishes, and finds
+widgets by label or key in what was drawn. A session books a ticket the
+way a user would: pick two cities served by some mode (read from
+--data, which should be the app's), that mode and maybe others and a
+ranking, select a route from the first table shown, enter passenger
+details, pay and wait for the ticket page. A button that changes the page only shows the new page
+on the next rerun, as in the browser, so each of those takes one more.
+
+One session runs first to load the timetables and warm the caches.
+Then each of --rounds runs --sessions sessions, --concurrency at a time.
+Reports rerun latency percentiles overall and per step, sessions and
+reruns per second, failed sessions by reason, and the server's resident
+memory (read from /proc, so Linux only; pass --pid with --url): the
+peak over a round per open session, and the growth per session between
+the end of the first round and the end of the last. Streamlit keeps up
+to 128 disconnected sessions for server.disconnectedSessionTTL, so with
+at least that many sessions a round the first round pays for those and
+the growth after it is what leaks.
+
+The sessions hold and confirm seats and write tickets. A started app
+keeps them in a temporary directory, through UTS_BOOKINGS_DB,
+UTS_LEDGER_PATH and UTS_TICKET_DIR, which is removed afterwards; start
+an app tested with --url with those pointing at scratch files too.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+import pyarrow as pa
+import websockets
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from .loader import DATA_DIR, load_timetables
+from .loadgen import _free_port, percentile
+from .timetable import MODES
+
+APP_PATH = os.path.join(DATA_DIR, "app.py")
+STREAM_PATH = "/_stcore/stream"
+
+
+class PageError(Exception):
+    """A session could not go on; the message is the reason reported."""
+
+
+class Session:
+    """One browser tab: the widget states it sends and what the last rerun drew."""
+
+    def __init__(self, ws, timeout):
+        self.ws = ws
+        self.timeout = timeout
+        # widget id -> WidgetState, sent with every rerun like the browser does
+        self.states = {}
+        # label or key -> element proto, from the last rerun
+        self.widgets = {}
+        self.headings = []
+        self.errors = []
+        self.latencies = []
+
+    def widget(self, name):
+        try:
+            return self.widgets[name]
+        except KeyError:
+            raise PageError(f"no widget {name!r}") from None
+
+    def set(self, name, field, value):
+        state = WidgetState(id=self.widget(name).id)
+        if field == "string_array_value":
+            state.string_array_value.data.extend(value)
+        else:
+            setattr(state, field, value)
+        self.states[state.id] = state
+
+    def expect(self, heading):
+        if heading not in self.headings:
+            raise PageError(f"did not reach {heading}")
+
+    async def rerun(self, step, press=None):
+        message = BackMsg()
+        widgets = message.rerun_script.widget_states.widgets
+        widgets.extend(self.states.values())
+        if press is not None:
+            widgets.add(id=self.widget(press).id, trigger_value=True)
+        self.widgets, self.headings, self.errors = {}, [], []
+        started = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await asyncio.wait_for(self.ws.recv(), self.timeout))
+            kind = msg.WhichOneof("type")
+            if kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                self._draw(msg.delta.new_element)
+            elif kind == "script_finished" and msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        self.latencies.append((step, time.perf_counter() - started))
+        if self.errors:
+            raise PageError(self.errors[0])
+
+    def _draw(self, element):
+        kind = element.WhichOneof("type")
+        proto = getattr(element, kind)
+        if kind == "heading":
+            self.headings.append(proto.body)
+        elif kind == "alert" and proto.format == Alert.ERROR:
+            # "Could not reserve seats: <trip> ..." -> "Could not reserve seats"
+            self.errors.append(proto.body.split(":")[0])
+        elif kind == "exception":
+            self.errors.append(f"{proto.type} in the script")
+        widget_id = getattr(proto, "id", "")
+        if widget_id.startswith("$$ID-"):
+            # "$$ID-<hash>-<key>", the key "None" when none was given
+            key = widget_id.split("-", 2)[2]
+            if key != "None":
+                self.widgets[key] = proto
+            if getattr(proto, "label", ""):
+                self.widgets.setdefault(proto.label, proto)
+
+
+async def book(session, rng, pairs):
+    """Walk one session from Find Routes to the ticket page."""
+    await session.rerun("open")
+    start, end, mode = rng.choice(pairs)
+    others = [other for other in MODES if other != mode]
+    session.set("Select Preferred Modes of Transport", "string_array_value", [mode] + rng.sample(others, rng.randint(0, len(others))))
+    session.set("Rank Routes By", "string_value", rng.choice(list(session.widget("Rank Routes By").options)))
+    session.set("Select Start City", "string_value", start)
+    session.set("Select End City", "string_value", end)
+    await session.rerun("search")
+    tables = [name for name in session.widgets if name.endswith("_table_1") and not name.startswith("return_")]
+    if not tables:
+        raise PageError("no routes")
+
+    table = tables[0]
+    rows = pa.ipc.open_stream(session.widget(table).arrow_data.data).read_all().num_rows
+    # The browser sends the selection as JSON of its JSON text
+    selection = {"selection": {"rows": [rng.randrange(rows)], "columns": [], "cells": []}}
+    session.set(table, "json_value", json.dumps(json.dumps(selection)))
+    await session.rerun("select_row")
+    await session.rerun("select_route", press=table[:-len("_table_1")] + "_select")
+    await session.rerun("passenger_page")
+    session.expect("Passenger Details")
+
+    session.set("Passenger Name", "string_value", f"Load Test {rng.randrange(10**6)}")
+    session.set("Passenger Age", "int_value", rng.randint(18, 80))
+    session.set("Contact Number", "string_value", f"9{rng.randrange(10**9):09d}")
+    await session.rerun("submit", press="Submit Passenger Details")
+    await session.rerun("payment_page")
+    session.expect("Payment Details")
+
+    session.set("Card Number", "string_value", "4111111111111111")
+    session.set("Card Expiry Date (MM/YY)", "string_value", "12/30")
+    session.set("CVV", "string_value", "123")
+    await session.rerun("pay", press="Proceed to Payment")
+    await session.rerun("ticket_page")
+    session.expect("Booking Confirmation")
+
+
+async def play(url, rng, pairs, timeout):
+    """(latencies, failure reason or None) of one booking session."""
+    session = None
+    try:
+        # No keepalive pings: browsers send none, and a busy server answers them late
+        async with websockets.connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout,
+                                      ping_interval=None) as ws:
+            session = Session(ws, timeout)
+            await book(session, rng, pairs)
+    except PageError as error:
+        return session.latencies, str(error)
+    except (asyncio.TimeoutError, websockets.ConnectionClosed, OSError) as error:
+        return session.latencies if session else [], type(error).__name__
+    return session.latencies, None
+
+
+def rss_mb(pid):
+    """Resident memory of process pid in MB, or None off Linux."""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        "reruns": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else float("nan"),
+    }
+
+
+async def run(host, port, pairs, sessions, concurrency, rounds, seed, timeout, pid=None):
+    url = f"ws://{host}:{port}{STREAM_PATH}"
+    rng = random.Random(seed)
+    _, failure = await play(url, random.Random(rng.random()), pairs, timeout)
+    if failure is not None:
+        raise RuntimeError(f"warm-up session failed: {failure}")
+    baseline = rss_mb(pid)
+    steps, failures, memory = {}, {}, []
+    completed = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        seeds = iter([rng.random() for _ in range(sessions)])
+        peak = baseline
+
+        async def worker():
+            nonlocal completed
+            for session_seed in seeds:
+                latencies, failure = await play(url, random.Random(session_seed), pairs, timeout)
+                for step, seconds in latencies:
+                    steps.setdefault(step, []).append(seconds)
+                if failure is None:
+                    completed += 1
+                else:
+                    failures[failure] = failures.get(failure, 0) + 1
+
+        async def sample():
+            nonlocal peak
+            while True:
+                rss = rss_mb(pid)
+                if rss is not None:
+                    peak = max(peak, rss)
+                await asyncio.sleep(0.2)
+
+        sampler = asyncio.create_task(sample())
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        sampler.cancel()
+        memory.append((peak, rss_mb(pid)))
+    elapsed = time.perf_counter() - started
+
+    every = [seconds for latencies in steps.values() for seconds in latencies]
+    report = {
+        "sessions": sessions * rounds,
+        "completed": completed,
+        "failures": failures,
+        "concurrency": concurrency,
+        "rounds": rounds,
+        "seconds": round(elapsed, 3),
+        "sessions_per_s": round(completed / elapsed, 2),
+        "reruns_per_s": round(len(every) / elapsed, 1),
+        "reruns": _summary(every),
+        "steps": {step: _summary(latencies) for step, latencies in steps.items()},
+    }
+    if baseline is not None:
+        after = [end for _, end in memory]
+        report["memory"] = {
+            "baseline_mb": round(baseline, 1),
+            "peak_mb": round(max(peak for peak, _ in memory), 1),
+            "after_rounds_mb": [round(end, 1) for end in after],
+            "peak_per_open_session_kb": round((max(peak for peak, _ in memory) - baseline) * 1024 / concurrency, 1),
+            "growth_per_session_kb": round((after[-1] - after[0]) * 1024 / (sessions * (rounds - 1)), 2) if rounds > 1 else None,
+        }
+    return report
+
+
+def start_app(port, scratch, app=APP_PATH):
+    """A headless `streamlit run app` subprocess on localhost:port, once it accepts connections.
+
+    Its seat inventory, ticket ledger and ticket files go in the scratch
+    directory, never the real ones.
+    """
+    command = [sys.executable, "-m", "streamlit", "run", app, "--server.headless", "true",
+               "--server.port", str(port), "--server.address", "127.0.0.1", "--browser.gatherUsageStats", "false"]
+    env = dict(os.environ,
+               UTS_BOOKINGS_DB=os.path.join(scratch, "bookings.db"),
+               UTS_LEDGER_PATH=os.path.join(scratch, "tickets.jsonl"),
+               UTS_TICKET_DIR=os.path.join(scratch, "ticket_artefacts"))
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit exited with status {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("streamlit did not start within 60s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit app with concurrent booking sessions.")
+    parser.add_argument("--url", help="running app to test (default: start one)")
+    parser.add_argument("--pid", type=int, help="process id of the running app, for its memory")
+    parser.add_argument("--app", default=APP_PATH, help="script a started app runs")
+    parser.add_argument("--data", default=DATA_DIR, help="the app's timetables, for the city pairs")
+    parser.add_argument("--sessions", type=int, default=150, help="booking sessions per round")
+    parser.add_argument("--concurrency", type=int, default=25, help="sessions open at once")
+    parser.add_argument("--rounds", type=int, default=2, help="rounds of --sessions sessions")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the sessions' choices")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds one rerun may take")
+    args = parser.parse_args()
+
+    _, index = load_timetables(args.data)
+    pairs = sorted(index.pairs())
+    process = scratch = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port, pid = url.hostname, url.port or 80, args.pid
+    else:
+        host, port = "127.0.0.1", _free_port()
+        scratch = tempfile.TemporaryDirectory(prefix="uts-pageload-")
+        process = start_app(port, scratch.name, args.app)
+        pid = process.pid
+    try:
+        report = asyncio.run(run(host, port, pairs, args.sessions, args.concurrency, args.rounds, args.seed, args.timeout, pid))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if scratch is not None:
+            scratch.cleanup()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import LRUCache
+from .matrix import RouteMatrix
+from .metrics import METRICS
+from .router import MAX_TRANSFERS, pair_trips, pareto_journeys, rank_routes, suggest_routes
+from .timetable import DAY
+
+# Shared by every planner in the process; entries are tied to the
+# timetable version of the planner that stored them
+ROUTE_CACHE = LRUCache()
+METRICS.gauges.append(lambda: {f"route_cache_{name}": value for name, value in ROUTE_CACHE.stats().items()})
+
+# Runs the outbound half of round trips while the caller plans the return
+TRIP_POOL = ThreadPoolExecutor(thread_name_prefix="round-trip")
+
+# One direction as the pages show it: via is the intermediate city or None,
+# connections are only searched for direct trips
+Trip = namedtuple("Trip", "start end via optimal_route routes connections")
+RoundTrip = namedtuple("RoundTrip", "outbound inbound pairs")
+
+
+class RoutePlanner:
+    """The route queries behind the Streamlit pages, with no UI attached.
+
+    Holds one timetable snapshot: the route index, the intermediate-city
+    matrix and, when it matches the index, the precomputed route table.
+    With a DistanceMatrix, connection searches are pruned by its lower
+    bounds and pairs it can rule out are answered without one.
+    Route tuples keep the pages' layout, see router.suggest_routes.
+    version identifies the timetables for ROUTE_CACHE; planners without
+    one only share cached results with themselves.
+    """
+
+    def __init__(self, index, route_table=None, cities=(), version=None, cache=ROUTE_CACHE, matrix=None, distances=None):
+        self.index = index
+        self.route_table = route_table
+        self.matrix = matrix if matrix is not None else RouteMatrix(index, cities)
+        self.distances = distances
+        self.version = version if version is not None else ("index", id(index))
+        self.cache = cache
+
+    def route_details(self, start, end, mode):
+        """(fare, duration, start_time) of the day's first departure, or Nones."""
+        departures = self.index.departures(start, end, mode)
+        if departures:
+            return departures.first()
+        return None, None, None
+
+    def suggest(self, start, end, preferred_modes, intermediate=None, rank_by="Fastest",
+                journey_date=None, earliest=0, latest=DAY - 1):
+        """(optimal_route, routes) for a direct or single-intermediate trip.
+
+        Results are cached; treat the returned routes as read-only.
+        """
+        key = self._key(start, end, preferred_modes, intermediate, rank_by, journey_date, earliest, latest)
+        return self._cached(key, self._suggest, start, end, preferred_modes, intermediate, rank_by, journey_date, earliest, latest)
+
+    def _key(self, start, end, preferred_modes, intermediate, rank_by, journey_date, earliest, latest):
+        # Only the weekday of the date matters, and only with service calendars
+        weekday = journey_date.weekday() if journey_date is not None and self.index.has_calendar() else None
+        return (start, end, intermediate or None, tuple(preferred_modes), rank_by, weekday, earliest, latest)
+
+    def _cached(self, key, compute, *args):
+        if self.cache is not None:
+            result = self.cache.get(self.version, key)
+            if result is not None:
+                return result
+        result = compute(*args)
+        if self.cache is not None:
+            self.cache.put(self.version, key, result)
+        return result
+
+    def _suggest(self, start, end, preferred_modes, intermediate, rank_by, journey_date, earliest, latest):
+        routes = self.precomputed(start, end, preferred_modes, intermediate, rank_by, journey_date, earliest, latest)
+        if routes is not None:
+            return (routes[0] if routes else None), routes
+        return suggest_routes(self.index, start, end, preferred_modes, intermediate, rank_by, journey_date, earliest, latest)
+
+    def precomputed(self, start, end, preferred_modes, intermediate=None, rank_by="Fastest",
+                    journey_date=None, earliest=0, latest=DAY - 1):
+        """The ranked routes from the precomputed table, or None when it can't answer."""
+        # The table answers whole-day queries that no service calendar can change
+        whole_day = (earliest, latest) == (0, DAY - 1)
+        if self.route_table is None or not whole_day or (journey_date is not None and self.index.has_calendar()):
+            return None
+        routes = self.route_table.get(start, end, intermediate, preferred_modes)
+        return rank_routes(routes, rank_by) if routes is not None else None
+
+    def best_via(self, start, end, preferred_modes, rank_by="Fastest"):
+        """The intermediate city with the best leg 1 + leg 2, or None."""
+        criterion = "fare" if rank_by == "Cheapest" else "duration"
+        via, _ = self.matrix.best_via(start, end, preferred_modes, criterion)
+        return via
+
+    def connections(self, start, end, preferred_modes, rank_by="Fastest", journey_date=None, earliest=0, latest=DAY - 1):
+        """Pareto-optimal journeys that change vehicles at least once.
+
+        Cached like suggest; treat the returned journeys as read-only.
+        """
+        # Tagged, so a connection list never answers a suggest with the same arguments
+        key = ("connections",) + self._key(start, end, preferred_modes, None, rank_by, journey_date, earliest, latest)
+        return self._cached(key, self._connections, start, end, preferred_modes, rank_by, journey_date, earliest, latest)
+
+    def _connections(self, start, end, preferred_modes, rank_by, journey_date, earliest, latest):
+        bounds = None
+        if self.distances is not None:
+            bounds = self.distances.bounds(end, preferred_modes, MAX_TRANSFERS + 1)
+        journeys = pareto_journeys(
+            self.index, start, end, depart_after=earliest, latest=latest,
+            weekday=journey_date.weekday() if journey_date is not None else None,
+            modes=preferred_modes, ranking=rank_by, bounds=bounds,
+        )
+        return [journey for journey in journeys if journey.transfers]
+
+    def trip(self, start, end, preferred_modes, intermediate=None, rank_by="Fastest",
+             journey_date=None, earliest=0, latest=DAY - 1):
+        """Routes and connections for one direction; intermediate "auto" picks the best via."""
+        if intermediate == "auto":
+            intermediate = self.best_via(start, end, preferred_modes, rank_by)
+        # No timetable lookup for pairs that no chain of legs on these modes joins
+        if self.distances is not None and not self.distances.reachable(start, end, preferred_modes, MAX_TRANSFERS + 1):
+            return Trip(start, end, intermediate or None, None, [], [])
+        with METRICS.stage("routes"):
+            optimal_route, routes = self.suggest(start, end, preferred_modes, intermediate, rank_by, journey_date, earliest, latest)
+        connections = []
+        if not intermediate:
+            with METRICS.stage("connections"):
+                connections = self.connections(start, end, preferred_modes, rank_by, journey_date, earliest, latest)
+        return Trip(start, end, intermediate, optimal_route, routes, connections)
+
+    def round_trip(self, start, end, preferred_modes, intermediate=None, rank_by="Fastest", journey_date=None,
+                   return_date=None, earliest=0, latest=DAY - 1, min_stay=0, executor=TRIP_POOL):
+        """RoundTrip(outbound, inbound, pairs) for start -> end and back, in one call.
+
+        Both directions are searched at once on this planner's snapshot,
+        the outbound one on executor. The return uses the same modes,
+        intermediate choice and departure window; pairs are every outbound
+        and return option leaving at least min_stay minutes between them,
+        paired by pair_trips.
+        """
+        outbound = executor.submit(self.trip, start, end, preferred_modes, intermediate, rank_by, journey_date, earliest, latest)
+        inbound = self.trip(end, start, preferred_modes, intermediate, rank_by, return_date or journey_date, earliest, latest)
+        outbound = outbound.result()
+        days = (return_date - journey_date).days if journey_date is not None and return_date is not None else 0
+        pairs = pair_trips(outbound.routes + outbound.connections, inbound.routes + inbound.connections, rank_by, days, min_stay)
+        return RoundTrip(outbound, inbound, pairs)
+
+
+def load_planner(data_dir=None, table_path=None, shared_dir=None):
+    """(tables, planner) for the timetables in data_dir.
+
+    With shared_dir (default $UTS_SHARED_DIR) they come from the segment
+    published there instead, see uts.shared.
+    """
+    from .distance import DistanceMatrix
+    from .loader import DATA_DIR, data_version, load_timetables
+    from .precompute import TABLE_PATH, load_route_table
+    from .shared import SHARED_DIR, attach
+
+    data_dir = data_dir or DATA_DIR
+    shared_dir = shared_dir or SHARED_DIR
+    if shared_dir:
+        segment = attach(shared_dir, data_dir)
+        tables, index = segment.tables(), segment.index()
+        route_table = load_route_table(index, table_path or TABLE_PATH)
+        matrix = segment.matrix()
+        distances = DistanceMatrix(matrix, tables["districts"], tables["distance"])
+        return tables, RoutePlanner(index, route_table, version=("segment", segment.name), matrix=matrix, distances=distances)
+    # Read before loading, so a file rewritten meanwhile never gets a newer version than its contents
+    version = data_version(data_dir)
+    tables, index = load_timetables(data_dir)
+    route_table = load_route_table(index, table_path or TABLE_PATH)
+    matrix = RouteMatrix(index, tables["districts"]["city"])
+    distances = DistanceMatrix(matrix, tables["districts"], tables["distance"])
+    return tables, RoutePlanner(index, route_table, version=version, matrix=matrix, distances=distances)
@@ -0,0 +1,167 @@
+"""Offline build of the all-pairs route table.
+
+    python -m uts.precompute [--workers N] [--output PATH] [--full]
+
+For every (start, end, intermediate or None) and every non-empty subset of
+modes the table stores the Pareto set of routes suggest_routes returns, so
+the pages answer those queries with a dict read. Each timetable group
+(start, end, mode) is fingerprinted; a rebuild only recomputes entries
+that read a group whose rows changed.
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .loader import DATA_DIR, load_timetables
+from .router import suggest_routes
+from .timetable import MODES
+
+TABLE_PATH = os.path.join(DATA_DIR, "route_table.pkl")
+FORMAT = 1
+
+MODE_SETS = [modes for n in range(1, len(MODES) + 1) for modes in itertools.combinations(MODES, n)]
+
+
+def fingerprints(index):
+    """Content hash of each (start, end, mode) group's departures."""
+    result = {}
+    for key in index.pairs():
+        departures = index.departures(*key)
+        digest = hashlib.blake2b(digest_size=12)
+        # Fixed dtypes so CSV-built and store-built indexes hash alike
+        digest.update(np.asarray(departures.minutes, dtype=np.int32).tobytes())
+        digest.update(np.asarray(departures.fare, dtype=np.float32).tobytes())
+        digest.update(np.asarray(departures.duration, dtype=np.float32).tobytes())
+        if departures.days is not None:
+            digest.update(np.asarray(departures.days, dtype=np.uint8).tobytes())
+        result[key] = digest.hexdigest()
+    return result
+
+
+def _version(prints):
+    digest = hashlib.blake2b(digest_size=16)
+    for key in sorted(prints):
+        digest.update(repr((key, prints[key])).encode())
+    return digest.hexdigest()
+
+
+class RouteTable:
+    def __init__(self, version, prints, routes):
+        self.version = version
+        self.fingerprints = prints
+        # (start, end, intermediate, modes) -> routes; modes in MODES order
+        self.routes = routes
+
+    def get(self, start, end, intermediate, modes):
+        key = tuple(mode for mode in MODES if mode in modes)
+        return self.routes.get((start, end, intermediate or None, key))
+
+
+def load_route_table(index, path=TABLE_PATH):
+    """The table at path if it was built from this index's timetables, else None."""
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if data.get("format") != FORMAT or data["version"] != _version(fingerprints(index)):
+        return None
+    return RouteTable(data["version"], data["fingerprints"], data["routes"])
+
+
+def table_version(path=TABLE_PATH):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _entries(cities, changed=None):
+    """(start, end, intermediate) triples, limited to those reading a changed group."""
+    for start, end in itertools.permutations(cities, 2):
+        if changed is None or (start, end) in changed:
+            yield start, end, None
+        for via in cities:
+            if via in (start, end):
+                continue
+            if changed is None or (start, via) in changed or (via, end) in changed:
+                yield start, end, via
+
+
+_worker_index = None
+
+
+def _init_worker(data_dir):
+    global _worker_index
+    _, _worker_index = load_timetables(data_dir)
+
+
+def _solve(triples):
+    results = {}
+    for start, end, via in triples:
+        for modes in MODE_SETS:
+            _, routes = suggest_routes(_worker_index, start, end, modes, via)
+            results[(start, end, via, modes)] = routes
+    return results
+
+
+def build(data_dir=DATA_DIR, path=TABLE_PATH, workers=None, full=False, chunk=64):
+    """Build or incrementally refresh the table; returns the number of entries solved."""
+    _, index = load_timetables(data_dir)
+    prints = fingerprints(index)
+    version = _version(prints)
+
+    routes = {}
+    changed = None
+    if not full:
+        try:
+            with open(path, "rb") as f:
+                old = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            old = None
+        if old is not None and old.get("format") == FORMAT:
+            if old["version"] == version:
+                return 0
+            previous = old["fingerprints"]
+            changed = {key[:2] for key in prints.keys() | previous.keys() if prints.get(key) != previous.get(key)}
+            routes = {key: value for key, value in old["routes"].items() if not _is_stale(key, changed)}
+
+    triples = list(_entries(index.cities(), changed))
+    chunks = [triples[i:i + chunk] for i in range(0, len(triples), chunk)]
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(data_dir,)) as pool:
+        for result in pool.map(_solve, chunks):
+            routes.update(result)
+
+    data = {"format": FORMAT, "version": version, "fingerprints": prints, "routes": routes}
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return len(triples) * len(MODE_SETS)
+
+
+def _is_stale(key, changed):
+    start, end, via, _ = key
+    if via is None:
+        return (start, end) in changed
+    return (start, via) in changed or (via, end) in changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute routes for every district pair.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--output", default=TABLE_PATH, help="route table path")
+    parser.add_argument("--full", action="store_true", help="rebuild every entry instead of only changed ones")
+    args = parser.parse_args()
+    solved = build(path=args.output, workers=args.workers, full=args.full)
+    print(f"Solved {solved} entries into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""QR codes in pure Python, for the printed tickets.
+
+Byte mode at error correction level M, in the smallest version (1-40)
+that holds the data, with whichever of the eight masks scores lowest on
+the standard's penalty rules. matrix() returns the modules as rows of
+booleans, dark True; png() draws them as a 1-bit PNG with a quiet zone.
+"""
+import struct
+import zlib
+
+# Level M, indexed by version: error correction codewords per block, blocks
+ECC_PER_BLOCK = (None, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26,
+                 26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28)
+BLOCKS = (None, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16,
+          17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49)
+# Two format bits of level M
+LEVEL_BITS = 0b00
+QUIET_ZONE = 4
+
+MASKS = (
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+)
+# Dark-light run of a finder pattern with four light modules on one side
+FINDER_LIKE = ((1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0), (0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1))
+
+# GF(256) over x^8 + x^4 + x^3 + x^2 + 1
+EXP = [0] * 512
+LOG = [0] * 256
+_value = 1
+for _power in range(255):
+    EXP[_power] = _value
+    LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+for _power in range(255, 512):
+    EXP[_power] = EXP[_power - 255]
+
+
+def _multiply(a, b):
+    return EXP[LOG[a] + LOG[b]] if a and b else 0
+
+
+def _divisor(degree):
+    """Reed-Solomon generator polynomial, highest coefficient first and the leading 1 dropped."""
+    result = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for j in range(degree):
+            result[j] = _multiply(result[j], root)
+            if j + 1 < degree:
+                result[j] ^= result[j + 1]
+        root = _multiply(root, 2)
+    return result
+
+
+def _remainder(data, divisor):
+    result = [0] * len(divisor)
+    for byte in data:
+        factor = byte ^ result.pop(0)
+        result.append(0)
+        for i, coefficient in enumerate(divisor):
+            result[i] ^= _multiply(coefficient, factor)
+    return result
+
+
+def raw_modules(version):
+    """Modules left for data and error correction once the function patterns are drawn."""
+    result = (16 * version + 128) * version + 64
+    if version >= 2:
+        alignments = version // 7 + 2
+        result -= (25 * alignments - 10) * alignments - 55
+        if version >= 7:
+            result -= 36
+    return result
+
+
+def data_codewords(version):
+    return raw_modules(version) // 8 - ECC_PER_BLOCK[version] * BLOCKS[version]
+
+
+def alignment_positions(version):
+    if version == 1:
+        return []
+    alignments = version // 7 + 2
+    step = (version * 8 + alignments * 3 + 5) // (alignments * 4 - 4) * 2
+    size = version * 4 + 17
+    return [6] + [size - 7 - i * step for i in reversed(range(alignments - 1))]
+
+
+def _codewords(data):
+    """(version, interleaved data and error correction codewords) for data in byte mode."""
+    for version in range(1, 41):
+        count_bits = 8 if version < 10 else 16
+        capacity = data_codewords(version) * 8
+        if 4 + count_bits + 8 * len(data) <= capacity:
+            break
+    else:
+        raise ValueError(f"{len(data)} bytes do not fit in a QR code")
+    bits = f"0100{len(data):0{count_bits}b}" + "".join(f"{byte:08b}" for byte in data)
+    bits += "0" * min(4, capacity - len(bits))
+    bits += "0" * (-len(bits) % 8)
+    codewords = [int(bits[i:i + 8], 2) for i in range(0, len(bits), 8)]
+    codewords += [(0xEC, 0x11)[i % 2] for i in range(capacity // 8 - len(codewords))]
+
+    # Split into blocks, the short ones first, and interleave them
+    blocks, ecc_length = BLOCKS[version], ECC_PER_BLOCK[version]
+    total = raw_modules(version) // 8
+    short_blocks, short_length = blocks - total % blocks, total // blocks
+    divisor = _divisor(ecc_length)
+    data_blocks, ecc_blocks, start = [], [], 0
+    for i in range(blocks):
+        length = short_length - ecc_length + (0 if i < short_blocks else 1)
+        block = codewords[start:start + length]
+        start += length
+        data_blocks.append(block)
+        ecc_blocks.append(_remainder(block, divisor))
+    result = [block[i] for i in range(short_length - ecc_length + 1) for block in data_blocks if i < len(block)]
+    result += [block[i] for i in range(ecc_length) for block in ecc_blocks]
+    return version, result
+
+
+def _format_bits(mask):
+    data = LEVEL_BITS << 3 | mask
+    remainder = data
+    for _ in range(10):
+        remainder = (remainder << 1) ^ ((remainder >> 9) * 0x537)
+    return (data << 10 | remainder) ^ 0x5412
+
+
+def _version_bits(version):
+    remainder = version
+    for _ in range(12):
+        remainder = (remainder << 1) ^ ((remainder >> 11) * 0x1F25)
+    return version << 12 | remainder
+
+
+class _Symbol:
+    def __init__(self, version):
+        self.version = version
+        self.size = size = version * 4 + 17
+        self.modules = [[False] * size for _ in range(size)]
+        self.function = [[False] * size for _ in range(size)]
+        for i in range(size):
+            self.set(6, i, i % 2 == 0)
+            self.set(i, 6, i % 2 == 0)
+        for x, y in ((3, 3), (size - 4, 3), (3, size - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    if 0 <= x + dx < size and 0 <= y + dy < size:
+                        self.set(x + dx, y + dy, max(abs(dx), abs(dy)) not in (2, 4))
+        positions = alignment_positions(version)
+        last = len(positions) - 1
+        for i, x in enumerate(positions):
+            for j, y in enumerate(positions):
+                # Not over the finder patterns
+                if (i, j) in ((0, 0), (0, last), (last, 0)):
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self.set(x + dx, y + dy, max(abs(dx), abs(dy)) != 1)
+        self.draw_format(0)
+        if version >= 7:
+            bits = _version_bits(version)
+            for i in range(18):
+                a, b = size - 11 + i % 3, i // 3
+                self.set(a, b, bits >> i & 1)
+                self.set(b, a, bits >> i & 1)
+
+    def set(self, x, y, dark):
+        self.modules[y][x] = bool(dark)
+        self.function[y][x] = True
+
+    def draw_format(self, mask):
+        bits, size = _format_bits(mask), self.size
+        for i in range(6):
+            self.set(8, i, bits >> i & 1)
+        self.set(8, 7, bits >> 6 & 1)
+        self.set(8, 8, bits >> 7 & 1)
+        self.set(7, 8, bits >> 8 & 1)
+        for i in range(9, 15):
+            self.set(14 - i, 8, bits >> i & 1)
+        for i in range(8):
+            self.set(size - 1 - i, 8, bits >> i & 1)
+        for i in range(8, 15):
+            self.set(8, size - 15 + i, bits >> i & 1)
+        self.set(8, size - 8, True)
+
+    def draw_codewords(self, codewords):
+        """Fill the data modules in the zigzag order, two columns at a time from the right."""
+        size, i, total = self.size, 0, len(codewords) * 8
+        right = size - 1
+        while right >= 1:
+            # The vertical timing column is skipped
+            if right == 6:
+                right = 5
+            upward = (right + 1) & 2 == 0
+            for vertical in range(size):
+                y = size - 1 - vertical if upward else vertical
+                for x in (right, right - 1):
+                    if not self.function[y][x] and i < total:
+                        self.modules[y][x] = bool(codewords[i >> 3] >> (7 - (i & 7)) & 1)
+                        i += 1
+            right -= 2
+
+    def masked(self, mask):
+        test = MASKS[mask]
+        return [
+            [dark != (not function and test(x, y)) for x, (dark, function) in enumerate(zip(row, functions))]
+            for y, (row, functions) in enumerate(zip(self.modules, self.function))
+        ]
+
+
+def penalty(modules):
+    """The standard's penalty score of a masked symbol; lower reads better."""
+    size = len(modules)
+    columns = [list(column) for column in zip(*modules)]
+    score = 0
+    for line in modules + columns:
+        run, previous = 0, None
+        for dark in line:
+            if dark == previous:
+                run += 1
+            else:
+                if run >= 5:
+                    score += run - 2
+                run, previous = 1, dark
+        if run >= 5:
+            score += run - 2
+        bits = tuple(int(dark) for dark in line)
+        for i in range(size - 10):
+            if bits[i:i + 11] in FINDER_LIKE:
+                score += 40
+    for y in range(size - 1):
+        upper, lower = modules[y], modules[y + 1]
+        for x in range(size - 1):
+            if upper[x] == upper[x + 1] == lower[x] == lower[x + 1]:
+                score += 3
+    dark = sum(map(sum, modules))
+    score += abs(dark * 20 - size * size * 10) // (size * size) * 10
+    return score
+
+
+def matrix(data, mask=None):
+    """Rows of the QR code's modules for data (str as UTF-8), dark True."""
+    if isinstance(data, str):
+        data = data.encode()
+    version, codewords = _codewords(data)
+    symbol = _Symbol(version)
+    symbol.draw_codewords(codewords)
+    best = None
+    for candidate in range(8) if mask is None else (mask,):
+        symbol.draw_format(candidate)
+        modules = symbol.masked(candidate)
+        score = penalty(modules) if mask is None else 0
+        if best is None or score < best[0]:
+            best = (score, modules)
+    return best[1]
+
+
+def png(modules, scale=4, border=QUIET_ZONE):
+    """A 1-bit grayscale PNG of the modules, scale pixels per module."""
+    size = len(modules) + 2 * border
+    width = size * scale
+    blank = [False] * len(modules)
+    rows = [blank] * border + modules + [blank] * border
+    raw = bytearray()
+    for row in rows:
+        # 0 is black in a 1-bit grayscale PNG
+        line = "1" * (border * scale) + "".join(("0" if dark else "1") * scale for dark in row) + "1" * (border * scale)
+        line += "1" * (-len(line) % 8)
+        packed = int(line, 2).to_bytes(len(line) // 8, "big")
+        raw += (b"\x00" + packed) * scale
+
+    def chunk(kind, body):
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, width, 1, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(bytes(raw), 9))
+            + chunk(b"IEND", b""))
@@ -0,0 +1,87 @@
+"""Background reload of the timetables.
+
+SnapshotWatcher keeps the current Snapshot in a single attribute. A
+daemon thread polls the CSVs' and the route table's (mtime, size); once
+a change has held still for one poll, it loads a new snapshot off the
+request path and swaps it in with one assignment. Readers take
+`watcher.current` once per request, without a lock, and finish on that
+snapshot even if a newer one is swapped in meanwhile. A snapshot that
+fails to load is reported in `error` and the old one keeps serving.
+With shared_dir set it polls the CURRENT pointer of the shared segments
+instead of the CSVs, see uts.shared.
+"""
+import threading
+from collections import namedtuple
+
+from .loader import DATA_DIR, data_version
+from .planner import load_planner
+from .precompute import TABLE_PATH, table_version
+from .shared import SHARED_DIR, current_segment, publish
+
+Snapshot = namedtuple("Snapshot", "version tables planner")
+
+
+class SnapshotWatcher:
+    def __init__(self, data_dir=DATA_DIR, table_path=TABLE_PATH, interval=2.0, shared_dir=SHARED_DIR):
+        self.data_dir = data_dir
+        self.table_path = table_path
+        self.shared_dir = shared_dir
+        self.interval = interval
+        # Called with each new snapshot before it is swapped in
+        self.listeners = []
+        self.reloads = 0
+        self.error = None
+        self._pending = self._failed = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.current = self._load(self._version())
+
+    def _version(self):
+        if self.shared_dir:
+            # The publisher watches the CSVs; replicas only follow CURRENT
+            segment = current_segment(self.shared_dir) or publish(self.data_dir, self.shared_dir)
+            return ("segment", segment), table_version(self.table_path)
+        return data_version(self.data_dir), table_version(self.table_path)
+
+    def _load(self, version):
+        tables, planner = load_planner(self.data_dir, self.table_path, self.shared_dir)
+        return Snapshot(version, tables, planner)
+
+    def check(self):
+        """Poll once; returns True if a new snapshot was swapped in."""
+        version = self._version()
+        if version == self.current.version or version == self._failed:
+            self._pending = None
+            return False
+        # Files still being written change between polls; wait until they settle
+        if version != self._pending:
+            self._pending = version
+            return False
+        try:
+            snapshot = self._load(version)
+            for listener in self.listeners:
+                listener(snapshot)
+        except Exception as error:
+            # Keep serving the old snapshot; retry once the files change again
+            self.error, self._failed = error, version
+            return False
+        self.current = snapshot
+        self.reloads += 1
+        self.error = self._pending = None
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="timetable-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
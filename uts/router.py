@@ -0,0 +1,392 @@
+import heapq
+from collections import namedtuple
+
+from .timetable import DAY, MODES
+
+# Minutes needed to change vehicles at an intermediate city
+MIN_TRANSFER = 15
+# Changes pareto_journeys allows by default
+MAX_TRANSFERS = 2
+
+Leg = namedtuple("Leg", "mode start end departure arrival fare departure_time")
+
+
+class Journey:
+    """A sequence of legs; times are minutes from midnight of the query day."""
+
+    def __init__(self, legs):
+        self.legs = tuple(legs)
+
+    @property
+    def departure(self):
+        return self.legs[0].departure
+
+    @property
+    def arrival(self):
+        return self.legs[-1].arrival
+
+    @property
+    def duration(self):
+        return self.arrival - self.departure
+
+    @property
+    def fare(self):
+        return sum(leg.fare for leg in self.legs)
+
+    @property
+    def transfers(self):
+        return len(self.legs) - 1
+
+    @property
+    def modes(self):
+        return tuple(leg.mode for leg in self.legs)
+
+    @property
+    def via(self):
+        return tuple(leg.end for leg in self.legs[:-1])
+
+    def __repr__(self):
+        stops = " -> ".join([self.legs[0].start] + [leg.end for leg in self.legs])
+        return f"Journey({stops}, {self.duration:.0f} min, {self.fare:.2f})"
+
+
+def earliest_arrival(index, start, end, depart_after=0, modes=MODES, min_transfer=MIN_TRANSFER,
+                     latest=None, weekday=None, bounds=None):
+    """Earliest-arrival journey from start to end with any number of transfers.
+
+    Time-dependent Dijkstra over the timetable index: each (start, end, mode)
+    group is an edge whose cost depends on the time we reach its start, and
+    TimetableIndex.next_arrival answers that with one bisect. Boarding at an
+    intermediate city needs `min_transfer` minutes after arriving there.
+    latest bounds the first departure; weekday (of day 0) applies service
+    calendars. With bounds from DistanceMatrix.bounds(end, modes, max_legs)
+    the search is A*: cities are visited in order of arrival plus the
+    bound's minutes, and cities missing from bounds are never entered, so
+    max_legs should cover as many legs as the journey may take.
+    """
+    if start == end:
+        return None
+    if bounds is not None and start not in bounds:
+        return None
+    modes = set(modes)
+    arrival = {start: depart_after}
+    came_from = {}
+    heap = [(depart_after, depart_after, start)]
+    while heap:
+        _, time, city = heapq.heappop(heap)
+        if city == end:
+            break
+        if time > arrival[city]:
+            continue
+        ready = time if city == start else time + min_transfer
+        for next_city, mode, lo, hi in index.outgoing(city):
+            if mode not in modes or (bounds is not None and next_city not in bounds):
+                continue
+            if city == start and latest is not None:
+                found = _first_leg(index, mode, lo, hi, depart_after, latest, weekday)
+            else:
+                found = index.next_arrival(mode, lo, hi, ready, weekday)
+            if found is None:
+                continue
+            reach, row, day_start = found
+            if reach < arrival.get(next_city, float("inf")):
+                arrival[next_city] = reach
+                came_from[next_city] = (city, mode, row, day_start)
+                heapq.heappush(heap, (reach + _minutes_left(bounds, next_city, end, min_transfer), reach, next_city))
+    if end not in came_from:
+        return None
+    return Journey(_legs(index, came_from, end))
+
+
+# Earliest arrival among first-leg departures in [earliest, latest]
+def _first_leg(index, mode, lo, hi, earliest, latest, weekday):
+    best = None
+    for departure, arrival, _, row in index.window(mode, lo, hi, earliest, latest - earliest + 1, weekday):
+        if best is None or arrival < best[0]:
+            best = (arrival, row, departure - departure % DAY)
+    return best
+
+
+def connect(index, start, end, mode, after, weekday=None):
+    """Leg on one (start, end, mode) arriving earliest when boarding after `after`."""
+    span = index.span(start, end, mode)
+    if span is None:
+        return None
+    found = index.next_arrival(mode, *span, after, weekday)
+    if found is None:
+        return None
+    reach, row, day_start = found
+    return _legs(index, {end: (start, mode, row, day_start)}, end)[0]
+
+
+def _legs(index, came_from, end):
+    legs = []
+    city = end
+    while city in came_from:
+        prev, mode, row, day_start = came_from[city]
+        minutes, departure_time, fare, duration = index.row(mode, row)
+        departure = int(day_start) + int(minutes)
+        legs.append(Leg(mode, prev, city, departure, departure + float(duration), float(fare), departure_time))
+        city = prev
+    legs.reverse()
+    return legs
+
+
+def suggest_routes(index, start, end, preferred_modes, intermediate=None, rank_by="Fastest",
+                   date=None, earliest=0, latest=DAY - 1):
+    """Direct or single-intermediate routes on each mode's first departure.
+
+    The first departure is the earliest one leaving in [earliest, latest]
+    minutes that runs on date (any date when None). Returns
+    (optimal_route, routes) with the Streamlit pages' tuple layout:
+    (mode, duration, fare, start_time) for direct routes and
+    (mode1, mode2, duration, fare, start_time1, start_time2) via a city.
+    """
+    weekday = date.weekday() if date is not None else None
+    routes = []
+    if intermediate:
+        # The second leg must leave after the first arrives plus the
+        # transfer time, so durations include the wait
+        for mode1 in preferred_modes:
+            departures = index.departures_between(start, intermediate, mode1, earliest, latest, weekday)
+            if not departures:
+                continue
+            fare1, duration1, start_time1 = departures.first()
+            ready = departures.minutes[0] + duration1 + MIN_TRANSFER
+            for mode2 in preferred_modes:
+                leg2 = connect(index, intermediate, end, mode2, ready, weekday)
+                if leg2 is not None:
+                    total = float(leg2.arrival - departures.minutes[0])
+                    routes.append((mode1, mode2, total, float(fare1) + leg2.fare, start_time1, leg2.departure_time))
+    else:
+        for mode in preferred_modes:
+            departures = index.departures_between(start, end, mode, earliest, latest, weekday)
+            if departures:
+                fare, duration, start_time = departures.first()
+                routes.append((mode, float(duration), float(fare), start_time))
+    routes = rank_routes(routes, rank_by)
+    return (routes[0] if routes else None), routes
+
+
+# Keep the routes not beaten on (duration, fare, changes), best first
+def rank_routes(routes, rank_by="Fastest"):
+    if routes and len(routes[0]) == 6:
+        return rank(routes, lambda x: (x[2], x[3], 1), rank_by)
+    return rank(routes, lambda x: (x[1], x[2], 0), rank_by)
+
+
+def format_minutes(minutes):
+    day, time_of_day = divmod(int(round(minutes)), DAY)
+    label = f"{time_of_day // 60:02d}:{time_of_day % 60:02d}"
+    return label if day == 0 else f"{label} (+{day}d)"
+
+
+# Criteria are (duration, fare, transfers); each ranking orders them differently
+RANKINGS = {
+    "Fastest": (0, 1, 2),
+    "Cheapest": (1, 0, 2),
+    "Fewest Changes": (2, 0, 1),
+}
+
+
+def rank(items, criteria, ranking="Fastest"):
+    """Pareto-optimal items over criteria(item), ordered by the named ranking."""
+    order = RANKINGS[ranking]
+    scored = sorted(((criteria(item), item) for item in items), key=lambda s: tuple(s[0][i] for i in order))
+    front = []
+    for score, item in scored:
+        if not any(all(k <= v for k, v in zip(kept, score)) for kept, _ in front):
+            front.append((score, item))
+    return [item for _, item in front]
+
+
+Pairing = namedtuple("Pairing", "outbound inbound duration fare changes stay")
+
+
+def _span(option):
+    """(departure, arrival, changes) of a route tuple or a Journey, in minutes."""
+    if isinstance(option, Journey):
+        return option.departure, option.arrival, option.transfers
+    hours, minutes = str(option[-2] if len(option) == 6 else option[-1]).split(":")[:2]
+    departure = int(hours) * 60 + int(minutes)
+    duration = option[2] if len(option) == 6 else option[1]
+    return departure, departure + float(duration), 1 if len(option) == 6 else 0
+
+
+def _costs(option):
+    if isinstance(option, Journey):
+        return option.duration, option.fare
+    return (option[2], option[3]) if len(option) == 6 else (option[1], option[2])
+
+
+def pair_trips(outbound, inbound, rank_by="Fastest", days=0, min_stay=0):
+    """Outbound and return options paired by their combined cost.
+
+    Options are route tuples or Journeys. The return leaves `days` after
+    the outbound's day and must leave at least min_stay minutes after the
+    outbound arrives. Returns the Pairings not beaten on (total duration,
+    total fare, total changes), ordered by rank_by.
+    """
+    returns = [(_span(option), _costs(option), option) for option in inbound]
+    pairs = []
+    for option in outbound:
+        departure, arrival, changes = _span(option)
+        duration, fare = _costs(option)
+        for (back_departure, _, back_changes), (back_duration, back_fare), back in returns:
+            stay = days * DAY + back_departure - arrival
+            if stay >= min_stay:
+                pairs.append(Pairing(option, back, float(duration + back_duration), float(fare + back_fare),
+                                     changes + back_changes, float(stay)))
+    return rank(pairs, lambda p: (p.duration, p.fare, p.changes), rank_by)
+
+
+def pareto_journeys(index, start, end, depart_after=0, modes=MODES, min_transfer=MIN_TRANSFER,
+                    max_transfers=MAX_TRANSFERS, ranking="Fastest", latest=None, weekday=None, bounds=None):
+    """All journeys not dominated on (duration, fare, transfers), ranked.
+
+    Round-based search: round k extends the labels that improved in round
+    k - 1 by one leg. A label is dropped as soon as another label at the same
+    city departs no earlier, arrives no later and costs no more, or a journey
+    already found is no longer, no dearer and has no more legs than the
+    label so far; so only labels that can still reach the front are extended.
+    Journeys start in [depart_after, latest] (the next 24 hours when None).
+    With bounds from DistanceMatrix.bounds(end, ...), cities that cannot
+    reach end in the legs left are skipped before their departures are
+    read, and a label is dropped once a found journey beats its lower
+    bound on the rest of the way.
+    """
+    if start == end:
+        return []
+    if bounds is not None and start not in bounds:
+        return []
+    modes = set(modes)
+    first_window = DAY if latest is None else latest - depart_after + 1
+    origin = (depart_after, depart_after, 0.0, 0, None)
+    bags = {start: [origin]}
+    marked = {start: [origin]}
+    found = []
+    for legs in range(1, max_transfers + 2):
+        improved = {}
+        for city, labels in marked.items():
+            if bounds is not None and city != start:
+                # Journeys found since these labels were made may beat them now
+                labels = [label for label in labels if not _beaten_by_found(_completed(label, bounds[city], min_transfer), found)]
+            for next_city, mode, lo, hi in index.outgoing(city):
+                if mode not in modes or next_city == start:
+                    continue
+                bound = None
+                if bounds is not None:
+                    bound = bounds.get(next_city)
+                    if bound is None or legs + bound[2] > max_transfers + 1:
+                        continue
+                    # Least the edge and the rest of the way add to any label
+                    travel, cheapest = index.minimums(mode, lo, hi)
+                    if next_city != end:
+                        travel += min_transfer + bound[0]
+                    cheapest += bound[1]
+                for label in labels:
+                    if bound is not None and found:
+                        departure, arrival, fare, label_legs, _ = label
+                        ready = arrival + min_transfer if label_legs else arrival
+                        if _beaten_by_found((departure, ready + travel, fare + cheapest, legs + bound[2]), found):
+                            continue
+                    for new in _extend(index, mode, lo, hi, label, city, next_city, min_transfer, first_window, weekday):
+                        if _beaten_by_found(new, found):
+                            continue
+                        if bound is not None and next_city != end and _beaten_by_found(_completed(new, bound, min_transfer), found):
+                            continue
+                        if next_city == end:
+                            found = [other for other in found if not _beats(new, other)] + [new]
+                            continue
+                        bag = bags.setdefault(next_city, [])
+                        if _is_dominated(new, bag):
+                            continue
+                        bag[:] = [other for other in bag if not _label_dominates(new, other)]
+                        bag.append(new)
+                        improved.setdefault(next_city, []).append(new)
+        # Only labels still in their city's bag are worth extending
+        marked = {}
+        for city, labels in improved.items():
+            kept = set(map(id, bags[city]))
+            labels = [label for label in labels if id(label) in kept]
+            if labels:
+                marked[city] = labels
+        if not marked:
+            break
+    journeys = [Journey(_unwind(index, label)) for label in found]
+    return rank(journeys, lambda j: (j.duration, j.fare, j.transfers), ranking)
+
+
+# Boarding options on one edge, keeping only those not beaten on (arrival, fare)
+# Labels are (departure, arrival, fare, legs, back) with back linking the previous label
+def _extend(index, mode, lo, hi, label, city, next_city, min_transfer, first_window, weekday):
+    departure, arrival, fare, legs, _ = label
+    ready = arrival + min_transfer if legs else arrival
+    within = DAY if legs else first_window
+    options = []
+    for leg_departure, leg_arrival, leg_fare, row in index.window(mode, lo, hi, ready, within, weekday):
+        # From the origin every departure time is its own journey start
+        start_time = departure if legs else leg_departure
+        options.append((leg_arrival, leg_fare, -start_time, leg_departure, row))
+    options.sort()
+    best = []
+    for leg_arrival, leg_fare, neg_start, leg_departure, row in options:
+        dominated = False
+        for other_fare, other_start in best:
+            if other_fare <= leg_fare and other_start <= neg_start:
+                dominated = True
+                break
+        if dominated:
+            continue
+        best.append((leg_fare, neg_start))
+        back = (label, mode, city, next_city, leg_departure, row)
+        yield (-neg_start, leg_arrival, fare + leg_fare, legs + 1, back)
+
+
+def _unwind(index, label):
+    legs = []
+    while label[4] is not None:
+        previous, mode, city, next_city, departure, row = label[4]
+        _, departure_time, fare, duration = index.row(mode, row)
+        legs.append(Leg(mode, city, next_city, departure, departure + float(duration), float(fare), departure_time))
+        label = previous
+    legs.reverse()
+    return legs
+
+
+def _beats(a, b):
+    return a[1] - a[0] <= b[1] - b[0] and a[2] <= b[2] and a[3] <= b[3]
+
+
+# Minutes still needed from city to end, by the bound from city
+def _minutes_left(bounds, city, end, min_transfer):
+    if bounds is None or city == end:
+        return 0
+    return min_transfer + bounds[city][0]
+
+
+# The best journey a label short of the end could still become
+def _completed(label, bound, min_transfer):
+    departure, arrival, fare, legs, _ = label
+    minutes, min_fare, min_legs = bound
+    return departure, arrival + min_transfer + minutes, fare + min_fare, legs + min_legs
+
+
+# Legs only add duration, fare and changes, so a found journey at least as
+# good as this partial label also beats everything the label can lead to
+def _beaten_by_found(label, found):
+    for other in found:
+        if _beats(other, label):
+            return True
+    return False
+
+
+def _label_dominates(a, b):
+    return a[0] >= b[0] and a[1] <= b[1] and a[2] <= b[2]
+
+
+def _is_dominated(label, bag):
+    for other in bag:
+        if other[0] >= label[0] and other[1] <= label[1] and other[2] <= label[2]:
+            return True
+    return False
@@ -0,0 +1,295 @@
+"""JSON route-query service.
+
+    python -m uts.service [--host HOST] [--port PORT] [--workers N]
+
+    GET /route?start=Jaipur&end=Jodhpur[&modes=Bus,Train][&via=Ajmer|auto]
+               [&rank_by=Fastest][&date=2026-10-18][&earliest=06:00][&latest=22:00]
+    GET /round-trip?...the same...[&return_date=2026-10-19][&min_stay=120]
+    GET /cities
+    GET /health
+
+One planner snapshot is shared by every connection. Queries the
+precomputed route table can answer are served straight from the event
+loop; anything that needs a timetable search runs in a process pool
+whose workers load their own planner (sharing the page cache when a
+compiled store is current). When the timetables change, a
+SnapshotWatcher loads the new snapshot and a warmed-up pool in the
+background, then swaps both in; requests already running finish on the
+old ones. Binds to localhost by default.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from .loader import DATA_DIR
+from .planner import load_planner
+from .reload import SnapshotWatcher
+from .router import RANKINGS, pair_trips
+from .timetable import DAY, MODES
+
+HOST = "127.0.0.1"
+PORT = 8080
+# Round-trip pairings returned per request, best first
+MAX_PAIRS = 10
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def route_json(route):
+    """A route tuple from RoutePlanner.suggest as a JSON-ready dict."""
+    if route is None:
+        return None
+    if len(route) == 6:
+        mode1, mode2, duration, fare, start_time1, start_time2 = route
+        return {"modes": [mode1, mode2], "duration_min": float(duration), "fare": float(fare),
+                "departures": [str(start_time1), str(start_time2)]}
+    mode, duration, fare, start_time = route
+    return {"modes": [mode], "duration_min": float(duration), "fare": float(fare), "departures": [str(start_time)]}
+
+
+def _minutes(text, name):
+    try:
+        hours, minutes = text.split(":")
+        value = int(hours) * 60 + int(minutes)
+    except ValueError:
+        raise BadRequest(f"{name} must be HH:MM") from None
+    if not 0 <= value < DAY:
+        raise BadRequest(f"{name} must be between 00:00 and 23:59")
+    return value
+
+
+def _date(text, name):
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        raise BadRequest(f"{name} must be YYYY-MM-DD") from None
+
+
+def parse_query(params, cities):
+    """Validated keyword arguments for RoutePlanner.suggest, from a query string dict."""
+    def get(name, default=None):
+        values = params.get(name)
+        return values[-1] if values else default
+
+    query = {}
+    for name in ("start", "end"):
+        city = get(name)
+        if city is None:
+            raise BadRequest(f"missing {name}")
+        if city not in cities:
+            raise BadRequest(f"unknown city {city!r}")
+        query[name] = city
+    modes = get("modes")
+    query["preferred_modes"] = list(MODES) if modes is None else [mode.strip() for mode in modes.split(",") if mode.strip()]
+    unknown = set(query["preferred_modes"]) - set(MODES)
+    if unknown or not query["preferred_modes"]:
+        raise BadRequest(f"modes must be a comma-separated subset of {', '.join(MODES)}")
+    via = get("via")
+    if via not in (None, "", "auto") and via not in cities:
+        raise BadRequest(f"unknown city {via!r}")
+    query["intermediate"] = via or None
+    query["rank_by"] = get("rank_by", "Fastest")
+    if query["rank_by"] not in RANKINGS:
+        raise BadRequest(f"rank_by must be one of {', '.join(RANKINGS)}")
+    query["journey_date"] = _date(get("date"), "date") if get("date") else None
+    query["earliest"] = _minutes(get("earliest"), "earliest") if get("earliest") else 0
+    query["latest"] = _minutes(get("latest"), "latest") if get("latest") else DAY - 1
+    if query["earliest"] > query["latest"]:
+        raise BadRequest("earliest must not be after latest")
+    return query
+
+
+_worker_planner = None
+
+
+def _init_worker(data_dir):
+    global _worker_planner
+    _, _worker_planner = load_planner(data_dir)
+
+
+def _ready():
+    return _worker_planner is not None
+
+
+def _suggest(query):
+    return _worker_planner.suggest(**query)
+
+
+def start_pool(workers, data_dir=DATA_DIR):
+    """A process pool whose workers have all loaded their planner."""
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(data_dir,))
+    for future in [pool.submit(_ready) for _ in range(workers)]:
+        future.result()
+    return pool
+
+
+class RouteService:
+    def __init__(self, watcher, workers=None):
+        self.watcher = watcher
+        self.workers = workers or os.cpu_count()
+        self.pool = start_pool(self.workers, watcher.data_dir)
+        watcher.listeners.append(self._replace_pool)
+
+    def _replace_pool(self, snapshot):
+        # Runs on the watcher thread before the snapshot is swapped in;
+        # tasks already queued on the old pool still run to completion
+        old, self.pool = self.pool, start_pool(self.workers, self.watcher.data_dir)
+        old.shutdown(wait=False)
+
+    def close(self):
+        self.watcher.stop()
+        self.pool.shutdown()
+
+    async def routes(self, planner, query):
+        """(query, routes) with "auto" resolved; searches run on the pool."""
+        if query["intermediate"] == "auto":
+            query = dict(query, intermediate=planner.best_via(
+                query["start"], query["end"], query["preferred_modes"], query["rank_by"]))
+        routes = planner.precomputed(**query)
+        if routes is None:
+            loop = asyncio.get_running_loop()
+            _, routes = await loop.run_in_executor(self.pool, _suggest, query)
+        return query, routes
+
+    @staticmethod
+    def routes_json(query, routes):
+        return {
+            "start": query["start"],
+            "end": query["end"],
+            "via": query["intermediate"],
+            "optimal_route": route_json(routes[0] if routes else None),
+            "routes": [route_json(route) for route in routes],
+        }
+
+    async def route(self, params):
+        planner = self.watcher.current.planner
+        return self.routes_json(*await self.routes(planner, parse_query(params, planner.matrix.cities)))
+
+    async def round_trip(self, params):
+        planner = self.watcher.current.planner
+        query = parse_query(params, planner.matrix.cities)
+        back = dict(query, start=query["end"], end=query["start"])
+        if params.get("return_date"):
+            back["journey_date"] = _date(params["return_date"][-1], "return_date")
+        try:
+            min_stay = int(params["min_stay"][-1]) if params.get("min_stay") else 0
+        except ValueError:
+            raise BadRequest("min_stay must be a whole number of minutes") from None
+        # Both directions search on the pool at once
+        (query, routes), (back, back_routes) = await asyncio.gather(self.routes(planner, query), self.routes(planner, back))
+        days = (back["journey_date"] - query["journey_date"]).days if query["journey_date"] and back["journey_date"] else 0
+        pairs = pair_trips(routes, back_routes, query["rank_by"], days, min_stay)
+        return {
+            "outbound": self.routes_json(query, routes),
+            "return": self.routes_json(back, back_routes),
+            # Indexes into the two route lists, paired by combined cost
+            "pairs": [{"outbound": routes.index(pair.outbound), "return": back_routes.index(pair.inbound),
+                       "duration_min": pair.duration, "fare": pair.fare, "stay_min": pair.stay} for pair in pairs[:MAX_PAIRS]],
+        }
+
+    async def dispatch(self, method, target):
+        if method != "GET":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "only GET is supported"}
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        try:
+            if url.path == "/route":
+                return HTTPStatus.OK, await self.route(params)
+            if url.path == "/round-trip":
+                return HTTPStatus.OK, await self.round_trip(params)
+            if url.path == "/cities":
+                return HTTPStatus.OK, {"cities": self.watcher.current.planner.matrix.cities}
+            if url.path == "/health":
+                return HTTPStatus.OK, {"status": "ok", "reloads": self.watcher.reloads,
+                                       "reload_error": None if self.watcher.error is None else str(self.watcher.error)}
+        except BadRequest as error:
+            return HTTPStatus.BAD_REQUEST, {"error": str(error)}
+        except Exception as error:
+            # A broken pool or a planner bug fails this request, not the connection
+            traceback.print_exc()
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"internal error: {type(error).__name__}"}
+        return HTTPStatus.NOT_FOUND, {"error": f"no route for {url.path}"}
+
+    async def handle(self, reader, writer):
+        """One HTTP/1.1 connection; requests are served in turn while it is kept alive."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get("content-length", "0")
+                if not length.isdigit():
+                    # The body cannot be skipped, so answer and close the connection
+                    status, payload, version = HTTPStatus.BAD_REQUEST, {"error": "malformed Content-Length"}, "HTTP/1.0"
+                else:
+                    if int(length):
+                        await reader.readexactly(int(length))
+                    try:
+                        method, target, version = request_line.decode("latin-1").split()
+                    except ValueError:
+                        status, payload, version = HTTPStatus.BAD_REQUEST, {"error": "malformed request line"}, "HTTP/1.0"
+                    else:
+                        status, payload = await self.dispatch(method, target)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                body = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host=HOST, port=PORT, workers=None, data_dir=DATA_DIR):
+    service = RouteService(SnapshotWatcher(data_dir).start(), workers)
+    try:
+        server = await asyncio.start_server(service.handle, host, port)
+        # SIGTERM stops the server from the loop itself, between callbacks, so
+        # no request is cut off mid-way and the pool workers go with us
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        print(f"Serving routes on http://{host}:{server.sockets[0].getsockname()[1]}", flush=True)
+        await stop.wait()
+        # Connections still open are cancelled as asyncio.run returns
+        server.close()
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve route queries as JSON over HTTP.")
+    parser.add_argument("--host", default=HOST, help="interface to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=None, help="search worker processes (default: CPU count)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
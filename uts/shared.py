@@ -0,0 +1,189 @@
+"""Timetable snapshots shared by every process on a host.
+
+    python -m uts.shared publish [--data DIR] [--root DIR] [--keep N] [--watch SECONDS]
+    python -m uts.shared status [--root DIR]
+
+With UTS_SHARED_DIR set, load_planner and SnapshotWatcher attach to the
+segment published there instead of loading the CSVs themselves. A
+segment is a compiled store (see uts.store) plus the per-mode pair
+matrices of the intermediate-city search, all as .npy files. Attaching
+memory-maps them read-only, so replicas share one page-cache copy and each keeps
+only the per-pair dicts; per-host memory grows with the data once, not
+once per process.
+
+Segments are named after the CSVs' version and never change once
+written. Publishing writes a new one beside the others and then points
+CURRENT at it with one atomic rename; watchers see CURRENT change and
+swap to the new segment while requests already running finish on the
+old mapping. Segments beyond the newest --keep are deleted; a process
+still mapping one keeps its pages until it lets go (on Windows the
+delete fails and is retried at the next publish). Run `publish --watch`
+once per host to republish when the CSVs change; if nothing has been
+published yet, the first process to attach publishes.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .loader import DATA_DIR, data_version
+from .matrix import CRITERIA, RouteMatrix
+from .store import Store, compile_store
+from .timetable import MODES
+
+SHARED_DIR = os.environ.get("UTS_SHARED_DIR") or None
+FORMAT = 1
+KEEP = 2
+CURRENT = "CURRENT"
+
+
+def segment_name(version):
+    payload = json.dumps([FORMAT, [list(entry) for entry in version]])
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+class Segment(Store):
+    """A published snapshot; every array is a read-only memmap."""
+
+    def __init__(self, path, manifest):
+        super().__init__(path, manifest)
+        self.name = os.path.basename(path)
+
+    def matrix(self):
+        return RouteMatrix.from_matrices(self.manifest["matrix_cities"], {
+            (mode, criterion): self.column(f"matrix.{mode}.{criterion}") for mode in MODES for criterion in CRITERIA
+        })
+
+
+def _write_segment(data_dir, path):
+    compile_store(data_dir, path)
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    store = Store(path, manifest)
+    matrix = RouteMatrix(store.index(), store._names(store.column("districts.id")))
+    arrays = {f"matrix.{mode}.{criterion}": values for (mode, criterion), values in matrix.matrices().items()}
+    for name, values in arrays.items():
+        np.save(os.path.join(path, name + ".npy"), values)
+    manifest["segment"] = FORMAT
+    manifest["matrix_cities"] = matrix.cities
+    manifest["rows"].update((name, int(len(values))) for name, values in arrays.items())
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def publish(data_dir=DATA_DIR, root=SHARED_DIR, keep=KEEP):
+    """Make a segment of data_dir's timetables current under root; returns its name."""
+    os.makedirs(root, exist_ok=True)
+    name = segment_name(data_version(data_dir))
+    if not os.path.isdir(os.path.join(root, name)):
+        tmp = os.path.join(root, f".{name}.{os.getpid()}.tmp")
+        try:
+            manifest = _write_segment(data_dir, tmp)
+            # Named after what was read, in case the CSVs changed meanwhile
+            name = segment_name(manifest["source_version"])
+            try:
+                os.rename(tmp, os.path.join(root, name))
+            except OSError:
+                # Another process published the same version first
+                if not os.path.isdir(os.path.join(root, name)):
+                    raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    pointer = os.path.join(root, f".{CURRENT}.{os.getpid()}.tmp")
+    with open(pointer, "w") as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(root, CURRENT))
+    collect(root, keep)
+    return name
+
+
+def current_segment(root=SHARED_DIR):
+    try:
+        with open(os.path.join(root, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def segments(root=SHARED_DIR):
+    """Published segment names, newest first."""
+    names = [name for name in os.listdir(root) if not name.startswith(".") and os.path.isdir(os.path.join(root, name))]
+    return sorted(names, key=lambda name: os.stat(os.path.join(root, name)).st_mtime_ns, reverse=True)
+
+
+def collect(root=SHARED_DIR, keep=KEEP):
+    """Delete all but the current segment and the newest keep - 1 others."""
+    current = current_segment(root)
+    kept = 1
+    for name in segments(root):
+        if name == current:
+            continue
+        if kept < keep:
+            kept += 1
+            continue
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def attach(root=SHARED_DIR, data_dir=DATA_DIR):
+    """The current segment under root, publishing data_dir's first if there is none."""
+    name = current_segment(root)
+    manifest = None
+    if name is not None:
+        try:
+            with open(os.path.join(root, name, "manifest.json")) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            pass
+    if manifest is None or manifest.get("segment") != FORMAT:
+        name = publish(data_dir, root)
+        with open(os.path.join(root, name, "manifest.json")) as f:
+            manifest = json.load(f)
+    return Segment(os.path.join(root, name), manifest)
+
+
+def watch(data_dir=DATA_DIR, root=SHARED_DIR, keep=KEEP, interval=2.0):
+    """Republish whenever the CSVs change and then hold still for one poll."""
+    published = pending = None
+    while True:
+        version = data_version(data_dir)
+        if version == published:
+            pending = None
+        elif version == pending:
+            name = publish(data_dir, root, keep)
+            published, pending = version, None
+            print(f"Published segment {name}", flush=True)
+        else:
+            pending = version
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish timetable snapshots shared by every process on a host.")
+    parser.add_argument("--root", default=SHARED_DIR, required=SHARED_DIR is None, help="segment directory (default: $UTS_SHARED_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish_command = commands.add_parser("publish", help="publish the CSVs as the current segment")
+    publish_command.add_argument("--data", default=DATA_DIR, help="directory with the five CSVs")
+    publish_command.add_argument("--keep", type=int, default=KEEP, help="segments to keep, the current one included")
+    publish_command.add_argument("--watch", type=float, metavar="SECONDS", help="keep running and republish when the CSVs change")
+    commands.add_parser("status", help="show the current and the kept segments")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        current = current_segment(args.root)
+        for name in segments(args.root):
+            path = os.path.join(args.root, name)
+            size = sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+            print(f"{'*' if name == current else ' '} {name}  {size / 2**20:,.1f} MB")
+    elif args.watch:
+        watch(args.data, args.root, args.keep, args.watch)
+    else:
+        print(f"Published segment {publish(args.data, args.root, args.keep)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Compiled columnar timetable store.
+
+    python -m uts.store [--output DIR]
+
+Compiles the five normalized tables into a directory of .npy columns: city
+names become int16 ids into the loader's shared city categories, departures
+int16 minutes since midnight, service calendars uint8 weekday masks, and
+fares, durations, distances and coordinates float32. Timetable columns are
+written pre-sorted by (start, end, departure), next to the suffix minima
+and routing columns the route index derives from them (see PREPARED), so
+opening the store sorts and derives nothing: it memory-maps every column
+and builds only the per-pair dicts, departures come back as codes into
+the day's labels, and every process on the host shares one page-cache
+copy of the data.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .loader import DATA_DIR, data_version, load_tables
+from .timetable import DAY, PREPARED, TimetableIndex, format_departures, to_minutes
+
+STORE_DIR = os.path.join(DATA_DIR, "timetable.store")
+FORMAT = 4
+
+TIMETABLES = {"Bus": "bus", "Train": "train", "Metro": "metro"}
+# from_prepared field -> store column
+STORE_FIELDS = {"start": "start", "end": "end", "minutes": "departure", "fare": "fare", "duration": "duration", "days": "days"}
+DAY_LABELS = pd.Index(format_departures(np.arange(DAY)))
+
+
+def compile_store(data_dir=DATA_DIR, out_dir=STORE_DIR):
+    # Read before loading, so a file rewritten meanwhile never gets a newer version than its contents
+    source_version = data_version(data_dir)
+    tables = load_tables(data_dir)
+    # The loader gives every city column the same categories
+    cities = list(tables["districts"]["city"].cat.categories)
+
+    def codes(column):
+        return column.cat.codes.to_numpy(dtype=np.int16)
+
+    columns = {}
+    for mode, name in TIMETABLES.items():
+        df = tables[name].assign(_minutes=to_minutes(tables[name]["departure_time"]))
+        df = df.assign(_start=codes(df["start_city"]), _end=codes(df["end_city"]))
+        df = df.sort_values(["_start", "_end", "_minutes"], kind="stable")
+        columns[f"{name}.start"] = df["_start"].to_numpy()
+        columns[f"{name}.end"] = df["_end"].to_numpy()
+        columns[f"{name}.departure"] = df["_minutes"].to_numpy(dtype=np.int16)
+        columns[f"{name}.fare"] = df["fare"].to_numpy(dtype=np.float32)
+        columns[f"{name}.duration"] = df["duration_min"].to_numpy(dtype=np.float32)
+        columns[f"{name}.days"] = df["days"].to_numpy(dtype=np.uint8)
+    distance = tables["distance"]
+    columns["distance.start"] = codes(distance["start_city"])
+    columns["distance.end"] = codes(distance["end_city"])
+    columns["distance.km"] = distance["distance_km"].to_numpy(dtype=np.float32)
+    districts = tables["districts"]
+    columns["districts.id"] = codes(districts["city"])
+    columns["districts.latitude"] = districts["latitude"].to_numpy(dtype=np.float32)
+    columns["districts.longitude"] = districts["longitude"].to_numpy(dtype=np.float32)
+    # The suffix minima and routing columns the index derives, so opening
+    # the store only builds the per-pair dicts
+    index = TimetableIndex.from_columns({
+        mode: tuple(columns[f"{name}.{column}"] for column in STORE_FIELDS.values()) for mode, name in TIMETABLES.items()
+    }, cities)
+    for mode, name in TIMETABLES.items():
+        for field, values in index.prepared(mode).items():
+            columns[f"{name}.{field}"] = values
+
+    # Write into a sibling directory and swap it in, so readers never see a
+    # half-written store
+    tmp_dir = out_dir + ".tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_dir, name + ".npy"), values)
+    manifest = {
+        "format": FORMAT,
+        "source_version": [list(entry) for entry in source_version],
+        "cities": cities,
+        "rows": {name: int(len(values)) for name, values in columns.items()},
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    if os.path.isdir(out_dir):
+        old_dir = out_dir + ".old"
+        os.replace(out_dir, old_dir)
+        os.replace(tmp_dir, out_dir)
+        for name in os.listdir(old_dir):
+            os.remove(os.path.join(old_dir, name))
+        os.rmdir(old_dir)
+    else:
+        os.replace(tmp_dir, out_dir)
+    return out_dir
+
+
+class Store:
+    """Read-only view of a compiled store; every column is a numpy memmap."""
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.cities = manifest["cities"]
+        self._columns = {}
+
+    def column(self, name):
+        if name not in self._columns:
+            # A plain ndarray view of the mapping: indexing np.memmap itself
+            # is several times slower, which the scalar searches feel
+            self._columns[name] = np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r").view(np.ndarray)
+        return self._columns[name]
+
+    def _names(self, codes):
+        return pd.Categorical.from_codes(codes, categories=self.cities)
+
+    # Codes into the day's "HH:MM:00" labels rather than one string per
+    # row, so the tables stay views of the store too
+    def _departure_times(self, minutes):
+        return pd.Categorical.from_codes(minutes, categories=DAY_LABELS)
+
+    def index(self):
+        modes = {}
+        for mode, name in TIMETABLES.items():
+            arrays = {field: self.column(f"{name}.{column}") for field, column in STORE_FIELDS.items()}
+            arrays.update((field, self.column(f"{name}.{field}")) for field in PREPARED)
+            modes[mode] = arrays
+        return TimetableIndex.from_prepared(modes, self.cities)
+
+    def tables(self):
+        """The five tables as DataFrames in the loader's canonical schema."""
+        tables = {}
+        for name in TIMETABLES.values():
+            minutes = self.column(f"{name}.departure")
+            tables[name] = pd.DataFrame({
+                "start_city": self._names(self.column(f"{name}.start")),
+                "end_city": self._names(self.column(f"{name}.end")),
+                "departure_time": self._departure_times(minutes),
+                "fare": self.column(f"{name}.fare"),
+                "duration_min": self.column(f"{name}.duration"),
+                "days": self.column(f"{name}.days"),
+            }, copy=False)
+        tables["distance"] = pd.DataFrame({
+            "start_city": self._names(self.column("distance.start")),
+            "end_city": self._names(self.column("distance.end")),
+            "distance_km": self.column("distance.km"),
+        }, copy=False)
+        tables["districts"] = pd.DataFrame({
+            "city": self._names(self.column("districts.id")),
+            "latitude": self.column("districts.latitude"),
+            "longitude": self.column("districts.longitude"),
+        }, copy=False)
+        return tables
+
+
+def open_store(path=STORE_DIR, data_dir=DATA_DIR):
+    """The compiled store if it was built from the current CSVs, else None."""
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != FORMAT:
+        return None
+    if [tuple(entry) for entry in manifest["source_version"]] != list(data_version(data_dir)):
+        return None
+    return Store(path, manifest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the timetable CSVs into a memory-mapped store.")
+    parser.add_argument("--output", default=STORE_DIR, help="store directory")
+    args = parser.parse_args()
+    print(f"Compiled store into {compile_store(out_dir=args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Deterministic synthetic timetables for scale testing.
+
+    python -m uts.synth OUT_DIR [--cities N] [--trips N] [--degree K] [--calendar] [--seed S]
+
+Writes the five CSVs the loader reads, in the bundled files' schema, so
+OUT_DIR can be passed anywhere a data_dir is taken. Cities get
+Zipf-distributed populations and are placed in clusters around the
+largest ones inside Rajasthan's bounding box. The distance matrix covers
+every ordered pair: haversine distance times a per-pair road detour
+factor. Buses link each city to its nearest neighbours, trains link the
+larger cities over longer hops and metros only link cities close
+together. --trips is split between the modes and then between each
+mode's city pairs by a gravity weight. Departures peak in the morning
+and evening within each mode's service hours. Durations follow the road
+distance at the mode's speed, and fares follow a base fare plus a rate
+per km. The same arguments always write the same files. Rows are
+generated and written in chunks, so tens of millions of trips fit in
+bounded memory.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .distance import haversine
+from .loader import CALENDAR_COLUMN, DATA_FILES
+from .timetable import DAY, EVERY_DAY, format_departures
+
+# Latitude and longitude bounds of the generated cities
+BOUNDS = ((23.0, 30.2), (69.5, 78.2))
+
+MODE_PROFILES = {
+    # share of --trips, speed km/h, dwell min, base fare, fare per km, service hours,
+    # fraction of cities served, neighbours per city, longest link in km
+    "Bus": dict(share=0.6, speed=45, dwell=10, base=20.0, per_km=1.1, hours=(5, 23.5), served=1.0, degree=1.0, max_km=450),
+    "Train": dict(share=0.15, speed=65, dwell=15, base=30.0, per_km=0.6, hours=(0, 24), served=0.3, degree=0.5, max_km=900),
+    "Metro": dict(share=0.25, speed=35, dwell=2, base=10.0, per_km=2.0, hours=(5.5, 23), served=1.0, degree=0.3, max_km=80),
+}
+DATA_NAMES = {"Bus": "bus", "Train": "train", "Metro": "metro"}
+
+# Calendars for --calendar: every day, weekdays, weekends (bit 0 = Monday)
+CALENDARS = np.array([EVERY_DAY, 0b0011111, 0b1100000], dtype=np.uint8)
+CALENDAR_WEIGHTS = (0.8, 0.12, 0.08)
+
+PREFIXES = ["Ajay", "Bhim", "Chand", "Dev", "Hanu", "Jai", "Kishan", "Lakh", "Man", "Nath", "Pratap", "Ram", "Shiv",
+            "Sur", "Udai", "Vijay", "Bal", "Gopal", "Hari", "Kesar", "Madho", "Nawal", "Padam", "Rajal", "Sawai", "Tara"]
+SUFFIXES = ["pur", "garh", "nagar", "sar", "abad", "kot", "wara", "ganj", "ner", "mer", "dhar", "pura"]
+QUALIFIERS = ["", " Kalan", " Khurd"]
+
+ROWS_PER_CHUNK = 1_000_000
+
+
+def city_names(n, rng):
+    names = [prefix + suffix + qualifier for qualifier in QUALIFIERS for prefix in PREFIXES for suffix in SUFFIXES]
+    order = rng.permutation(len(names))
+    names = [names[i] for i in order]
+    names += [f"{names[i % len(names)]} {i // len(names) + 1}" for i in range(len(names), n)]
+    return names[:n]
+
+
+def place_cities(n, rng):
+    """(latitude, longitude, population) arrays, largest city first."""
+    population = np.round(2_500_000 / np.arange(1, n + 1) ** 1.1).astype(np.int64)
+    (lat_lo, lat_hi), (lon_lo, lon_hi) = BOUNDS
+    latitude = rng.uniform(lat_lo, lat_hi, n)
+    longitude = rng.uniform(lon_lo, lon_hi, n)
+    # Most towns sit around one of the largest cities, picked by population
+    hubs = max(1, n // 20)
+    clustered = np.flatnonzero(rng.random(n) < 0.7)
+    clustered = clustered[clustered >= hubs]
+    weights = population[:hubs] / population[:hubs].sum()
+    hub = rng.choice(hubs, size=len(clustered), p=weights)
+    latitude[clustered] = latitude[hub] + rng.normal(0, 0.35, len(clustered))
+    longitude[clustered] = longitude[hub] + rng.normal(0, 0.35, len(clustered))
+    return np.clip(latitude, lat_lo, lat_hi), np.clip(longitude, lon_lo, lon_hi), population
+
+
+def road_km(latitude, longitude, start, end, seed):
+    """Road distance between cities start and end, broadcasting like numpy.
+
+    The detour factor is a hash of the unordered pair, so both directions
+    get the same distance and no n x n random matrix is needed.
+    """
+    start, end = np.asarray(start), np.asarray(end)
+    km = haversine(latitude[start], longitude[start], latitude[end], longitude[end])
+    lo, hi = np.minimum(start, end).astype(np.uint64), np.maximum(start, end).astype(np.uint64)
+    mixed = (lo * np.uint64(0x9E3779B1) + hi * np.uint64(0x85EBCA77) + np.uint64(seed)) & np.uint64(0xFFFFFFFF)
+    mixed = (mixed * np.uint64(0xC2B2AE3D)) & np.uint64(0xFFFFFFFF)
+    return km * (1.15 + 0.3 * mixed / 0xFFFFFFFF)
+
+
+def links(latitude, longitude, profile, degree, seed, chunk=512):
+    """(start, end) arrays of the city pairs one mode serves, in both directions."""
+    n = len(latitude)
+    eligible = np.arange(min(n, max(2, int(np.ceil(n * profile["served"])))))
+    k = min(len(eligible) - 1, max(1, int(round(degree * profile["degree"]))))
+    starts, ends = [], []
+    for lo in range(0, len(eligible), chunk):
+        rows = eligible[lo:lo + chunk]
+        km = road_km(latitude, longitude, rows[:, None], eligible[None, :], seed)
+        km[np.arange(len(rows)), rows] = np.inf
+        km[km > profile["max_km"]] = np.inf
+        nearest = np.argpartition(km, k - 1, axis=1)[:, :k] if k < len(eligible) else np.argsort(km, axis=1)[:, :k]
+        reachable = np.isfinite(np.take_along_axis(km, nearest, axis=1))
+        starts.append(np.repeat(rows, k)[reachable.ravel()])
+        ends.append(eligible[nearest][reachable])
+    # Every link runs both ways
+    start, end = np.concatenate(starts + ends), np.concatenate(ends + starts)
+    pairs = np.unique(start.astype(np.int64) * n + end)
+    return pairs // n, pairs % n
+
+
+def allocate(start, end, population, km, trips, rng):
+    """Trips per pair: at least one each, the rest split by a gravity weight."""
+    weight = np.sqrt(population[start] * population[end].astype(np.float64)) / (km + 20)
+    if trips <= len(start):
+        keep = np.sort(rng.choice(len(start), size=trips, replace=False, p=weight / weight.sum()))
+        return keep, np.ones(len(keep), dtype=np.int64)
+    return np.arange(len(start)), 1 + rng.multinomial(trips - len(start), weight / weight.sum())
+
+
+def departures(count, hours, rng):
+    """Minutes since midnight: 60% spread over service hours, the rest around 08:30 and 18:00."""
+    first, last = int(hours[0] * 60), min(DAY - 1, int(hours[1] * 60))
+    minutes = rng.integers(first, last + 1, count)
+    peak = rng.random(count) < 0.4
+    centre = np.where(rng.random(count) < 0.5, 8.5 * 60, 18 * 60)
+    minutes[peak] = np.rint(centre[peak] + rng.normal(0, 75, peak.sum()))
+    return np.clip(minutes, first, last)
+
+
+def generate(out_dir, cities=1000, trips=1_000_000, degree=12, calendar=False, seed=0):
+    """Write the five CSVs into out_dir; returns a summary of what was written."""
+    os.makedirs(out_dir, exist_ok=True)
+    streams = np.random.SeedSequence(seed).spawn(2 + len(MODE_PROFILES))
+    rng = np.random.default_rng(streams[0])
+    names = np.array(city_names(cities, rng), dtype=object)
+    latitude, longitude, population = place_cities(cities, np.random.default_rng(streams[1]))
+    hash_seed = seed & 0xFFFFFFFF
+
+    pd.DataFrame({"district": names, "latitude": latitude.round(4), "longitude": longitude.round(4)}).to_csv(
+        os.path.join(out_dir, DATA_FILES["districts"]), index=False)
+
+    path = os.path.join(out_dir, DATA_FILES["distance"])
+    everyone = np.arange(cities)
+    for lo in range(0, cities, max(1, ROWS_PER_CHUNK // cities)):
+        rows = everyone[lo:lo + max(1, ROWS_PER_CHUNK // cities)]
+        start, end = np.repeat(rows, cities), np.tile(everyone, len(rows))
+        other = start != end
+        start, end = start[other], end[other]
+        pd.DataFrame({
+            "start_district": names[start],
+            "end_district": names[end],
+            "distance_km": road_km(latitude, longitude, start, end, hash_seed).round(3),
+        }).to_csv(path, index=False, header=lo == 0, mode="w" if lo == 0 else "a")
+
+    times = format_departures(np.arange(DAY))
+    summary = {"cities": cities, "seed": seed, "degree": degree, "calendar": calendar, "modes": {}}
+    for (mode, profile), stream in zip(MODE_PROFILES.items(), streams[2:]):
+        rng = np.random.default_rng(stream)
+        start, end = links(latitude, longitude, profile, degree, hash_seed)
+        km = road_km(latitude, longitude, start, end, hash_seed)
+        keep, counts = allocate(start, end, population, km, int(trips * profile["share"]), rng)
+        start, end, km = start[keep], end[keep], km[keep]
+        path = os.path.join(out_dir, DATA_FILES[DATA_NAMES[mode]])
+        # Whole pairs per chunk, about ROWS_PER_CHUNK rows each
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        cuts = np.unique(np.searchsorted(bounds, np.arange(0, bounds[-1], ROWS_PER_CHUNK), side="right") - 1)
+        cuts = np.append(cuts, len(start)) if len(start) else np.array([0, 0])
+        written = 0
+        for lo, hi in zip(cuts[:-1], cuts[1:]):
+            pair = np.repeat(np.arange(lo, hi), counts[lo:hi])
+            minutes = departures(len(pair), profile["hours"], rng)
+            order = np.lexsort((minutes, pair))
+            pair, minutes = pair[order], minutes[order]
+            chunk = pd.DataFrame({
+                "start_city": names[start[pair]],
+                "end_city": names[end[pair]],
+                "departure_time": times[minutes],
+                "fare": (profile["base"] + profile["per_km"] * km[pair] * rng.lognormal(0, 0.15, len(pair))).round(2),
+                "duration_min": (km[pair] / profile["speed"] * 60 * rng.lognormal(0, 0.1, len(pair)) + profile["dwell"]).round(1),
+            })
+            if calendar:
+                chunk[CALENDAR_COLUMN] = CALENDARS[rng.choice(len(CALENDARS), size=len(pair), p=CALENDAR_WEIGHTS)]
+            chunk.to_csv(path, index=False, header=lo == 0, mode="w" if lo == 0 else "a")
+            written += len(chunk)
+        summary["modes"][mode] = {"pairs": int(len(start)), "trips": int(written)}
+    with open(os.path.join(out_dir, "synthetic.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic timetables in the bundled CSV schema.")
+    parser.add_argument("out_dir", help="directory for the five CSVs")
+    parser.add_argument("--cities", type=int, default=1000, help="number of cities")
+    parser.add_argument("--trips", type=int, default=1_000_000, help="trips across all modes")
+    parser.add_argument("--degree", type=int, default=12, help="bus neighbours per city; other modes scale from it")
+    parser.add_argument("--calendar", action="store_true", help="add weekday service calendars")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+    summary = generate(args.out_dir, args.cities, args.trips, args.degree, args.calendar, args.seed)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
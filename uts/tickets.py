@@ -0,0 +1,433 @@
+"""Printable tickets: a PDF and a QR code per confirmed booking.
+
+    python -m uts.tickets render (--id TICKET_ID | --contact NUMBER) [--ledger PATH] [--root DIR]
+    python -m uts.tickets bench [--tickets N] [--workers W]
+
+TicketRenderer renders off the booking path. submit() returns at once
+with the ticket's key and a Future; jobs wait in a bounded queue and a
+dispatcher thread hands them to a process pool, never more than two per
+worker at a time, so a burst of confirmations neither blocks the pages
+nor piles up inside the pool. A full queue fails the Future and the
+next submit of that ticket tries again. If a worker dies, the pool is
+replaced and the jobs it failed are sent once more.
+
+Artefacts are stored content-addressed: the key is a hash of the
+template and of every value the ticket prints, and the PDF and the PNG
+are named after it. Submitting a ticket whose artefacts exist, or are
+being rendered, costs a hash and a lookup, so reprints are free.
+UTS_TICKET_DIR overrides the default artefact directory.
+
+Each template is compiled once per process into the PDF bytes that
+never change (header, fonts, page, frame and labels) plus one
+pre-encoded text operator per value; rendering fills in the values and
+the QR code's modules and writes the content stream and the xref. The
+PDF uses the standard Helvetica fonts, so it embeds nothing; characters
+outside Windows-1252 print as "?". The QR code holds the ticket id and
+the start of the key, for a conductor's scanner to look the ticket up.
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import qr
+from .ledger import LEDGER_PATH, LedgerReader
+from .loader import DATA_DIR
+from .metrics import METRICS
+
+ARTEFACT_DIR = os.environ.get("UTS_TICKET_DIR") or os.path.join(DATA_DIR, "ticket_artefacts")
+KINDS = ("pdf", "png")
+# Bump when a template's layout changes, so old artefacts are not reused
+TEMPLATE_VERSION = 1
+
+# A6 landscape, in points
+PAGE_WIDTH, PAGE_HEIGHT = 420, 297
+TEMPLATES = {
+    # Labels printed top to bottom left of the QR code; a value the ticket
+    # lacks prints as "-"
+    "ticket": (
+        "Ticket ID", "Issued", "Passenger", "Age", "Contact", "Seats",
+        "From", "To", "Via", "Date", "Route", "Departure", "Duration", "Fare",
+        "Return Date", "Return Route", "Return Departure",
+    ),
+}
+TITLE = "Universal Ticketing System - Rajasthan"
+# Characters of a value that fit between the label column and the QR code
+VALUE_WIDTH = 38
+
+
+def _route_values(prefix, route):
+    """Route, departure, duration and fare of a direct (4 fields) or via (6 fields) route."""
+    if not route:
+        return {}
+    if len(route) == 6:
+        first, second, duration, fare, departure, onward = route
+        name, departure = f"{first}, then {second}", f"{departure}, {onward}"
+    else:
+        name, duration, fare, departure = route[:4]
+    values = {f"{prefix}Route": name, f"{prefix}Departure": departure}
+    if not prefix:
+        values.update({"Duration": f"{round(duration)} min", "Fare": f"Rs. {fare:.2f}"})
+    return values
+
+
+def ticket_values(ticket, template="ticket"):
+    """[(label, text)] of what the template prints for a ledger ticket."""
+    journey = ticket.get("journey") or {}
+    passenger = ticket.get("passenger") or {}
+    back = ticket.get("return_journey") or {}
+    values = {
+        "Ticket ID": ticket.get("ticket_id"),
+        "Issued": ticket.get("created"),
+        "Passenger": passenger.get("name"),
+        "Age": passenger.get("age"),
+        "Contact": passenger.get("contact"),
+        "Seats": passenger.get("num_seats"),
+        "From": journey.get("start_city"),
+        "To": journey.get("end_city"),
+        "Via": journey.get("intermediate_city"),
+        "Date": journey.get("journey_date"),
+        "Return Date": back.get("journey_date"),
+    }
+    values.update(_route_values("", journey.get("selected_route")))
+    values.update(_route_values("Return ", back.get("selected_route")))
+    return [(label, "-" if values.get(label) in (None, "") else str(values[label])) for label in TEMPLATES[template]]
+
+
+def artefact_key(values, template="ticket"):
+    payload = json.dumps([template, TEMPLATE_VERSION, values], ensure_ascii=False)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def qr_payload(values, key):
+    return f"UTS|{dict(values)['Ticket ID']}|{key[:16]}"
+
+
+def _pdf_text(text, width=None):
+    text = text.replace("₹", "Rs.")
+    if width is not None and len(text) > width:
+        text = text[:width - 3] + "..."
+    data = text.encode("cp1252", "replace")
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _text_op(font, size, x, y, text):
+    return b"BT /%s %d Tf %d %d Td (%s) Tj ET\n" % (font, size, x, y, text)
+
+
+class Template:
+    """A page layout compiled to the PDF bytes that never change."""
+
+    def __init__(self, name):
+        self.name = name
+        self.labels = TEMPLATES[name]
+        # Value column, first row and row pitch; the QR code fills the right column
+        self.value_x, self.top, self.pitch = 110, 238, 12
+        self.qr_x, self.qr_y, self.qr_size = 290, 120, 110
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [5 0 R] /Count 1 >>",
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents 6 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT),
+        ]
+        self.head = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.offsets = []
+        for number, body in enumerate(objects, 1):
+            self.offsets.append(len(self.head))
+            self.head += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        self.head = bytes(self.head)
+        # Frame, title, labels and the caption under the QR code
+        static = [b"0.5 w 12 12 %d %d re S\n" % (PAGE_WIDTH - 24, PAGE_HEIGHT - 24),
+                  _text_op(b"F2", 14, 24, 262, _pdf_text(TITLE)),
+                  _text_op(b"F1", 8, self.qr_x + 8, self.qr_y - 14, b"Show when boarding")]
+        self.slots = []
+        for row, label in enumerate(self.labels):
+            y = self.top - row * self.pitch
+            static.append(_text_op(b"F2", 9, 24, y, _pdf_text(label)))
+            self.slots.append(b"BT /F1 9 Tf %d %d Td (" % (self.value_x, y))
+        self.static = b"".join(static)
+
+    def render(self, values, modules):
+        """The PDF of one ticket: values in label order, modules from qr.matrix()."""
+        content = [self.static]
+        for slot, (_, text) in zip(self.slots, values):
+            content.append(slot + _pdf_text(text, VALUE_WIDTH) + b") Tj ET\n")
+        # One rectangle per run of dark modules in a row, filled at once
+        size = len(modules) + 2 * qr.QUIET_ZONE
+        module = self.qr_size / size
+        for y, row in enumerate(modules):
+            top = self.qr_y + self.qr_size - (y + qr.QUIET_ZONE + 1) * module
+            x = 0
+            while x < len(row):
+                if row[x]:
+                    end = x
+                    while end < len(row) and row[end]:
+                        end += 1
+                    content.append(b"%.3f %.3f %.3f %.3f re\n" % (self.qr_x + (x + qr.QUIET_ZONE) * module, top, (end - x) * module, module))
+                    x = end
+                else:
+                    x += 1
+        content.append(b"f\n")
+        stream = zlib.compress(b"".join(content), 6)
+        pdf = bytearray(self.head)
+        offsets = self.offsets + [len(pdf)]
+        pdf += b"6 0 obj\n<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream\nendobj\n" % (len(stream), stream)
+        xref = len(pdf)
+        pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1)
+        pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref)
+        return bytes(pdf)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_template(name):
+    return Template(name)
+
+
+def render(values, key, template="ticket"):
+    """{kind: bytes} of a ticket's artefacts."""
+    modules = qr.matrix(qr_payload(values, key))
+    return {"pdf": compile_template(template).render(values, modules), "png": qr.png(modules)}
+
+
+class ArtefactStore:
+    """Rendered artefacts under root, named after their key."""
+
+    def __init__(self, root=ARTEFACT_DIR):
+        self.root = root
+
+    def path(self, key, kind):
+        return os.path.join(self.root, key[:2], f"{key}.{kind}")
+
+    def has(self, key):
+        return all(os.path.exists(self.path(key, kind)) for kind in KINDS)
+
+    def read(self, key, kind):
+        with open(self.path(key, kind), "rb") as f:
+            return f.read()
+
+    def write(self, key, artefacts):
+        os.makedirs(os.path.dirname(self.path(key, KINDS[0])), exist_ok=True)
+        # The PDF last, so has() only sees a ticket once every file is whole
+        for kind in sorted(artefacts, key=lambda kind: kind == "pdf"):
+            path = self.path(key, kind)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(artefacts[kind])
+            os.replace(tmp, path)
+
+
+def _init_worker(templates):
+    for name in templates:
+        compile_template(name)
+
+
+def _render_job(root, key, values, template):
+    ArtefactStore(root).write(key, render(values, key, template))
+    return key
+
+
+class TicketRenderer:
+    def __init__(self, root=ARTEFACT_DIR, workers=2, backlog=1024):
+        self.store = ArtefactStore(root)
+        self.workers = workers
+        self.rendered = self.reprints = self.rejected = self.restarts = 0
+        # Forked workers inherit the compiled templates; spawned ones compile them on start
+        _init_worker(tuple(TEMPLATES))
+        self._pool = self._new_pool()
+        self._queue = queue.Queue(backlog)
+        self._slots = threading.Semaphore(2 * workers)
+        # key -> Future of a job queued or rendering
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._dispatcher = threading.Thread(target=self._run, name="ticket-render", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, ticket, template="ticket"):
+        """(key, Future of the key) for a ledger ticket's artefacts, without waiting."""
+        values = ticket_values(ticket, template)
+        key = artefact_key(values, template)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return key, future
+            future = Future()
+            if self.store.has(key):
+                self.reprints += 1
+                METRICS.count("ticket_reprints")
+                future.set_result(key)
+                return key, future
+            self._pending[key] = future
+        try:
+            self._queue.put_nowait((key, values, template, future))
+        except queue.Full:
+            with self._lock:
+                del self._pending[key]
+                self.rejected += 1
+            future.set_exception(RuntimeError("ticket render queue is full"))
+        return key, future
+
+    def ready(self, key):
+        return self.store.has(key)
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(tuple(TEMPLATES),))
+
+    def _restart(self, broken):
+        """Replace a pool that a dead worker broke, once however many jobs notice."""
+        with self._lock:
+            if self._pool is not broken:
+                return
+            self._pool = self._new_pool()
+            self.restarts += 1
+        METRICS.count("ticket_pool_restarts")
+        broken.shutdown(wait=False)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._slots.acquire()
+            self._dispatch(job, retry=True)
+
+    def _dispatch(self, job, retry):
+        key, values, template, future = job
+        pool = self._pool
+        try:
+            done = pool.submit(_render_job, self.store.root, key, values, template)
+        except BrokenProcessPool as error:
+            if not retry:
+                self._finish(key, future, error=error)
+                return
+            self._restart(pool)
+            self._dispatch(job, retry=False)
+            return
+        except RuntimeError as error:
+            self._finish(key, future, error=error)
+            return
+        done.add_done_callback(functools.partial(self._done, job, pool, retry))
+
+    def _done(self, job, pool, retry, done):
+        error = done.exception()
+        if isinstance(error, BrokenProcessPool) and retry:
+            # A worker died with this job queued or running; render it once more on a new pool
+            self._restart(pool)
+            self._dispatch(job, retry=False)
+            return
+        key, _, _, future = job
+        self._finish(key, future, error=error)
+
+    def _finish(self, key, future, error=None):
+        self._slots.release()
+        with self._lock:
+            del self._pending[key]
+            if error is None:
+                self.rendered += 1
+        if error is None:
+            METRICS.count("tickets_rendered")
+            future.set_result(key)
+        else:
+            future.set_exception(error)
+
+    def close(self):
+        self._queue.put(None)
+        self._dispatcher.join()
+        self._pool.shutdown()
+
+
+def _sample_ticket(i):
+    return {
+        "ticket_id": f"BENCH{i:07d}",
+        "created": "2026-01-01T09:00:00",
+        "contact": f"9{i:09d}",
+        "passenger": {"name": f"Passenger {i}", "age": 30 + i % 50, "contact": f"9{i:09d}", "num_seats": 1 + i % 4},
+        "journey": {"start_city": "Jaipur", "end_city": "Jodhpur", "intermediate_city": "Ajmer", "journey_date": "2026-01-02",
+                    "return_trip": False, "return_date": None, "selected_route": ["Bus", "Train", 312.5, 840.0, "06:30:00", "10:15:00"]},
+        "return_journey": None,
+    }
+
+
+def bench(tickets=500, workers=2):
+    """Render tickets distinct tickets on a fresh store, then submit them all again."""
+    root = tempfile.mkdtemp(prefix="uts-tickets-")
+    sample = [_sample_ticket(i) for i in range(tickets)]
+    started = time.perf_counter()
+    for ticket in sample[:20]:
+        values = ticket_values(ticket)
+        render(values, artefact_key(values))
+    inline = (time.perf_counter() - started) / min(20, tickets)
+    renderer = TicketRenderer(root, workers, backlog=tickets)
+    try:
+        started = time.perf_counter()
+        futures = [renderer.submit(ticket)[1] for ticket in sample]
+        submitted = time.perf_counter() - started
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - started
+        started = time.perf_counter()
+        again = [renderer.submit(ticket)[1] for ticket in sample]
+        reprinted = time.perf_counter() - started
+        sizes = [os.path.getsize(renderer.store.path(again[0].result(), kind)) for kind in KINDS]
+    finally:
+        renderer.close()
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        "tickets": tickets,
+        "workers": workers,
+        "render_ms": round(inline * 1000, 2),
+        "submit_us": round(submitted / tickets * 1e6, 1),
+        "tickets_per_s": round(tickets / elapsed, 1),
+        "reprint_us": round(reprinted / tickets * 1e6, 1),
+        "reprints_done": all(future.done() for future in again),
+        "pdf_bytes": sizes[0],
+        "png_bytes": sizes[1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render printable tickets.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    render_command = commands.add_parser("render", help="render tickets from the ledger and print their files")
+    lookup = render_command.add_mutually_exclusive_group(required=True)
+    lookup.add_argument("--id", help="ticket id")
+    lookup.add_argument("--contact", help="contact number")
+    render_command.add_argument("--ledger", default=LEDGER_PATH, help="ledger file")
+    render_command.add_argument("--root", default=ARTEFACT_DIR, help="artefact directory")
+    bench_command = commands.add_parser("bench", help="measure render throughput and reprint cost")
+    bench_command.add_argument("--tickets", type=int, default=500, help="distinct tickets to render")
+    bench_command.add_argument("--workers", type=int, default=2, help="render processes")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        print(json.dumps(bench(args.tickets, args.workers), indent=2))
+        return
+    ledger = LedgerReader(args.ledger)
+    try:
+        tickets = [ledger.get(args.id)] if args.id else ledger.by_contact(args.contact)
+    finally:
+        ledger.close()
+    store = ArtefactStore(args.root)
+    for ticket in tickets:
+        if ticket is None:
+            continue
+        values = ticket_values(ticket)
+        key = artefact_key(values)
+        if not store.has(key):
+            store.write(key, render(values, key))
+        print(ticket["ticket_id"], *(store.path(key, kind) for kind in KINDS))
+
+
+if __name__ == "__main__":
+    main()
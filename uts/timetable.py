@@ -0,0 +1,347 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+MODES = ("Bus", "Train", "Metro")
+DAY = 24 * 60
+# Service calendars are weekday bitmasks, bit 0 = Monday
+EVERY_DAY = 0b1111111
+# Arrays TimetableIndex.prepared derives per mode, beyond the sorted columns
+PREPARED = ("first", "best_arrival", "best_row", "scan_minutes", "scan_fare", "scan_duration")
+
+
+# Convert "HH:MM[:SS]" departure strings to minutes since midnight.
+# pandas is imported on first use: routing over a compiled store never needs it
+def to_minutes(times):
+    import pandas as pd
+
+    parts = pd.Series(times, dtype="string").str.split(":", expand=True)
+    return (parts[0].astype(int) * 60 + parts[1].astype(int)).to_numpy(dtype=np.int32)
+
+
+# Inverse of to_minutes, as "HH:MM:00" strings; times of day are looked up
+# in a table of the day's labels, anything else is formatted one by one
+def format_departures(minutes):
+    minutes = np.asarray(minutes)
+    if minutes.size and (minutes.min() < 0 or minutes.max() >= DAY):
+        return np.array([f"{m // 60:02d}:{m % 60:02d}:00" for m in minutes.tolist()], dtype=object)
+    return _DAY_LABELS[minutes.astype(np.intp, copy=False)]
+
+
+_DAY_LABELS = np.array([f"{m // 60:02d}:{m % 60:02d}:00" for m in range(DAY)], dtype=object)
+
+
+class Departures:
+    """All departures for one (start, end, mode), sorted by departure time.
+
+    The arrays are views into the index's contiguous columns, so building
+    one costs nothing beyond the dict lookup.
+    """
+
+    __slots__ = ("mode", "minutes", "departure_time", "fare", "duration", "days")
+
+    def __init__(self, mode, minutes, departure_time, fare, duration, days=None):
+        self.mode = mode
+        self.minutes = minutes
+        self.departure_time = departure_time
+        self.fare = fare
+        self.duration = duration
+        # Weekday bitmask per departure, None when every departure runs daily
+        self.days = days
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def __bool__(self):
+        return len(self.minutes) > 0
+
+    def first(self):
+        return self.fare[0], self.duration[0], self.departure_time[0]
+
+
+class TimetableIndex:
+    """Grouped-array index over the bus/train/metro timetables.
+
+    Each mode's frame is sorted once by (start_city, end_city, departure) and
+    kept as plain NumPy columns; a dict maps (start_city, end_city, mode) to
+    the row slice holding that pair's departures. Lookups are a dict hit plus
+    the size of the result instead of a boolean mask over every row.
+    """
+
+    def __init__(self, frames):
+        self._columns = {}
+        self._slices = {}
+        # Per-mode routing lists: departure minutes, best arrival from each
+        # row onwards within its pair, the row achieving that arrival, and
+        # each row's fare and duration
+        self._scan = {}
+        # The best arrival and row columns again as arrays, for batch queries
+        self._suffix = {}
+        # mode -> (start_city, end_city, first row) per (start, end) group
+        self._groups = {}
+        # start_city -> [(end_city, mode, lo, hi)]
+        self._outgoing = {}
+        # mode -> weekday bitmask per row, only for modes with a calendar
+        self._days = {}
+        for mode, df in frames.items():
+            self._add_mode(mode, df)
+
+    @classmethod
+    def from_columns(cls, columns, cities):
+        """Index pre-sorted columns: {mode: (start, end, minutes, fare, duration, days)}.
+
+        start and end are integer ids into cities. Departure strings are
+        formatted from minutes on access, so columns can stay memory-mapped.
+        """
+        index = cls({})
+        for mode, (start, end, minutes, fare, duration, days) in columns.items():
+            index._add_sorted(mode, start, end, minutes, None, fare, duration, cities, days)
+        return index
+
+    @classmethod
+    def from_prepared(cls, modes, cities):
+        """Index columns together with the arrays prepared(mode) derived from them.
+
+        modes maps each mode to a dict of the from_columns fields (start,
+        end, minutes, fare, duration, days) plus PREPARED. The searches
+        read the arrays in place, so they can be memory-mapped and shared
+        between processes; only the per-pair dicts are built here.
+        """
+        index = cls({})
+        for mode, arrays in modes.items():
+            index._add_sorted(mode, arrays["start"], arrays["end"], arrays["minutes"], None, arrays["fare"],
+                              arrays["duration"], cities, arrays["days"], prepared=arrays)
+        return index
+
+    def prepared(self, mode):
+        """The derived arrays from_prepared takes for one mode, see PREPARED."""
+        if mode not in self._groups:
+            return {"first": np.empty(0, dtype=np.int64), "best_arrival": np.empty(0), "best_row": np.empty(0, dtype=np.int64),
+                    "scan_minutes": np.empty(0, dtype=np.int64), "scan_fare": np.empty(0), "scan_duration": np.empty(0)}
+        minutes, _, fare, duration = self._columns[mode]
+        best_arrival, best_row = self._suffix[mode]
+        return {
+            "first": np.asarray(self._groups[mode][2], dtype=np.int64),
+            "best_arrival": np.asarray(best_arrival, dtype=np.float64),
+            "best_row": np.asarray(best_row, dtype=np.int64),
+            # The routing columns at the widths the searches compute in,
+            # so results match an index built from the tables
+            "scan_minutes": np.asarray(minutes, dtype=np.int64),
+            "scan_fare": np.asarray(fare, dtype=np.float64),
+            "scan_duration": np.asarray(duration, dtype=np.float64),
+        }
+
+    def _add_mode(self, mode, df):
+        import pandas as pd
+
+        df = df.assign(_minutes=to_minutes(df["departure_time"]))
+        df = df.sort_values(["start_city", "end_city", "_minutes"], kind="stable")
+        start, end, cities = df["start_city"], df["end_city"], None
+        # Compare integer codes rather than strings when the loader gave us
+        # Categoricals sharing one category set
+        if isinstance(start.dtype, pd.CategoricalDtype) and start.dtype == end.dtype:
+            start, end, cities = start.cat.codes, end.cat.codes, list(start.cat.categories)
+        self._add_sorted(
+            mode,
+            start.to_numpy(),
+            end.to_numpy(),
+            df["_minutes"].to_numpy(),
+            df["departure_time"].to_numpy(dtype=object),
+            df["fare"].to_numpy(),
+            df["duration_min"].to_numpy(),
+            cities,
+            df["days"].to_numpy() if "days" in df.columns else None,
+        )
+
+    def _add_sorted(self, mode, start, end, minutes, departure_time, fare, duration, cities=None, days=None, prepared=None):
+        self._columns[mode] = (minutes, departure_time, fare, duration)
+        if len(minutes) == 0:
+            return
+        if days is not None and (np.asarray(days) != EVERY_DAY).any():
+            self._days[mode] = np.asarray(days, dtype=np.uint8)
+        if prepared is None:
+            # Row offsets where the (start, end) pair changes
+            change = np.flatnonzero((start[1:] != start[:-1]) | (end[1:] != end[:-1])) + 1
+            bounds = np.concatenate(([0], change, [len(minutes)]))
+        else:
+            bounds = np.append(prepared["first"], len(minutes))
+        first = bounds[:-1]
+        if cities is not None:
+            start = np.asarray(cities, dtype=object)[start[first]]
+            end = np.asarray(cities, dtype=object)[end[first]]
+        else:
+            start, end = start[first], end[first]
+        self._groups[mode] = (start, end, first)
+        for i, (lo, hi) in enumerate(zip(bounds[:-1].tolist(), bounds[1:].tolist())):
+            self._slices[(start[i], end[i], mode)] = (lo, hi)
+            self._outgoing.setdefault(start[i], []).append((end[i], mode, lo, hi))
+        if prepared is not None:
+            self._suffix[mode] = (prepared["best_arrival"], prepared["best_row"])
+            self._scan[mode] = tuple(prepared[name] for name in ("scan_minutes", "best_arrival", "best_row", "scan_fare", "scan_duration"))
+            return
+        arrival = minutes.astype(np.float64) + duration
+        best_arrival = np.empty(len(minutes))
+        best_row = np.empty(len(minutes), dtype=np.int64)
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            # Suffix minimum of arrival (and its row) so that the earliest
+            # arrival among departures at or after any time is one lookup
+            rev = arrival[lo:hi][::-1]
+            best = np.minimum.accumulate(rev)
+            positions = np.arange(hi - lo)
+            rows = np.maximum.accumulate(np.where(rev == best, positions, 0))
+            best_arrival[lo:hi] = best[::-1]
+            best_row[lo:hi] = (hi - 1 - rows)[::-1]
+        self._suffix[mode] = (best_arrival, best_row)
+        self._scan[mode] = (
+            minutes.tolist(),
+            best_arrival.tolist(),
+            best_row.tolist(),
+            fare.tolist(),
+            duration.tolist(),
+        )
+
+    def departures(self, start, end, mode):
+        lo, hi = self._slices.get((start, end, mode), (0, 0))
+        columns = self._columns.get(mode)
+        if columns is None:
+            return Departures(mode, *(np.empty(0) for _ in range(4)))
+        return self._departures(mode, slice(lo, hi))
+
+    def _departures(self, mode, rows):
+        minutes, departure_time, fare, duration = self._columns[mode]
+        if departure_time is None:
+            departure_time = format_departures(minutes[rows])
+        else:
+            departure_time = departure_time[rows]
+        days = self._days[mode][rows] if mode in self._days else None
+        return Departures(mode, minutes[rows], departure_time, fare[rows], duration[rows], days)
+
+    def departures_between(self, start, end, mode, earliest=0, latest=DAY, weekday=None):
+        """Departures leaving in [earliest, latest] minutes, on weekday if given.
+
+        Two bisects over the pair's sorted departures find the window; the
+        calendar check is one vectorized mask over the rows inside it.
+        """
+        span = self._slices.get((start, end, mode))
+        if span is None:
+            return Departures(mode, *(np.empty(0) for _ in range(4)))
+        lo, hi = span
+        minutes = self._scan[mode][0]
+        i = bisect_left(minutes, earliest, lo, hi)
+        j = bisect_right(minutes, latest, i, hi)
+        if weekday is None or mode not in self._days:
+            return self._departures(mode, slice(i, j))
+        running = (self._days[mode][i:j] >> weekday) & 1
+        return self._departures(mode, i + np.flatnonzero(running))
+
+    def has_calendar(self, mode=None):
+        return bool(self._days) if mode is None else mode in self._days
+
+    def runs(self, mode, row, weekday):
+        return weekday is None or mode not in self._days or bool((self._days[mode][row] >> weekday) & 1)
+
+    def span(self, start, end, mode):
+        return self._slices.get((start, end, mode))
+
+    def outgoing(self, start):
+        return self._outgoing.get(start, ())
+
+    def row(self, mode, row):
+        minutes, departure_time, fare, duration = self._columns[mode]
+        if departure_time is None:
+            return minutes[row], format_departures(minutes[row:row + 1])[0], fare[row], duration[row]
+        return minutes[row], departure_time[row], fare[row], duration[row]
+
+    def next_arrival(self, mode, lo, hi, after, weekday=None):
+        """Earliest arrival on rows lo:hi boarding at or after `after`.
+
+        Returns (arrival, row, day_start), or None if nothing runs within a
+        week. Times are minutes from midnight of day 0, which falls on
+        weekday (None ignores service calendars), and day_start is the
+        midnight of the day the chosen row departs on; the timetable repeats
+        daily, so a missed last departure rolls over to the next day.
+        """
+        if weekday is not None and mode in self._days:
+            return self._next_arrival_on_calendar(mode, lo, hi, after, weekday)
+        minutes, best_arrival, best_row = self._scan[mode][:3]
+        day, time_of_day = divmod(after, DAY)
+        day_start = day * DAY
+        i = bisect_left(minutes, time_of_day, lo, hi)
+        tomorrow = day_start + DAY + best_arrival[lo]
+        if i < hi and day_start + best_arrival[i] <= tomorrow:
+            return day_start + best_arrival[i], best_row[i], day_start
+        return tomorrow, best_row[lo], day_start + DAY
+
+    # Suffix minima ignore calendars, so scan the running departures instead;
+    # arrivals never precede departures, so stop once departures pass the best
+    def _next_arrival_on_calendar(self, mode, lo, hi, after, weekday):
+        best = None
+        for departure, arrival, _, row in self.window(mode, lo, hi, after, 7 * DAY, weekday):
+            if best is not None and departure >= best[0]:
+                break
+            if best is None or arrival < best[0]:
+                best = (arrival, row, departure - self._scan[mode][0][row])
+        return best
+
+    def window(self, mode, lo, hi, after, within=DAY, weekday=None):
+        """Yield (departure, arrival, fare, row) boarding in [after, after + within).
+
+        With weekday (that of day 0) set, departures not running on their
+        day are skipped.
+        """
+        minutes, _, _, fare, duration = self._scan[mode]
+        days = self._days.get(mode) if weekday is not None else None
+        day_start = after - after % DAY
+        end = after + within
+        i = bisect_left(minutes, after - day_start, lo, hi)
+        while day_start < end:
+            bit = 1 << ((weekday + int(day_start // DAY)) % 7) if days is not None else 0
+            for row in range(i, hi):
+                departure = day_start + minutes[row]
+                if departure >= end:
+                    return
+                if days is not None and not days[row] & bit:
+                    continue
+                yield departure, departure + duration[row], fare[row], row
+            day_start += DAY
+            i = lo
+
+    def minimums(self, mode, lo, hi):
+        """(min_duration, min_fare) over rows lo:hi of a mode."""
+        _, _, _, fare, duration = self._scan[mode]
+        return min(duration[lo:hi]), min(fare[lo:hi])
+
+    def pair_minimums(self, mode):
+        """(start_cities, end_cities, min_fare, min_duration) per pair of a mode."""
+        if mode not in self._groups:
+            return (np.empty(0, dtype=object),) * 2 + (np.empty(0),) * 2
+        start, end, first = self._groups[mode]
+        _, _, fare, duration = self._columns[mode]
+        return start, end, np.minimum.reduceat(fare, first), np.minimum.reduceat(duration, first)
+
+    def arrays(self, mode):
+        """Vectorized view of a mode, or None if it has no departures.
+
+        (start, end, first, minutes, fare, duration, best_arrival, best_row):
+        one start/end city and first row per (start, end) group, whose rows
+        run up to the next group's first, then the row columns and the
+        suffix minima next_arrival reads.
+        """
+        if mode not in self._groups:
+            return None
+        start, end, first = self._groups[mode]
+        minutes, _, fare, duration = self._columns[mode]
+        return (start, end, first, np.asarray(minutes), np.asarray(fare), np.asarray(duration)) + self._suffix[mode]
+
+    def cities(self):
+        return sorted({city for key in self._slices for city in key[:2]})
+
+    def pairs(self, mode=None):
+        return [key for key in self._slices if mode is None or key[2] == mode]
+
+    def __contains__(self, key):
+        return key in self._slices
+
+
+def build_index(bus_df, train_df, metro_df):
+    return TimetableIndex({"Bus": bus_df, "Train": train_df, "Metro": metro_df})